@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _isolate(workdir: Path):
+    # config is read at import time, so point every store at the scratch
+    # directory before any application module is imported
+    os.environ["QRKEEP_DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    os.environ["QRKEEP_BLOB_STORE_DIR"] = str(workdir / "blobs")
+    os.environ["QRKEEP_SCAN_ARCHIVE_DIR"] = str(workdir / "scan_archive")
+    os.environ.pop("QRKEEP_MAP_CACHE_DIR", None)
+
+
+async def _run(args) -> dict:
+    import config
+    from benchmarks.load import run_load
+    from benchmarks.micro import run_micro
+    from benchmarks.synthetic import seed_database
+    from main import app
+    from services.schema_service import migrate_database
+
+    migrate_database()
+    seeded = await seed_database(args.seed, args.codes, args.scans, args.days)
+    qr_ids = seeded["ids"]
+    results = {
+        "meta": {
+            "seed": args.seed,
+            "codes": args.codes,
+            "scans": args.scans,
+            "days": args.days,
+            "repeat": args.repeat,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "commit": _git_commit(),
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite_profile": config.SQLITE_PROFILE,
+            "scan_ingest_mode": config.SCAN_INGEST_MODE,
+        },
+        "micro": await run_micro(args.seed, args.repeat, qr_ids, seeded),
+    }
+    if args.requests > 0:
+        results["load"] = await run_load(
+            app, args.seed, qr_ids, seeded, args.requests, args.concurrency
+        )
+    return results
+
+
+def _print_comparison(rows: list[dict]):
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['benchmark']:<32} {row['metric']:<10} "
+            f"{row['baseline']:>10.2f} -> {row['current']:>10.2f} ms "
+            f"{row['change']:>+8.1%} {flag}"
+        )
+
+
+def _compare(results: dict, baseline_path: str, threshold: float) -> int:
+    from benchmarks.stats import compare_results
+
+    baseline = json.loads(Path(baseline_path).read_text())
+    if baseline.get("meta", {}).get("seed") != results.get("meta", {}).get("seed"):
+        print("warning: baseline was generated with a different seed", file=sys.stderr)
+    rows = compare_results(results, baseline, threshold)
+    _print_comparison(rows)
+    regressions = [row for row in rows if row["regression"]]
+    print(f"{len(regressions)} regressions over {threshold:.0%} in {len(rows)} metrics")
+    return 1 if regressions else 0
+
+
+def run_command(args) -> int:
+    import asyncio
+
+    with tempfile.TemporaryDirectory(prefix="qrkeep-bench-") as scratch:
+        workdir = Path(args.workdir or scratch)
+        workdir.mkdir(parents=True, exist_ok=True)
+        _isolate(workdir)
+        sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+        try:
+            results = asyncio.run(_run(args))
+        finally:
+            from services.render_service import shutdown_executor
+
+            shutdown_executor()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+        print(f"Wrote {args.output}")
+    else:
+        print(output)
+    if args.baseline:
+        return _compare(results, args.baseline, args.threshold)
+    return 0
+
+
+def compare_command(args) -> int:
+    results = json.loads(Path(args.results).read_text())
+    return _compare(results, args.baseline, args.threshold)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="qr-keep benchmarks"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser(
+        "run", help="Seed a scratch database and run every benchmark"
+    )
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--codes", type=int, default=200, help="QR codes to seed")
+    run_parser.add_argument("--scans", type=int, default=50000, help="Scans to seed")
+    run_parser.add_argument("--days", type=int, default=90, help="Scan history length")
+    run_parser.add_argument("--repeat", type=int, default=50, help="Micro-benchmark runs")
+    run_parser.add_argument(
+        "--requests", type=int, default=200, help="Requests per route; 0 skips the load run"
+    )
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--workdir", help="Keep the database here instead of a temp dir")
+    run_parser.add_argument("--output", help="Write results JSON to this file")
+    run_parser.add_argument("--baseline", help="Compare against this results JSON")
+    run_parser.add_argument("--threshold", type=float, default=0.10)
+    run_parser.set_defaults(func=run_command)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare a results JSON against a baseline"
+    )
+    compare_parser.add_argument("results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+    compare_parser.set_defaults(func=compare_command)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
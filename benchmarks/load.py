@@ -0,0 +1,124 @@
+import asyncio
+import random
+import time
+from typing import Callable, NamedTuple, Optional
+
+import httpx
+
+from benchmarks.stats import summarize
+from benchmarks.synthetic import synthetic_qrcodes, synthetic_scans
+
+
+class Route(NamedTuple):
+    name: str
+    method: str
+    # Builds (path, json body) for one request from the shared generator
+    build: Callable[[random.Random], tuple[str, Optional[dict]]]
+    # Caps requests for endpoints that are slow by design
+    max_requests: Optional[int] = None
+
+
+def build_routes(qr_ids: list[int], window: dict) -> list[Route]:
+    """
+    Requests covering every router, spread over the seeded QR codes.
+    """
+    start = window["start"].isoformat()
+    end = window["end"].isoformat()
+    span = window["end"] - window["start"]
+
+    def qr_id(rng):
+        return rng.choice(qr_ids)
+
+    def new_qrcode(rng):
+        record = synthetic_qrcodes(rng, 1)[0]
+        record["location"] = {
+            "latitude": record.pop("latitude"),
+            "longitude": record.pop("longitude"),
+        }
+        return "/qrcode/generate", record
+
+    def new_scan(rng):
+        row = next(synthetic_scans(rng, [(qr_id(rng), 0.0, 0.0)], 1, window["end"], 1))
+        return f"/scan/{row['qr_id']}", {
+            "ip_address": row["ip_address"],
+            "user_agent": row["user_agent"],
+            "location": {"latitude": row["latitude"], "longitude": row["longitude"]},
+        }
+
+    def count_window(rng):
+        window_start = window["start"] + rng.uniform(0, 1) * span
+        return (
+            f"/scan/count/{qr_id(rng)}?start_time={window_start.isoformat()}&end_time={end}",
+            None,
+        )
+
+    return [
+        Route("qrcode.generate", "POST", new_qrcode),
+        Route("qrcode.data", "GET", lambda rng: (f"/qrcode/data/{qr_id(rng)}", None)),
+        Route("qrcode.fetch_image", "GET", lambda rng: (f"/qrcode/fetch_image/{qr_id(rng)}", None)),
+        Route("qrcode.all_data_page", "GET", lambda rng: ("/qrcode/all_data/?limit=100", None)),
+        Route("scan.create", "POST", new_scan),
+        Route("scan.page", "GET", lambda rng: (f"/scan/{qr_id(rng)}?limit=100", None)),
+        Route("scan.count", "GET", count_window),
+        Route(
+            "scan.timeseries",
+            "GET",
+            lambda rng: (
+                f"/scan/{qr_id(rng)}/timeseries?bucket=day&start_time={start}&end_time={end}",
+                None,
+            ),
+        ),
+        Route("map.pin", "GET", lambda rng: (f"/map/pin/{qr_id(rng)}", None), 50),
+        Route("map.geojson", "GET", lambda rng: ("/map/geojson?bbox=-10,35,30,60&limit=1000", None), 50),
+        Route("bulk.qrcodes_zip", "GET", lambda rng: ("/bulk/qrcodes.zip", None), 5),
+    ]
+
+
+async def _drive_route(
+    client: httpx.AsyncClient, route: Route, rng: random.Random, requests: int, concurrency: int
+) -> dict:
+    total = min(requests, route.max_requests or requests)
+    # Requests are built up front so generator cost is not measured
+    plans = [route.build(rng) for _ in range(total)]
+    pending = iter(plans)
+    samples = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for path, body in pending:
+            started = time.perf_counter()
+            response = await client.request(route.method, path, json=body)
+            await response.aread()
+            samples.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    elapsed = time.perf_counter() - started
+
+    result = summarize(samples)
+    result["errors"] = errors
+    result["throughput_rps"] = total / elapsed if elapsed else 0.0
+    return result
+
+
+async def run_load(
+    app, seed: int, qr_ids: list[int], window: dict, requests: int, concurrency: int
+) -> dict:
+    """
+    Drives the app in process through its ASGI interface, route by route,
+    with `concurrency` requests in flight. Startup and shutdown run as they
+    would under a server so background workers are active.
+    """
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for index, route in enumerate(build_routes(qr_ids, window)):
+                rng = random.Random(seed * 1000 + index)
+                results[route.name] = await _drive_route(
+                    client, route, rng, requests, concurrency
+                )
+    return results
@@ -0,0 +1,147 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.stats import summarize
+from benchmarks.synthetic import synthetic_qrcodes, synthetic_scans
+
+
+def _time(func, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+async def _time_async(func, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        await func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def _busiest_qrcode(db) -> int:
+    from sqlalchemy import func, select
+
+    from models.scan_model import ScanData
+
+    return db.scalar(
+        select(ScanData.qr_id)
+        .group_by(ScanData.qr_id)
+        .order_by(func.count().desc(), ScanData.qr_id)
+        .limit(1)
+    )
+
+
+async def bench_create_qrcode(rng: random.Random, repeat: int) -> dict:
+    """
+    Render plus insert of QR codes that are not in the render cache yet.
+    """
+    from database import AsyncSessionLocal
+    from schemas.qrcode import QRCodeCreate
+    from services.bulk_service import _normalize
+    from services.qrcode_service import create_qrcode_async
+    from services.render_cache_service import get_or_render
+
+    records = iter(synthetic_qrcodes(rng, repeat + 1))
+
+    async def create():
+        qr_data = QRCodeCreate.model_validate(_normalize(next(records)))
+        async with AsyncSessionLocal() as db:
+            image_hash = await get_or_render(db, qr_data)
+            await create_qrcode_async(db, qr_data, image_hash)
+
+    return await _time_async(create, repeat)
+
+
+def bench_save_scan_data(rng: random.Random, repeat: int, qr_ids: list[int]) -> dict:
+    from database import SessionLocal
+    from schemas.scan_data import ScanDataCreate
+    from services.scan_service import save_scan_data
+
+    scans = []
+    for row in synthetic_scans(
+        rng,
+        [(qr_id, 0.0, 0.0) for qr_id in qr_ids],
+        repeat + 1,
+        datetime.now(timezone.utc).replace(tzinfo=None),
+        1,
+    ):
+        scan = ScanDataCreate(
+            ip_address=row["ip_address"],
+            user_agent=row["user_agent"],
+            location={"latitude": row["latitude"], "longitude": row["longitude"]},
+        )
+        scans.append((scan, row["qr_id"]))
+    scans = iter(scans)
+
+    def save():
+        scan, qr_id = next(scans)
+        with SessionLocal() as db:
+            save_scan_data(db, scan, qr_id)
+
+    return _time(save, repeat)
+
+
+def bench_standard_map(repeat: int, max_scans: int) -> dict:
+    """
+    Raw-mode map of the most scanned QR code, capped at max_scans markers.
+    """
+    from database import ReadSessionLocal
+    from schemas.common import TimeBoundParams
+    from services.map_service import (
+        fetch_qrcode_location_data,
+        fetch_scan_location_data,
+        standard_map,
+    )
+
+    with ReadSessionLocal() as db:
+        qr_id = _busiest_qrcode(db)
+        qrcodes = fetch_qrcode_location_data(db, qr_id, TimeBoundParams())
+        scans = fetch_scan_location_data(db, qr_id, TimeBoundParams())[:max_scans]
+        db.expunge_all()
+    result = _time(lambda: standard_map(qrcodes=qrcodes, scans=scans), repeat)
+    result["markers"] = len(scans)
+    return result
+
+
+def bench_count_scans(rng: random.Random, repeat: int, window: dict) -> dict:
+    """
+    Scan counts of the most scanned QR code over random time windows.
+    """
+    from database import ReadSessionLocal
+    from services.rollup_service import count_scans
+
+    span = (window["end"] - window["start"]).total_seconds()
+    bounds = []
+    for _ in range(repeat + 1):
+        start = window["start"] + timedelta(seconds=rng.uniform(0, span))
+        end = start + rng.uniform(0, 1) * (window["end"] - start)
+        bounds.append((start, end))
+    bounds = iter(bounds)
+
+    with ReadSessionLocal() as db:
+        qr_id = _busiest_qrcode(db)
+        return _time(lambda: count_scans(db, qr_id, *next(bounds)), repeat)
+
+
+async def run_micro(seed: int, repeat: int, qr_ids: list[int], window: dict) -> dict:
+    """
+    Runs every micro-benchmark with its own seeded generator, so adding a
+    benchmark does not change the inputs of the others. Synchronous
+    benchmarks block the loop on purpose; nothing else runs meanwhile.
+    """
+    return {
+        "create_qrcode": await bench_create_qrcode(random.Random(seed + 1), repeat),
+        "save_scan_data": bench_save_scan_data(random.Random(seed + 2), repeat, qr_ids),
+        "standard_map": bench_standard_map(max(repeat // 4, 3), max_scans=500),
+        "count_scans": bench_count_scans(random.Random(seed + 3), repeat, window),
+    }
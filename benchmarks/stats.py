@@ -0,0 +1,60 @@
+import statistics
+
+# Metric compared against the baseline for each kind of result
+COMPARED_METRICS = {"micro": ["median_ms"], "load": ["p50_ms", "p99_ms"]}
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    # Nearest-rank on the sorted samples
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list[float]) -> dict:
+    """
+    Latency summary in milliseconds of samples taken in seconds.
+    """
+    ordered = sorted(sample * 1000 for sample in samples)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "min_ms": ordered[0],
+        "mean_ms": statistics.fmean(ordered),
+        "median_ms": statistics.median(ordered),
+        "stdev_ms": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "p50_ms": _percentile(ordered, 0.50),
+        "p90_ms": _percentile(ordered, 0.90),
+        "p99_ms": _percentile(ordered, 0.99),
+        "max_ms": ordered[-1],
+    }
+
+
+def compare_results(results: dict, baseline: dict, threshold: float) -> list[dict]:
+    """
+    Lists every compared metric with its change against the baseline;
+    entries slower by more than `threshold` (0.1 = 10%) are regressions.
+    Benchmarks missing on either side are skipped.
+    """
+    rows = []
+    for kind, metrics in COMPARED_METRICS.items():
+        for name, current in results.get(kind, {}).items():
+            previous = baseline.get(kind, {}).get(name)
+            if not previous:
+                continue
+            for metric in metrics:
+                before, after = previous.get(metric), current.get(metric)
+                if not before or after is None:
+                    continue
+                change = (after - before) / before
+                rows.append(
+                    {
+                        "benchmark": f"{kind}.{name}",
+                        "metric": metric,
+                        "baseline": before,
+                        "current": after,
+                        "change": change,
+                        "regression": change > threshold,
+                    }
+                )
+    return rows
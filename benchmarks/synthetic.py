@@ -0,0 +1,144 @@
+import random
+from datetime import datetime, timedelta
+from itertools import islice
+
+# (latitude, longitude, weight) of the metro areas scans cluster around
+CITIES = [
+    (40.7128, -74.0060, 9),
+    (51.5074, -0.1278, 8),
+    (48.8566, 2.3522, 6),
+    (52.5200, 13.4050, 5),
+    (35.6762, 139.6503, 8),
+    (37.7749, -122.4194, 5),
+    (-23.5505, -46.6333, 4),
+    (19.0760, 72.8777, 4),
+    (-33.8688, 151.2093, 3),
+    (1.3521, 103.8198, 3),
+]
+
+USER_AGENTS = [
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 13; SM-S918B) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/123.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+]
+
+# Relative scan volume per hour of day and per weekday (Monday first)
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 5, 7, 8, 8, 9, 10, 9, 8, 8, 9, 10, 10, 9, 7, 5, 3, 2]
+WEEKDAY_WEIGHTS = [8, 8, 8, 9, 10, 12, 9]
+
+COLORS = ["black", "navy", "darkgreen", "maroon", "#333333"]
+
+
+def _near(rng: random.Random, latitude: float, longitude: float, spread: float):
+    return (
+        max(-90.0, min(90.0, rng.gauss(latitude, spread))),
+        max(-180.0, min(180.0, rng.gauss(longitude, spread))),
+    )
+
+
+def synthetic_qrcodes(rng: random.Random, count: int) -> list[dict]:
+    """
+    QR code records placed in the metro areas, in the bulk import format.
+    """
+    cities = [city[:2] for city in CITIES]
+    weights = [city[2] for city in CITIES]
+    records = []
+    for index in range(count):
+        latitude, longitude = _near(rng, *rng.choices(cities, weights)[0], 0.2)
+        records.append(
+            {
+                "name": f"bench-{index}",
+                "url": f"https://example.com/c/{index}/{rng.getrandbits(32):08x}",
+                "version": rng.choice([1, 1, 1, 2, 3]),
+                "box_size": rng.choice([8, 10, 10, 12]),
+                "border": rng.choice([2, 4, 4]),
+                "fill_color": rng.choice(COLORS),
+                "back_color": "white",
+                "latitude": latitude,
+                "longitude": longitude,
+            }
+        )
+    return records
+
+
+def synthetic_scans(
+    rng: random.Random,
+    qrcodes: list[tuple[int, float, float]],
+    count: int,
+    end: datetime,
+    days: int,
+):
+    """
+    Yields scan rows for (id, latitude, longitude) QR codes. Popularity is
+    heavy-tailed, most scans happen near the code, volume grows over the
+    window and follows daily and weekly cycles.
+    """
+    popularity = [rng.paretovariate(1.2) for _ in qrcodes]
+    cities = [city[:2] for city in CITIES]
+    city_weights = [city[2] for city in CITIES]
+    day_weights = [
+        (1.0 + day / max(days, 1)) * WEEKDAY_WEIGHTS[(end - timedelta(days=days - day)).weekday()]
+        for day in range(days)
+    ]
+    ip_pool = [
+        f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        for _ in range(max(count // 4, 1))
+    ]
+    start = (end - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    for qr_id, latitude, longitude in islice(
+        iter(lambda: rng.choices(qrcodes, popularity)[0], None), count
+    ):
+        if rng.random() < 0.75:
+            scan_latitude, scan_longitude = _near(rng, latitude, longitude, 0.05)
+        else:
+            scan_latitude, scan_longitude = _near(
+                rng, *rng.choices(cities, city_weights)[0], 0.3
+            )
+        day = rng.choices(range(days), day_weights)[0]
+        hour = rng.choices(range(24), HOUR_WEIGHTS)[0]
+        created = start + timedelta(
+            days=day, hours=hour, seconds=rng.randrange(3600), microseconds=rng.randrange(10**6)
+        )
+        yield {
+            "qr_id": qr_id,
+            "ip_address": rng.choice(ip_pool),
+            "user_agent": rng.choice(USER_AGENTS),
+            "latitude": scan_latitude,
+            "longitude": scan_longitude,
+            "created": min(created, end),
+        }
+
+
+async def seed_database(
+    seed: int, codes: int, scans: int, days: int = 90, end: datetime = None
+) -> dict:
+    """
+    Fills the configured database with a reproducible data set through the
+    bulk import paths. Returns the created QR code ids and the scan window.
+    """
+    from services.bulk_service import import_qrcodes
+    from services.scan_ingest_service import write_scan_rows
+
+    rng = random.Random(seed)
+    end = end or datetime(2026, 1, 1)
+    records = synthetic_qrcodes(rng, codes)
+    result = await import_qrcodes(
+        (row, record, None) for row, record in enumerate(records, start=1)
+    )
+    qrcodes = [
+        (qr_id, record["latitude"], record["longitude"])
+        for qr_id, record in zip(result["ids"], records)
+    ]
+
+    rows = synthetic_scans(rng, qrcodes, scans, end, days)
+    while chunk := list(islice(rows, 5000)):
+        await write_scan_rows(chunk)
+    return {"ids": result["ids"], "start": end - timedelta(days=days), "end": end}
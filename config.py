@@ -0,0 +1,136 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+# Database: SQLAlchemy URL and connection pool limits. The async engine uses
+# the same database through aiosqlite.
+DATABASE_URL = os.getenv("QRKEEP_DATABASE_URL", "sqlite:///./qr_codes.db")
+DB_POOL_SIZE = _env_int("QRKEEP_DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _env_int("QRKEEP_DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _env_float("QRKEEP_DB_POOL_TIMEOUT", 30.0)
+# Run `manage.py migrate` when the app starts instead of as a separate step.
+MIGRATE_ON_STARTUP = _env_int("QRKEEP_MIGRATE_ON_STARTUP", 0) > 0
+
+# SQLite storage profile: "wal" (WAL journal, one writer connection per sync and
+# async engine taking turns through a shared lock, read-only reader pool, tuned
+# pragmas) or "legacy" (SQLite defaults).
+SQLITE_PROFILE = os.getenv("QRKEEP_SQLITE_PROFILE", "wal")
+SQLITE_CACHE_SIZE_KIB = _env_int("QRKEEP_SQLITE_CACHE_SIZE_KIB", 64 * 1024)
+SQLITE_MMAP_SIZE = _env_int("QRKEEP_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+SQLITE_BUSY_TIMEOUT_MS = _env_int("QRKEEP_SQLITE_BUSY_TIMEOUT_MS", 5000)
+# Seconds between WAL checkpoint / PRAGMA optimize runs; 0 disables them.
+SQLITE_MAINTENANCE_INTERVAL = _env_float("QRKEEP_SQLITE_MAINTENANCE_INTERVAL", 300.0)
+
+# Scan ingestion: "sync" writes each scan in its own transaction,
+# "batched" queues scans and writes them from a background flusher.
+SCAN_INGEST_MODE = os.getenv("QRKEEP_SCAN_INGEST_MODE", "sync")
+SCAN_INGEST_QUEUE_SIZE = _env_int("QRKEEP_SCAN_INGEST_QUEUE_SIZE", 10000)
+SCAN_INGEST_BATCH_SIZE = _env_int("QRKEEP_SCAN_INGEST_BATCH_SIZE", 500)
+SCAN_INGEST_FLUSH_INTERVAL = _env_float("QRKEEP_SCAN_INGEST_FLUSH_INTERVAL", 0.5)
+SCAN_INGEST_ENQUEUE_TIMEOUT = _env_float("QRKEEP_SCAN_INGEST_ENQUEUE_TIMEOUT", 1.0)
+# Retries of the final flush on shutdown before queued scans are spilled to
+# files in SCAN_INGEST_SPILL_DIR, which are written on the next start.
+SCAN_INGEST_STOP_RETRIES = _env_int("QRKEEP_SCAN_INGEST_STOP_RETRIES", 3)
+SCAN_INGEST_SPILL_DIR = os.getenv("QRKEEP_SCAN_INGEST_SPILL_DIR", "./scan_spill")
+
+# QR rendering: number of worker processes used to render images.
+# 0 renders in a thread instead of a process pool.
+RENDER_WORKERS = _env_int("QRKEEP_RENDER_WORKERS", os.cpu_count() or 1)
+RENDER_BATCH_MAX = _env_int("QRKEEP_RENDER_BATCH_MAX", 1000)
+
+# Render cache: in-memory budget for rendered images, in bytes.
+RENDER_CACHE_MAX_BYTES = _env_int("QRKEEP_RENDER_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+RENDER_CACHE_MAX_KEYS = _env_int("QRKEEP_RENDER_CACHE_MAX_KEYS", 100000)
+
+# Scan retention: days scans are kept before they are archived and deleted
+# (0 keeps them forever; QR codes can override it), how often the retention
+# pass runs, and how many rows each delete transaction removes.
+SCAN_RETENTION_DAYS = _env_int("QRKEEP_SCAN_RETENTION_DAYS", 0)
+SCAN_RETENTION_INTERVAL = _env_float("QRKEEP_SCAN_RETENTION_INTERVAL", 3600.0)
+SCAN_DELETE_CHUNK_SIZE = _env_int("QRKEEP_SCAN_DELETE_CHUNK_SIZE", 2000)
+# Archive of expired scans: one compressed NDJSON file per month and QR code.
+# "zstd" needs the zstandard package.
+SCAN_ARCHIVE_DIR = os.getenv("QRKEEP_SCAN_ARCHIVE_DIR", "./scan_archive")
+SCAN_ARCHIVE_COMPRESSION = os.getenv("QRKEEP_SCAN_ARCHIVE_COMPRESSION", "gzip")
+
+# Bulk import: rows validated and written per transaction, how many row
+# errors a response lists, and how much of an upload is buffered in memory
+# before spilling to a temporary file.
+BULK_CHUNK_SIZE = _env_int("QRKEEP_BULK_CHUNK_SIZE", 1000)
+BULK_MAX_ERRORS = _env_int("QRKEEP_BULK_MAX_ERRORS", 1000)
+BULK_SPOOL_MAX_MEMORY = _env_int("QRKEEP_BULK_SPOOL_MAX_MEMORY", 8 * 1024 * 1024)
+
+# Blob store for rendered images: "local" keeps content-addressed files under
+# BLOB_STORE_DIR, "database" keeps them in the render_blobs table.
+BLOB_STORE = os.getenv("QRKEEP_BLOB_STORE", "local")
+BLOB_STORE_DIR = os.getenv("QRKEEP_BLOB_STORE_DIR", "./blobs")
+
+# QR code metadata cache: entries kept per process, seconds an entry lives,
+# and how often the cross-process change counter is polled (0 disables).
+QRCODE_CACHE_MAX_ENTRIES = _env_int("QRKEEP_QRCODE_CACHE_MAX_ENTRIES", 100000)
+QRCODE_CACHE_TTL = _env_float("QRKEEP_QRCODE_CACHE_TTL", 300.0)
+QRCODE_CACHE_POLL_INTERVAL = _env_float("QRKEEP_QRCODE_CACHE_POLL_INTERVAL", 1.0)
+
+# QR code listing pagination
+QRCODE_PAGE_DEFAULT_LIMIT = _env_int("QRKEEP_QRCODE_PAGE_DEFAULT_LIMIT", 1000)
+QRCODE_PAGE_MAX_LIMIT = _env_int("QRKEEP_QRCODE_PAGE_MAX_LIMIT", 10000)
+
+# Scan history pagination and export
+SCAN_PAGE_DEFAULT_LIMIT = _env_int("QRKEEP_SCAN_PAGE_DEFAULT_LIMIT", 1000)
+SCAN_PAGE_MAX_LIMIT = _env_int("QRKEEP_SCAN_PAGE_MAX_LIMIT", 10000)
+SCAN_EXPORT_CHUNK_SIZE = _env_int("QRKEEP_SCAN_EXPORT_CHUNK_SIZE", 5000)
+
+# Maps: cell size in screen pixels used when aggregating scans server-side
+MAP_CELL_PIXELS = _env_int("QRKEEP_MAP_CELL_PIXELS", 64)
+MAP_MAX_CELLS = _env_int("QRKEEP_MAP_MAX_CELLS", 5000)
+
+# Map render cache: memory budget in bytes, optional directory for
+# persisting rendered maps across restarts, and seconds between sweeps that
+# delete persisted renders of outdated scan sets (0 disables).
+MAP_CACHE_MAX_BYTES = _env_int("QRKEEP_MAP_CACHE_MAX_BYTES", 128 * 1024 * 1024)
+MAP_CACHE_DIR = os.getenv("QRKEEP_MAP_CACHE_DIR") or None
+MAP_CACHE_SWEEP_INTERVAL = _env_float("QRKEEP_MAP_CACHE_SWEEP_INTERVAL", 600.0)
+
+# Thumbnails generated next to each rendered image, in pixels, and their
+# format ("png" or "webp").
+THUMBNAIL_ICON_PX = _env_int("QRKEEP_THUMBNAIL_ICON_PX", 48)
+THUMBNAIL_POPUP_PX = _env_int("QRKEEP_THUMBNAIL_POPUP_PX", 200)
+THUMBNAIL_FORMAT = os.getenv("QRKEEP_THUMBNAIL_FORMAT", "png")
+
+# Metrics: GET /metrics in Prometheus text format; 0 disables collection.
+METRICS_ENABLED = _env_int("QRKEEP_METRICS_ENABLED", 1) > 0
+# Fraction of requests whose SQL statements are recorded (0 turns the
+# profiler off); sampled requests slower than the threshold are logged.
+METRICS_PROFILE_SAMPLE_RATE = _env_float("QRKEEP_METRICS_PROFILE_SAMPLE_RATE", 0.0)
+METRICS_SLOW_REQUEST_MS = _env_float("QRKEEP_METRICS_SLOW_REQUEST_MS", 500.0)
+
+# HTTP caching: max-age in seconds for QR code images, which never change
+# for a given id, and for QR code data and scan listings, which clients
+# revalidate with their ETag (0 sends no-cache).
+HTTP_IMAGE_MAX_AGE = _env_int("QRKEEP_HTTP_IMAGE_MAX_AGE", 86400)
+HTTP_DATA_MAX_AGE = _env_int("QRKEEP_HTTP_DATA_MAX_AGE", 0)
+
+# Live scan streams: events buffered per subscriber before a slow one is
+# dropped, open streams allowed per process, seconds between coalesced count
+# updates and between keepalive comments on idle streams.
+SCAN_STREAM_QUEUE_SIZE = _env_int("QRKEEP_SCAN_STREAM_QUEUE_SIZE", 256)
+SCAN_STREAM_MAX_SUBSCRIBERS = _env_int("QRKEEP_SCAN_STREAM_MAX_SUBSCRIBERS", 10000)
+SCAN_STREAM_COUNT_INTERVAL = _env_float("QRKEEP_SCAN_STREAM_COUNT_INTERVAL", 1.0)
+SCAN_STREAM_KEEPALIVE = _env_float("QRKEEP_SCAN_STREAM_KEEPALIVE", 15.0)
+
+# Scan enrichment: seconds between background passes that parse user agents
+# and bucket IP addresses of new scans (0 disables), rows per transaction,
+# distinct user agents kept in the parse cache, and the prefix lengths IPv4
+# and IPv6 addresses are truncated to.
+SCAN_ENRICH_INTERVAL = _env_float("QRKEEP_SCAN_ENRICH_INTERVAL", 5.0)
+SCAN_ENRICH_BATCH_SIZE = _env_int("QRKEEP_SCAN_ENRICH_BATCH_SIZE", 1000)
+SCAN_ENRICH_UA_CACHE_SIZE = _env_int("QRKEEP_SCAN_ENRICH_UA_CACHE_SIZE", 10000)
+SCAN_ENRICH_IPV4_PREFIX = _env_int("QRKEEP_SCAN_ENRICH_IPV4_PREFIX", 24)
+SCAN_ENRICH_IPV6_PREFIX = _env_int("QRKEEP_SCAN_ENRICH_IPV6_PREFIX", 48)
@@ -1,13 +1,183 @@
-from sqlalchemy import create_engine
+import asyncio
+import threading
+import time
+
+from sqlalchemy import create_engine, event, exc, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.util import await_only
+
+import config
+
+DATABASE_URL = config.DATABASE_URL
+
+
+def async_database_url(url: str) -> str:
+    """
+    Maps a sync SQLite URL onto the aiosqlite driver; other URLs pass through.
+    """
+    parsed = make_url(url)
+    if parsed.drivername == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+def read_only_database_url(url: str) -> str:
+    """
+    Opens the same SQLite file through a read-only URI connection.
+    """
+    parsed = make_url(url)
+    return parsed.set(
+        database=f"file:{parsed.database}",
+        query={**parsed.query, "mode": "ro", "uri": "true"},
+    ).render_as_string(hide_password=False)
+
+
+def _is_sqlite_file(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (
+        None,
+        "",
+        ":memory:",
+    )
+
+
+# The "wal" profile splits every engine into one serialized writer connection
+# and a pool of read-only connections; "legacy" keeps a single shared pool
+# with SQLite's default rollback journal.
+WAL_PROFILE = config.SQLITE_PROFILE == "wal" and _is_sqlite_file(DATABASE_URL)
+
+
+def _pool_options(url: str, writer: bool = False) -> dict:
+    # In-memory SQLite uses a single static connection without a queue
+    if make_url(url).database in (None, "", ":memory:"):
+        return {}
+    if writer and WAL_PROFILE:
+        return {"pool_size": 1, "max_overflow": 0, "pool_timeout": config.DB_POOL_TIMEOUT}
+    return {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+    }
+
+
+def sqlite_pragmas(read_only: bool) -> list[str]:
+    pragmas = [
+        f"PRAGMA busy_timeout = {config.SQLITE_BUSY_TIMEOUT_MS}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size = -{config.SQLITE_CACHE_SIZE_KIB}",
+        f"PRAGMA mmap_size = {config.SQLITE_MMAP_SIZE}",
+    ]
+    if not read_only:
+        pragmas += ["PRAGMA journal_mode = WAL", "PRAGMA synchronous = NORMAL"]
+    return pragmas
+
+
+def _apply_pragmas(bind, pragmas: list[str]):
+    @event.listens_for(bind, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+class WriterLock:
+    """
+    One turn at the SQLite write lock shared by the sync and async writer
+    engines, held from connection checkout to checkin. Each engine has a
+    single writer connection, and the lock keeps the two from racing each
+    other into busy-timeout waits. Async checkouts wait without blocking the
+    event loop.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+
+    def _timed_out(self):
+        return exc.TimeoutError(
+            f"Waited {self.timeout:.0f}s for the database writer connection"
+        )
+
+    def acquire(self, connection_record):
+        if not self._lock.acquire(timeout=self.timeout):
+            raise self._timed_out()
+        connection_record.info["writer_lock"] = True
+
+    async def acquire_async(self, connection_record):
+        deadline = time.monotonic() + self.timeout
+        delay = 0.0005
+        while not self._lock.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                raise self._timed_out()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.02)
+        connection_record.info["writer_lock"] = True
+
+    def release(self, connection_record):
+        if connection_record is not None and connection_record.info.pop(
+            "writer_lock", False
+        ):
+            self._lock.release()
+
+    def install(self, sync_engine, async_engine):
+        @event.listens_for(sync_engine, "checkout")
+        def acquire_sync_writer(dbapi_connection, connection_record, proxy):
+            self.acquire(connection_record)
+
+        @event.listens_for(async_engine.sync_engine, "checkout")
+        def acquire_async_writer(dbapi_connection, connection_record, proxy):
+            await_only(self.acquire_async(connection_record))
+
+        for bind in (sync_engine, async_engine.sync_engine):
+            event.listen(bind, "checkin", self._on_checkin)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.release(connection_record)
 
-DATABASE_URL = "sqlite:///./qr_codes.db"
 
 engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}  # SQLite-specific
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},  # SQLite-specific
+    **_pool_options(DATABASE_URL, writer=True),
+)
+async_engine = create_async_engine(
+    async_database_url(DATABASE_URL), **_pool_options(DATABASE_URL, writer=True)
 )
+
+if WAL_PROFILE:
+    READ_DATABASE_URL = read_only_database_url(DATABASE_URL)
+    read_engine = create_engine(
+        READ_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        **_pool_options(DATABASE_URL),
+    )
+    async_read_engine = create_async_engine(
+        async_database_url(READ_DATABASE_URL), **_pool_options(DATABASE_URL)
+    )
+    for bind in (engine, async_engine.sync_engine):
+        _apply_pragmas(bind, sqlite_pragmas(read_only=False))
+    writer_lock = WriterLock(config.DB_POOL_TIMEOUT)
+    writer_lock.install(engine, async_engine)
+    for bind in (read_engine, async_read_engine.sync_engine):
+        _apply_pragmas(bind, sqlite_pragmas(read_only=True))
+else:
+    read_engine = engine
+    async_read_engine = async_engine
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+# Objects stay usable after commit; lazy loads are not possible on async sessions
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine, autoflush=False, expire_on_commit=False
+)
 
 Base = declarative_base()
 
@@ -19,3 +189,78 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+def upgrade_schema(bind=engine):
+    """
+    Brings tables created by older releases in line with the models:
+    adds missing columns and relaxes NOT NULL constraints the models dropped.
+    """
+    with bind.begin() as conn:
+        # Inspect through the same connection; the writer pool holds only one
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"]: col for col in inspector.get_columns(table.name)}
+            needs_rebuild = any(
+                column.nullable and not existing[column.name]["nullable"]
+                for column in table.columns
+                if column.name in existing
+            )
+            if needs_rebuild:
+                _rebuild_sqlite_table(conn, table, list(existing))
+                continue
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    default = ""
+                    if column.server_default is not None:
+                        default = f" DEFAULT {column.server_default.arg}"
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {table.name} "
+                            f"ADD COLUMN {column.name} {column_type}{default}"
+                        )
+                    )
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def _rebuild_sqlite_table(conn, table, existing_columns):
+    # SQLite cannot alter column constraints in place, so follow its documented
+    # procedure: create the new shape, copy rows, drop the old table, rename.
+    temp_name = f"{table.name}__new"
+    ddl = str(CreateTable(table).compile(conn))
+    ddl = ddl.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {temp_name} ", 1)
+    common = ", ".join(
+        column.name for column in table.columns if column.name in existing_columns
+    )
+
+    conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+    conn.exec_driver_sql(ddl)
+    conn.exec_driver_sql(
+        f"INSERT INTO {temp_name} ({common}) SELECT {common} FROM {table.name}"
+    )
+    conn.exec_driver_sql(f"DROP TABLE {table.name}")
+    conn.exec_driver_sql(f"ALTER TABLE {temp_name} RENAME TO {table.name}")
+    for index in table.indexes:
+        index.create(conn)
@@ -1,13 +1,73 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from database import engine, Base
-from routers import qrcode_router, scan_map_router, scan_router
 
-app = FastAPI()
+import config
+from database import async_engine, async_read_engine
+from routers import (
+    bulk_router,
+    metrics_router,
+    qrcode_router,
+    scan_map_router,
+    scan_router,
+)
+from services.map_cache_service import map_cache_sweep_task
+from services.metrics_service import MetricsMiddleware, instrument_engines
+from services.qrcode_cache_service import (
+    poll_qrcode_cache_version,
+    qrcode_cache_poll_task,
+)
+from services.render_service import shutdown_executor
+from services.retention_service import scan_retention_task
+from services.scan_enrichment_service import scan_enrichment_task
+from services.scan_ingest_service import scan_ingest_queue
+from services.scan_stream_service import scan_event_hub, scan_stream_count_task
+from services.sqlite_maintenance_service import sqlite_maintenance_task
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema setup normally runs out of band with `python manage.py migrate`
+    if config.MIGRATE_ON_STARTUP:
+        from services.schema_service import migrate_database
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+        await asyncio.to_thread(migrate_database)
+    if config.SCAN_INGEST_MODE == "batched":
+        await scan_ingest_queue.start()
+    await sqlite_maintenance_task.start()
+    await scan_retention_task.start()
+    await scan_enrichment_task.start()
+    await map_cache_sweep_task.start()
+    # Record the current version so the first poll has something to compare to
+    await poll_qrcode_cache_version()
+    await qrcode_cache_poll_task.start()
+    scan_event_hub.start()
+    await scan_stream_count_task.start()
+    yield
+    await scan_stream_count_task.stop()
+    scan_event_hub.stop()
+    await qrcode_cache_poll_task.stop()
+    await map_cache_sweep_task.stop()
+    await scan_enrichment_task.stop()
+    await scan_retention_task.stop()
+    await sqlite_maintenance_task.stop()
+    # Flush any queued scans before the worker exits
+    await scan_ingest_queue.stop()
+    shutdown_executor()
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Include routers
 app.include_router(qrcode_router.router, tags=["QR Code"])
 app.include_router(scan_router.router, tags=["Scan"])
 app.include_router(scan_map_router.router, tags=["Map"])
+app.include_router(bulk_router.router, tags=["Bulk"])
+
+if config.METRICS_ENABLED:
+    instrument_engines()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics_router.router, tags=["Metrics"])
@@ -0,0 +1,279 @@
+import argparse
+
+from database import SessionLocal, engine, Base, upgrade_schema
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+
+def migrate_command(args):
+    from services.schema_service import migrate_database
+
+    migrate_database()
+    print("Database schema is up to date")
+
+
+# Imported lazily by the app; any of these in a startup report is a regression
+HEAVY_MODULES = ["folium", "branca", "jinja2", "qrcode", "PIL"]
+
+
+def parse_importtime(output: str) -> list[tuple]:
+    """
+    Parses `python -X importtime` output into (module, self us, cumulative us,
+    depth) tuples in import order.
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # column header
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def import_report_command(args):
+    import json
+    import subprocess
+    import sys
+    from collections import defaultdict
+    from pathlib import Path
+
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).resolve().parent,
+    )
+    if completed.returncode != 0:
+        print(completed.stderr, file=sys.stderr)
+        raise SystemExit(completed.returncode)
+
+    modules = parse_importtime(completed.stderr)
+    packages = defaultdict(int)
+    for name, self_us, _, _ in modules:
+        packages[name.split(".")[0]] += self_us
+    loaded = {name for name, _, _, _ in modules}
+    report = {
+        "module": args.module,
+        "total_ms": sum(c for _, _, c, depth in modules if depth == 0) / 1000,
+        "modules": len(modules),
+        "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in loaded],
+        "packages_ms": {
+            name: self_us / 1000
+            for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[
+                : args.top
+            ]
+        },
+        "slowest_ms": {
+            name: cumulative_us / 1000
+            for name, _, cumulative_us, _ in sorted(modules, key=lambda m: -m[2])[
+                : args.top
+            ]
+        },
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"import {args.module}: {report['total_ms']:.1f} ms, {report['modules']} modules")
+    print(f"heavy modules loaded: {', '.join(report['heavy_modules_loaded']) or 'none'}")
+    print("\nself time by package:")
+    for name, ms in report["packages_ms"].items():
+        print(f"  {ms:8.1f} ms  {name}")
+    print("\ncumulative time by module:")
+    for name, ms in report["slowest_ms"].items():
+        print(f"  {ms:8.1f} ms  {name}")
+
+
+def migrate_blobs_command(args):
+    from services.blob_service import (
+        DatabaseBlobStore,
+        LocalBlobStore,
+        get_blob_store,
+        migrate_blobs,
+    )
+
+    if args.store == "local":
+        store = LocalBlobStore(args.dir) if args.dir else get_blob_store()
+    elif args.store == "database":
+        store = DatabaseBlobStore()
+    else:
+        store = get_blob_store()
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        result = migrate_blobs(db, store, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(
+        f"Moved {result['qrcodes']} QR code images and "
+        f"{result['render_blobs']} inline blobs to {type(store).__name__}"
+    )
+
+
+def rebuild_rollups_command(args):
+    from services.rollup_service import rebuild_scan_rollups
+
+    db = SessionLocal()
+    try:
+        rebuild_scan_rollups(db, qr_id=args.qr_id)
+    finally:
+        db.close()
+    print("Rebuilt scan rollups" + (f" for QR code {args.qr_id}" if args.qr_id else ""))
+
+
+def backfill_thumbnails_command(args):
+    import asyncio
+
+    from services.render_cache_service import backfill_thumbnails
+    from services.render_service import shutdown_executor
+
+    db = SessionLocal()
+    try:
+        created = asyncio.run(backfill_thumbnails(db, batch_size=args.batch_size))
+    finally:
+        db.close()
+        shutdown_executor()
+    print(f"Generated thumbnails for {created} images")
+
+
+def apply_retention_command(args):
+    import asyncio
+
+    from services.retention_service import apply_scan_retention
+
+    expired = asyncio.run(apply_scan_retention())
+    print(
+        f"Archived {sum(expired.values())} expired scans of {len(expired)} QR codes"
+    )
+
+
+def enrich_scans_command(args):
+    import asyncio
+
+    from services.scan_enrichment_service import (
+        backfill_scan_enrichment,
+        parse_user_agent,
+    )
+
+    enriched = asyncio.run(backfill_scan_enrichment(all_rows=args.all))
+    cache = parse_user_agent.cache_info()
+    print(
+        f"Enriched {enriched} scans "
+        f"({cache.currsize} distinct user agents, {cache.hits} cache hits)"
+    )
+
+
+def _import_command(args, import_func):
+    import asyncio
+
+    from services.bulk_service import detect_format, iter_upload_records
+    from services.render_service import shutdown_executor
+
+    format = args.format or detect_format(None, args.file) or "ndjson"
+    try:
+        with open(args.file, encoding="utf-8", errors="replace", newline="") as text:
+            result = asyncio.run(import_func(iter_upload_records(text, format)))
+    finally:
+        shutdown_executor()
+    for error in result["errors"]:
+        print(f"row {error['row']}: {error['error']}")
+    print(f"Imported {result['created']} of {result['rows']} rows")
+
+
+def import_qrcodes_command(args):
+    from services.bulk_service import import_qrcodes
+
+    _import_command(args, import_qrcodes)
+
+
+def import_scans_command(args):
+    from services.bulk_service import import_scans
+
+    _import_command(args, import_scans)
+
+
+def export_qrcodes_zip_command(args):
+    from services.bulk_service import iter_qrcodes_zip
+
+    with open(args.output, "wb") as output:
+        for data in iter_qrcodes_zip():
+            output.write(data)
+    print(f"Wrote {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="qr-keep management commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser(
+        "migrate", help="Create and upgrade the database schema"
+    )
+    migrate_parser.set_defaults(func=migrate_command)
+
+    import_report_parser = subparsers.add_parser(
+        "import-report", help="Show import timings of the app at startup"
+    )
+    import_report_parser.add_argument("--module", default="main")
+    import_report_parser.add_argument("--top", type=int, default=15)
+    import_report_parser.add_argument("--json", action="store_true")
+    import_report_parser.set_defaults(func=import_report_command)
+
+    migrate_blobs_parser = subparsers.add_parser(
+        "migrate-blobs", help="Move stored QR images into the blob store"
+    )
+    migrate_blobs_parser.add_argument(
+        "--store", choices=["local", "database"], help="Target blob store"
+    )
+    migrate_blobs_parser.add_argument("--dir", help="Directory for the local store")
+    migrate_blobs_parser.add_argument("--batch-size", type=int, default=200)
+    migrate_blobs_parser.set_defaults(func=migrate_blobs_command)
+
+    rebuild_rollups_parser = subparsers.add_parser(
+        "rebuild-rollups", help="Recompute scan rollups from raw scan data"
+    )
+    rebuild_rollups_parser.add_argument("--qr-id", type=int)
+    rebuild_rollups_parser.set_defaults(func=rebuild_rollups_command)
+
+    backfill_thumbnails_parser = subparsers.add_parser(
+        "backfill-thumbnails", help="Generate missing map thumbnails"
+    )
+    backfill_thumbnails_parser.add_argument("--batch-size", type=int, default=200)
+    backfill_thumbnails_parser.set_defaults(func=backfill_thumbnails_command)
+
+    apply_retention_parser = subparsers.add_parser(
+        "apply-retention", help="Archive and delete scans past their retention"
+    )
+    apply_retention_parser.set_defaults(func=apply_retention_command)
+
+    enrich_scans_parser = subparsers.add_parser(
+        "enrich-scans", help="Parse user agents and bucket IPs of stored scans"
+    )
+    enrich_scans_parser.add_argument(
+        "--all", action="store_true", help="Redo scans that are already enriched"
+    )
+    enrich_scans_parser.set_defaults(func=enrich_scans_command)
+
+    for name, func, help_text in [
+        ("import-qrcodes", import_qrcodes_command, "Create QR codes from CSV/NDJSON"),
+        ("import-scans", import_scans_command, "Record scans from CSV/NDJSON"),
+    ]:
+        import_parser = subparsers.add_parser(name, help=help_text)
+        import_parser.add_argument("file")
+        import_parser.add_argument("--format", choices=["csv", "ndjson"])
+        import_parser.set_defaults(func=func)
+
+    export_zip_parser = subparsers.add_parser(
+        "export-qrcodes-zip", help="Write a ZIP of every QR code image"
+    )
+    export_zip_parser.add_argument("output")
+    export_zip_parser.set_defaults(func=export_qrcodes_zip_command)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
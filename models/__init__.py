@@ -1,2 +1,5 @@
 from .qrcode_model import QRCode
 from .scan_model import ScanData
+from .render_blob_model import RenderBlob, RenderCacheEntry
+from .scan_rollup_model import ScanRollup
+from .cache_version_model import CacheVersion
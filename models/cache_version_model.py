@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String
+from database import Base
+
+
+class CacheVersion(Base):
+    """
+    Change counter per cached entity, bumped by every process that modifies
+    it so other processes know to drop their copies.
+    """
+
+    __tablename__ = "cache_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
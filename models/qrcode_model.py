@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, LargeBinary, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, LargeBinary, Float, ForeignKey
+from sqlalchemy.orm import deferred, relationship
 from database import Base
 
 
@@ -9,7 +9,12 @@ class QRCode(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     url = Column(String, nullable=False)
-    img_bytes = Column(LargeBinary, nullable=False)
+    # Legacy per-row image; new rows reference a shared RenderBlob instead.
+    # Deferred so metadata queries never load image bytes.
+    img_bytes = deferred(Column(LargeBinary, nullable=True))
+    image_hash = Column(
+        String(64), ForeignKey("render_blobs.content_hash"), nullable=True, index=True
+    )
     version = Column(Integer, nullable=False)
     box_size = Column(Integer, nullable=False)
     border = Column(Integer, nullable=False)
@@ -17,6 +22,12 @@ class QRCode(Base):
     back_color = Column(String, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+    # Bumped whenever scans are added or removed, for cache validation
+    scan_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped whenever the row itself is updated, for cache validation
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
+    # Days scans are kept before archival; NULL follows the global policy
+    retention_days = Column(Integer, nullable=True)
 
     scan_data = relationship(
         "ScanData", back_populates="qr_code", cascade="all, delete-orphan"
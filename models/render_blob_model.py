@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, ForeignKey, DateTime, func
+from sqlalchemy.orm import deferred
+from database import Base
+
+
+class RenderBlob(Base):
+    """
+    A rendered QR image stored once per distinct content hash. The bytes live
+    in the configured blob store; img_bytes is only used by the database backend.
+    """
+
+    __tablename__ = "render_blobs"
+
+    content_hash = Column(String(64), primary_key=True)
+    img_bytes = deferred(Column(LargeBinary, nullable=True))
+    size = Column(Integer, nullable=False)
+    created = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class RenderCacheEntry(Base):
+    """
+    Maps a hash of the render parameters to the image they produce.
+    """
+
+    __tablename__ = "render_cache_entries"
+
+    render_key = Column(String(64), primary_key=True)
+    content_hash = Column(
+        String(64), ForeignKey("render_blobs.content_hash"), nullable=False
+    )
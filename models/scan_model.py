@@ -1,10 +1,30 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, func
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    func,
+    text,
+)
 from sqlalchemy.orm import relationship
 from database import Base
 
 
 class ScanData(Base):
     __tablename__ = "scan_data"
+    __table_args__ = (
+        Index("ix_scan_data_qr_id_created", "qr_id", "created"),
+        # Keeps finding scans that still need enrichment cheap on large tables
+        Index(
+            "ix_scan_data_unenriched",
+            "id",
+            sqlite_where=text("enrichment_version = 0"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     qr_id = Column(Integer, ForeignKey("qr_codes.id"), nullable=False)
@@ -13,5 +33,15 @@ class ScanData(Base):
     latitude = Column(Float)
     longitude = Column(Float)
     created = Column(DateTime(timezone=True), server_default=func.now())
+    # Filled in by the background enrichment pass, never at ingest
+    device_type = Column(String, nullable=True)
+    browser = Column(String, nullable=True)
+    os = Column(String, nullable=True)
+    is_bot = Column(Boolean, nullable=True)
+    ip_prefix = Column(String, nullable=True)
+    # Enrichment rules version the row was processed with; 0 means pending
+    enrichment_version = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
 
-    qr_code = relationship("QRCode", back_populates="scan_data", lazy="joined")
+    qr_code = relationship("QRCode", back_populates="scan_data", lazy="select")
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from database import Base
+
+
+class ScanRollup(Base):
+    """
+    Scan count of one QR code within a minute, hour or day bucket (UTC).
+    """
+
+    __tablename__ = "scan_rollups"
+
+    qr_id = Column(Integer, ForeignKey("qr_codes.id"), primary_key=True)
+    granularity = Column(String(6), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,98 @@
+import io
+import tempfile
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+import config
+from schemas.bulk import BulkImportResult, BulkQRCodeImportResult
+from services.bulk_service import (
+    detect_format,
+    import_qrcodes,
+    import_scans,
+    iter_qrcodes_zip,
+    iter_upload_records,
+)
+
+
+router = APIRouter(prefix="/bulk")
+
+
+async def _spool_upload(request: Request):
+    """
+    Buffers the request body, spilling to a temporary file past
+    BULK_SPOOL_MAX_MEMORY, so large uploads are never held in memory.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=config.BULK_SPOOL_MAX_MEMORY)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def _upload_format(request: Request, format: Optional[str]) -> str:
+    """
+    Format of a raw CSV or NDJSON body: `?format=` or the Content-Type.
+    """
+    content_type = request.headers.get("content-type")
+    if content_type and content_type.lower().startswith("multipart/"):
+        raise HTTPException(
+            status_code=415,
+            detail="Multipart uploads are not supported; send the file as the body",
+        )
+    format = format or detect_format(content_type)
+    if format is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Send text/csv or application/x-ndjson, or set ?format=csv|ndjson",
+        )
+    return format
+
+
+def _upload_records(spool, format: str):
+    text = io.TextIOWrapper(spool, encoding="utf-8", errors="replace", newline="")
+    return iter_upload_records(text, format)
+
+
+@router.post("/qrcodes", response_model=BulkQRCodeImportResult)
+async def bulk_import_qrcodes(
+    request: Request, format: Optional[Literal["csv", "ndjson"]] = None
+):
+    """
+    Create QR codes from a CSV or NDJSON upload sent as the request body.
+
+    Rows use the `/qrcode/generate` fields; CSV uploads give the location as
+    `latitude` and `longitude` columns. Invalid rows are reported by row
+    number and skipped.
+    """
+    format = _upload_format(request, format)
+    with await _spool_upload(request) as spool:
+        return await import_qrcodes(_upload_records(spool, format))
+
+
+@router.post("/scans", response_model=BulkImportResult)
+async def bulk_import_scans(
+    request: Request, format: Optional[Literal["csv", "ndjson"]] = None
+):
+    """
+    Record scans from a CSV or NDJSON upload sent as the request body.
+
+    Each row needs `qr_id`, `ip_address`, `user_agent`, `latitude` and
+    `longitude`, and may carry a `created` timestamp.
+    """
+    format = _upload_format(request, format)
+    with await _spool_upload(request) as spool:
+        return await import_scans(_upload_records(spool, format))
+
+
+@router.get("/qrcodes.zip")
+async def export_qrcodes_zip():
+    """
+    Stream a ZIP archive of every QR code image.
+    """
+    return StreamingResponse(
+        iter_qrcodes_zip(),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=qrcodes.zip"},
+    )
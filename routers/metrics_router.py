@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Response
+
+from services.metrics_service import render_metrics
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Request, database and render metrics in Prometheus text format.
+    """
+    return Response(
+        content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
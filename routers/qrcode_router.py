@@ -1,54 +1,154 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
-from sqlalchemy.orm import Session
-from typing import List
-from io import BytesIO
-from starlette.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 
-from database import get_db
+from database import get_async_db, get_async_read_db
 from schemas.qrcode import QRCodeCreate, QRCodeResponse, QRCodeDataResponse
-from services.qrcode_service import create_qrcode, get_qrcode_by_qr_id
-from schemas.qrcode import QRCodeBase, Location
-from services.qrcode_service import get_all_qrcodes
+import config
+from services.qrcode_service import (
+    create_qrcode_async,
+    create_qrcodes_async,
+    get_qrcode_by_qr_id_async,
+)
+from services.http_cache_service import (
+    cache_headers,
+    etag_matches,
+    make_etag,
+    not_modified,
+)
+from services.image_format_service import (
+    negotiate_image_format,
+    qrcode_image_response,
+)
+from services.qrcode_cache_service import (
+    get_qrcode_metadata_async,
+    publish_qrcode_changes,
+    qrcode_cache,
+    stage_qrcode_changes,
+)
+from services.render_cache_service import (
+    get_or_render,
+    get_or_render_batch,
+    render_cache,
+)
+from schemas.qrcode import Location
+from schemas.retention import RetentionPolicy, RetentionPolicyResponse
+from services.retention_service import effective_retention_days
+from services.qrcode_listing_service import (
+    fetch_qrcode_page,
+    iter_qrcodes_json,
+    listing_version,
+    parse_fields,
+)
 
 
 router = APIRouter(prefix="/qrcode")
 
 
 @router.post("/generate", response_model=QRCodeResponse)
-async def generate_qrcode(qr_data: QRCodeCreate, db: Session = Depends(get_db)):
-    db_qrcode = create_qrcode(db, qr_data)
+async def generate_qrcode(
+    qr_data: QRCodeCreate, db: AsyncSession = Depends(get_async_db)
+):
+    image_hash = await get_or_render(db, qr_data)
+    db_qrcode = await create_qrcode_async(db, qr_data, image_hash)
     return db_qrcode
 
 
+@router.post("/generate_batch", response_model=List[QRCodeResponse])
+async def generate_qrcode_batch(
+    qr_datas: List[QRCodeCreate], db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Render many QR codes in parallel and store them in one transaction.
+    """
+    if len(qr_datas) > config.RENDER_BATCH_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds the limit of {config.RENDER_BATCH_MAX} QR codes",
+        )
+    image_hashes = await get_or_render_batch(db, qr_datas)
+    return await create_qrcodes_async(db, qr_datas, image_hashes)
+
+
+@router.get("/render_cache/stats")
+async def render_cache_stats():
+    """
+    Hit/miss counters and size of the render cache.
+    """
+    return render_cache.stats()
+
+
+@router.get("/metadata_cache/stats")
+async def metadata_cache_stats():
+    """
+    Hit/miss counters and size of the QR code metadata cache.
+    """
+    return qrcode_cache.stats()
+
+
 @router.get("/fetch_image/{qr_id}")
-async def get_qrcode_image(qr_id: str, db: Session = Depends(get_db)):
-    db_qrcode = get_qrcode_by_qr_id(db, qr_id)
-    if db_qrcode:
-        return Response(content=db_qrcode.img_bytes, media_type="image/png")
-    else:
+async def get_qrcode_image(
+    qr_id: str,
+    request: Request,
+    format: Optional[Literal["png", "svg", "webp"]] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Return the QR code image as PNG, SVG or WebP, chosen by `format` or the
+    Accept header.
+    """
+    db_qrcode = await get_qrcode_metadata_async(db, qr_id)
+    if not db_qrcode:
         raise HTTPException(status_code=404, detail="QR code not found")
+    return await qrcode_image_response(
+        db,
+        db_qrcode,
+        negotiate_image_format(format, request.headers.get("accept")),
+        request.headers.get("accept-encoding"),
+        if_none_match=request.headers.get("if-none-match"),
+    )
 
 
 @router.get("/download/{qr_id}")
-async def download_qrcode(qr_id: str, db: Session = Depends(get_db)):
-    db_qrcode = get_qrcode_by_qr_id(db, qr_id)
-    if db_qrcode:
-        return StreamingResponse(
-            BytesIO(db_qrcode.img_bytes),
-            media_type="image/png",
-            headers={"Content-Disposition": f"attachment; filename={qr_id}.png"},
-        )
-    else:
+async def download_qrcode(
+    qr_id: str,
+    request: Request,
+    format: Optional[Literal["png", "svg", "webp"]] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    db_qrcode = await get_qrcode_metadata_async(db, qr_id)
+    if not db_qrcode:
         raise HTTPException(status_code=404, detail="QR code not found")
+    return await qrcode_image_response(
+        db,
+        db_qrcode,
+        negotiate_image_format(format, request.headers.get("accept")),
+        request.headers.get("accept-encoding"),
+        filename=qr_id,
+        if_none_match=request.headers.get("if-none-match"),
+    )
 
 
 @router.get("/data/{qr_id}", response_model=QRCodeDataResponse)
-async def get_qrcode_data(qr_id: str, db: Session = Depends(get_db)):
+async def get_qrcode_data(
+    qr_id: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+):
     """
     Retrieve the original data used to generate the QR code.
     """
-    db_qrcode = get_qrcode_by_qr_id(db, qr_id)
+    db_qrcode = await get_qrcode_metadata_async(db, qr_id)
     if db_qrcode:
+        headers = cache_headers(
+            make_etag("qrcode", db_qrcode.id, db_qrcode.revision),
+            config.HTTP_DATA_MAX_AGE,
+        )
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return not_modified(headers)
+        response.headers.update(headers)
         return QRCodeDataResponse(
             id=db_qrcode.id,
             name=db_qrcode.name,
@@ -66,24 +166,60 @@ async def get_qrcode_data(qr_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="QR code not found")
 
 
-@router.get("/all_data/", response_model=List[QRCodeBase])
-async def all_qrcodes_data(db: Session = Depends(get_db)):
+@router.get("/all_data/")
+async def all_qrcodes_data(
+    request: Request,
+    limit: Optional[int] = Query(default=None, ge=1, le=config.QRCODE_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(
+        default=None, description="Comma-separated fields to return, e.g. id,name,url"
+    ),
+    db: AsyncSession = Depends(get_async_read_db),
+):
     """
-    Retrieve all QR codes with data.
+    Retrieve all QR codes with data, ordered by id.
+
+    Without `limit` the whole listing is streamed. With `limit` one page is
+    returned and the `X-Next-Cursor` header carries the cursor for the next.
     """
-    db_qrcodes = get_all_qrcodes(db)
-    # Convert the SQLAlchemy QRCode objects to the Pydantic QRCodeBase model
-    return [
-        QRCodeBase(
-            id=qr.id,
-            name=qr.name,
-            url=qr.url,
-            version=qr.version,
-            box_size=qr.box_size,
-            border=qr.border,
-            fill_color=qr.fill_color,
-            back_color=qr.back_color,
-            location=Location(latitude=qr.latitude, longitude=qr.longitude),
+    field_names = parse_fields(fields)
+    headers = cache_headers(
+        make_etag(await listing_version(db), ",".join(field_names), limit, cursor),
+        config.HTTP_DATA_MAX_AGE,
+    )
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return not_modified(headers)
+    if limit is None and cursor is None:
+        return StreamingResponse(
+            iter_qrcodes_json(field_names, config.QRCODE_PAGE_MAX_LIMIT),
+            media_type="application/json",
+            headers=headers,
         )
-        for qr in db_qrcodes
-    ]
+
+    body, next_cursor = await fetch_qrcode_page(
+        db, field_names, limit or config.QRCODE_PAGE_DEFAULT_LIMIT, cursor
+    )
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.put("/retention/{qr_id}", response_model=RetentionPolicyResponse)
+async def set_qrcode_retention(
+    qr_id: str, policy: RetentionPolicy, db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Set how long scans of a QR code are kept before they are archived.
+    """
+    db_qrcode = await get_qrcode_by_qr_id_async(db, qr_id)
+    if not db_qrcode:
+        raise HTTPException(status_code=404, detail="QR code not found")
+    db_qrcode.retention_days = policy.retention_days
+    version = await db.run_sync(stage_qrcode_changes, [db_qrcode.id])
+    await db.commit()
+    publish_qrcode_changes([db_qrcode.id], version)
+    return RetentionPolicyResponse(
+        qr_id=db_qrcode.id,
+        retention_days=db_qrcode.retention_days,
+        effective_retention_days=effective_retention_days(db_qrcode.retention_days),
+    )
@@ -1,32 +1,109 @@
-from fastapi import APIRouter, Depends
-from database import get_db
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+from database import get_read_db
 from services.map_service import (
+    aggregate_scan_cells_for_zoom,
+    aggregated_map,
     standard_map,
+    fetch_scan_coordinates,
     fetch_scan_location_data,
     fetch_qrcode_location_data,
-    generate_map_response,
+    map_html_response,
 )
+from services.http_cache_service import etag_matches
+from services.map_cache_service import map_cache_key, map_render_cache
+from services.qrcode_service import get_scan_version
+
+from services.fleet_map_service import iter_fleet_map_html
+from services.spatial_service import iter_bbox_geojson, parse_bbox
 
 from sqlalchemy.orm import Session
 from schemas.common import TimeBoundParams
-from fastapi import APIRouter, Depends
 
 
 router = APIRouter(prefix="/map")
 
 
 @router.get("/pin/{qr_id}")
-async def generate_standard_map(
-    qr_id: int, time_params: TimeBoundParams = Depends(), db: Session = Depends(get_db)
+def generate_standard_map(
+    qr_id: int,
+    request: Request,
+    time_params: TimeBoundParams = Depends(),
+    mode: Literal["cluster", "heatmap", "raw"] = "cluster",
+    zoom: int = Query(default=3, ge=0, le=18),
+    db: Session = Depends(get_read_db),
 ):
     """
     Creates a standard map of scanned QR codes.
+
+    `cluster` and `heatmap` aggregate scans into grid cells sized for `zoom`
+    on the server; `raw` places one marker per scan. Renders are cached until
+    the code's scans change and can be revalidated with If-None-Match.
     """
-    qrcode_locations = fetch_qrcode_location_data(
-        db=db, qr_id=qr_id, time_params=time_params
+    scan_version = get_scan_version(db, qr_id)
+    cache_key = map_cache_key(qr_id, time_params, mode, zoom, scan_version)
+    etag = f'"{cache_key}"'
+    if scan_version is not None and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    html = map_render_cache.get(cache_key) if scan_version is not None else None
+    if html is None:
+        qrcode_locations = fetch_qrcode_location_data(
+            db=db, qr_id=qr_id, time_params=time_params
+        )
+        if mode == "raw":
+            scan_locations = fetch_scan_location_data(
+                db=db, qr_id=qr_id, time_params=time_params
+            )
+            map_file = standard_map(qrcodes=qrcode_locations, scans=scan_locations)
+        else:
+            coordinates = fetch_scan_coordinates(
+                db=db, qr_id=qr_id, time_params=time_params
+            )
+            cells = aggregate_scan_cells_for_zoom(coordinates, zoom)
+            map_file = aggregated_map(
+                qrcodes=qrcode_locations, cells=cells, mode=mode, zoom=zoom
+            )
+        html = map_file.getvalue()
+        if scan_version is not None:
+            map_render_cache.put(cache_key, html)
+
+    return map_html_response(html, qr_id, etag)
+
+
+@router.get("/all")
+async def generate_fleet_map(time_params: TimeBoundParams = Depends()):
+    """
+    Streams a map of every QR code with its scan count in the time window.
+    """
+    return StreamingResponse(
+        iter_fleet_map_html(time_params),
+        media_type="text/html",
+        headers={"Content-Disposition": "inline; filename=map_all_qrcodes.html"},
     )
-    scan_locations = fetch_scan_location_data(
-        db=db, qr_id=qr_id, time_params=time_params
+
+
+@router.get("/cache/stats")
+async def map_cache_stats():
+    """
+    Hit/miss counters and size of the map render cache.
+    """
+    return map_render_cache.stats()
+
+
+@router.get("/geojson")
+async def scans_in_bbox(
+    bbox: str = Query(..., description="min_lon,min_lat,max_lon,max_lat"),
+    time_params: TimeBoundParams = Depends(),
+    limit: Optional[int] = Query(default=None, ge=1),
+):
+    """
+    Streams QR code placements and scans inside a bounding box as GeoJSON.
+    """
+    return StreamingResponse(
+        iter_bbox_geojson(
+            parse_bbox(bbox), time_params.start_time, time_params.end_time, limit
+        ),
+        media_type="application/geo+json",
     )
-    map_file = standard_map(qrcodes=qrcode_locations, scans=scan_locations)
-    return generate_map_response(map_file, qr_id)
@@ -1,29 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException
+from itertools import chain
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from database import get_db
-from schemas.scan_data import ScanDataCreate, ScanDataResponse, Location
+from database import get_async_db, get_async_read_db, get_read_db
+import config
+from schemas.scan_data import (
+    ScanAcceptedResponse,
+    ScanDataCreate,
+    ScanDataResponse,
+    Location,
+)
 from schemas.common import Location, TimeBoundParams
-from services.qrcode_service import get_qrcode_by_qr_id
-from services.scan_service import save_scan_data
-from models import ScanData
+from services.http_cache_service import (
+    cache_headers,
+    etag_matches,
+    make_etag,
+    not_modified,
+)
+from services.qrcode_cache_service import (
+    get_qrcode_metadata,
+    get_qrcode_metadata_async,
+)
+from services.scan_export_service import (
+    fetch_scan_page,
+    iter_scan_chunks,
+    iter_scan_csv,
+    iter_scan_ndjson,
+)
+from schemas.analytics import ScanTimeSeriesResponse
+from services.analytics_service import scan_timeseries
+from services.retention_service import delete_all_scans, iter_archived_scan_chunks
+from services.qrcode_service import get_scan_version_async
+from services.rollup_service import count_scans
+from services.scan_service import enqueue_scan_data, save_scan_data_async
+from services.scan_stream_service import iter_scan_events, scan_event_hub
 
 
 router = APIRouter(prefix="/scan")
 
 
-@router.post("/{qr_id}", response_model=ScanDataResponse)
+@router.post(
+    "/{qr_id}",
+    response_model=ScanDataResponse,
+    responses={202: {"model": ScanAcceptedResponse}},
+)
 async def create_scan_data(
-    qr_id: str, scan_data: ScanDataCreate, db: Session = Depends(get_db)
+    qr_id: str,
+    scan_data: ScanDataCreate,
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Create scan data for a QR code.
+
+    In batched ingest mode the scan is queued and acknowledged with a 202.
     """
-    db_scan_data = save_scan_data(db, scan_data, qr_id)
+    if config.SCAN_INGEST_MODE == "batched":
+        accepted = ScanAcceptedResponse(
+            qr_id=await enqueue_scan_data(read_db, scan_data, qr_id)
+        )
+        return JSONResponse(status_code=202, content=accepted.model_dump())
 
-    # Ensure that the qr_code relationship is loaded
-    db.refresh(db_scan_data, attribute_names=["qr_code"])
+    db_scan_data = await save_scan_data_async(db, scan_data, qr_id)
 
     response = ScanDataResponse(
         id=db_scan_data.id,
@@ -37,56 +80,178 @@ async def create_scan_data(
     return response
 
 
-@router.get("/{qr_id}", response_model=List[ScanDataResponse])
-async def get_scan_data_from_qrcode(qr_id: str, db: Session = Depends(get_db)):
+@router.get("/stream")
+async def stream_all_scans(include_scans: bool = False):
     """
-    Retrieve scan data associated with a specific QR code.
+    Server-Sent Events for every QR code: a `counts` event per interval
+    mapping QR code ids to their new scans, plus a `scan` event per scan when
+    `include_scans` is set.
+    """
+    scan_event_hub.check_capacity()
+    return _event_stream_response(None, include_scans)
+
+
+@router.get("/stream/stats")
+async def scan_stream_stats():
     """
-    db_qrcode = get_qrcode_by_qr_id(db, qr_id)
+    Subscriber and delivery counters of the scan event hub.
+    """
+    return scan_event_hub.stats()
+
+
+@router.get("/{qr_id}/stream")
+async def stream_scans(qr_id: str, db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Server-Sent Events for one QR code: a `scan` event per committed scan and
+    a `count` event per interval with the number of new scans.
+    """
+    db_qrcode = await get_qrcode_metadata_async(db, qr_id)
     if not db_qrcode:
         raise HTTPException(status_code=404, detail="QR code not found")
+    scan_event_hub.check_capacity()
+    return _event_stream_response(db_qrcode.id, True)
+
+
+def _event_stream_response(
+    qr_id: Optional[int], include_scans: bool
+) -> StreamingResponse:
+    return StreamingResponse(
+        iter_scan_events(qr_id, include_scans, config.SCAN_STREAM_KEEPALIVE),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{qr_id}", response_model=List[ScanDataResponse])
+async def get_scan_data_from_qrcode(
+    qr_id: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(
+        default=config.SCAN_PAGE_DEFAULT_LIMIT, ge=1, le=config.SCAN_PAGE_MAX_LIMIT
+    ),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Retrieve scan data associated with a specific QR code, oldest first.
+
+    Results are paginated; when more scans exist the `X-Next-Cursor` header
+    carries the cursor for the next page. Pages can be revalidated with
+    If-None-Match until the code's scans change.
+    """
+    scan_version = await get_scan_version_async(db, qr_id)
+    if scan_version is None:
+        raise HTTPException(status_code=404, detail="QR code not found")
+    headers = cache_headers(
+        make_etag("scans", qr_id, scan_version, limit, cursor),
+        config.HTTP_DATA_MAX_AGE,
+        private=True,
+    )
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return not_modified(headers)
+    response.headers.update(headers)
+
+    rows, next_cursor = await db.run_sync(fetch_scan_page, qr_id, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     scan_data = [
         ScanDataResponse(
             id=scan.id,
-            qr_id=qr_id,
             ip_address=scan.ip_address,
             user_agent=scan.user_agent,
             location=Location(latitude=scan.latitude, longitude=scan.longitude),
             created=scan.created,
+            device_type=scan.device_type,
+            browser=scan.browser,
+            os=scan.os,
+            is_bot=scan.is_bot,
+            ip_prefix=scan.ip_prefix,
         )
-        for scan in db_qrcode.scan_data
+        for scan in rows
     ]
 
     return scan_data
 
 
+@router.get("/{qr_id}/export")
+async def export_scan_data(
+    qr_id: str,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    include_archived: bool = True,
+    time_params: TimeBoundParams = Depends(),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Stream every scan of a QR code as NDJSON or CSV in constant memory.
+
+    Scans moved to the archive by the retention policy come first unless
+    `include_archived` is false.
+    """
+    if not await get_qrcode_metadata_async(db, qr_id):
+        raise HTTPException(status_code=404, detail="QR code not found")
+
+    chunks = iter_scan_chunks(int(qr_id), config.SCAN_EXPORT_CHUNK_SIZE, time_params)
+    if include_archived:
+        archived = iter_archived_scan_chunks(
+            int(qr_id), config.SCAN_EXPORT_CHUNK_SIZE, time_params
+        )
+        chunks = chain(archived, chunks)
+    if format == "csv":
+        body, media_type = iter_scan_csv(chunks), "text/csv"
+    else:
+        body, media_type = iter_scan_ndjson(chunks), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=scans_qrcode_{qr_id}.{format}"
+        },
+    )
+
+
+@router.get("/{qr_id}/timeseries", response_model=ScanTimeSeriesResponse)
+def scan_timeseries_from_qrcode(
+    qr_id: str,
+    bucket: Literal["minute", "hour", "day", "week"] = "day",
+    tz: str = "UTC",
+    time_params: TimeBoundParams = Depends(),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Scan histogram, hour/weekday heat tables and unique IP counts in a timezone.
+    """
+    if not get_qrcode_metadata(db, qr_id):
+        raise HTTPException(status_code=404, detail="QR code not found")
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+
+    return scan_timeseries(
+        db, int(qr_id), bucket, zone, time_params.start_time, time_params.end_time
+    )
+
+
 @router.get("/count/{qr_id}")
 async def scan_count_in_timeframe(
-    qr_id: str, db: Session = Depends(get_db), time_params: TimeBoundParams = Depends()
+    qr_id: str,
+    db: AsyncSession = Depends(get_async_read_db),
+    time_params: TimeBoundParams = Depends(),
 ):
     """
     Checks QR Code scan count within an optional timeframe.
     """
     # Fetch the QR code by ID
-    db_qrcode = get_qrcode_by_qr_id(db, qr_id)
+    db_qrcode = await get_qrcode_metadata_async(db, qr_id)
     if not db_qrcode:
         raise HTTPException(status_code=404, detail="QR code not found")
 
-    # Get scan data and filter by optional timeframe
-    scan_data_query = db.query(ScanData).filter(ScanData.qr_id == db_qrcode.id)
-
-    if time_params.start_time:
-        scan_data_query = scan_data_query.filter(
-            ScanData.created >= time_params.start_time
-        )
-    if time_params.end_time:
-        scan_data_query = scan_data_query.filter(
-            ScanData.created <= time_params.end_time
-        )
-
-    # Get the count of scans directly
-    scan_count = scan_data_query.count()
+    # Whole minute/hour/day buckets come from the rollups
+    scan_count = await db.run_sync(
+        count_scans, db_qrcode.id, time_params.start_time, time_params.end_time
+    )
 
     # Return the count and whether any scans were found (boolean)
     return {
@@ -96,21 +261,19 @@ async def scan_count_in_timeframe(
 
 @router.delete("/{qr_id}")
 async def delete_all_scanned_data_from_qrcode(
-    qr_id: str, db: Session = Depends(get_db)
+    qr_id: str, db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Delete all scanned data from a QR code.
+
+    Rows are removed in small transactions so scan writes keep flowing.
     """
-    db_qrcode = get_qrcode_by_qr_id(db, qr_id)
+    db_qrcode = await get_qrcode_metadata_async(db, qr_id)
     if not db_qrcode:
         raise HTTPException(status_code=404, detail="QR code not found")
+    await db.close()
 
-    deleted_rows = (
-        db.query(ScanData)
-        .filter(ScanData.qr_id == qr_id)
-        .delete(synchronize_session=False)
-    )
-    db.commit()
+    deleted_rows = await delete_all_scans(db_qrcode.id)
 
     if deleted_rows == 0:
         raise HTTPException(
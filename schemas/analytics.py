@@ -0,0 +1,25 @@
+from pydantic import BaseModel, Field
+from typing import List
+from datetime import datetime
+
+
+class TimeSeriesBucket(BaseModel):
+    bucket_start: datetime
+    count: int
+    unique_ips: int
+
+
+class ScanTimeSeriesResponse(BaseModel):
+    qr_id: int
+    bucket: str
+    timezone: str
+    total_scans: int
+    unique_ips: int
+    series: List[TimeSeriesBucket] = Field(
+        ..., description="Non-empty buckets in local time, oldest first"
+    )
+    hour_of_day: List[int] = Field(..., description="Scan counts for hours 0-23")
+    day_of_week: List[int] = Field(..., description="Scan counts, Monday first")
+    weekday_hour: List[List[int]] = Field(
+        ..., description="7x24 heat table of scans by weekday and hour"
+    )
@@ -0,0 +1,29 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+from schemas.scan_data import ScanDataCreate
+
+
+class BulkScanRow(ScanDataCreate):
+    qr_id: int
+    created: Optional[datetime] = Field(
+        default=None, description="Scan time; defaults to the time of the import"
+    )
+
+
+class BulkRowError(BaseModel):
+    row: int = Field(..., description="1-based row number in the upload")
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    rows: int
+    created: int
+    errors: List[BulkRowError]
+    errors_truncated: bool = False
+
+
+class BulkQRCodeImportResult(BulkImportResult):
+    ids: List[int] = Field(
+        default_factory=list, description="Ids of the created QR codes in upload order"
+    )
@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+
+class RetentionPolicy(BaseModel):
+    retention_days: Optional[int] = Field(
+        default=None,
+        ge=0,
+        description="Days scans are kept; 0 keeps them forever, null follows the global policy",
+    )
+
+
+class RetentionPolicyResponse(RetentionPolicy):
+    qr_id: int
+    effective_retention_days: int
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import Optional
 from schemas.common import Location
 
 
@@ -19,6 +20,17 @@ class ScanDataResponse(BaseModel):
         ..., description="Location data with latitude and longitude"
     )
     created: datetime
+    # Filled in by the background enrichment pass; null until it has run
+    device_type: Optional[str] = None
+    browser: Optional[str] = None
+    os: Optional[str] = None
+    is_bot: Optional[bool] = None
+    ip_prefix: Optional[str] = None
 
     class Config:
         from_attributes = True
+
+
+class ScanAcceptedResponse(BaseModel):
+    qr_id: int
+    status: str = "queued"
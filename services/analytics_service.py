@@ -0,0 +1,153 @@
+from datetime import datetime, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from schemas.analytics import ScanTimeSeriesResponse, TimeSeriesBucket
+from services.metrics_service import timed_query
+from services.rollup_service import to_utc_naive
+
+BUCKET_SECONDS = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+}
+
+# 1970-01-01 was a Thursday; shifting by three days makes weeks start on Monday
+_WEEK_SHIFT = 3 * 86400
+# UTC offsets only change on quarter-hour boundaries
+_OFFSET_STEP = 900
+
+EPOCH_SECONDS_SQL = (
+    "CAST(ROUND((julianday(created) - 2440587.5) * 86400.0) AS INTEGER)"
+)
+_SCAN_DTYPE = np.dtype([("seconds", np.int64), ("ip_address", object)])
+_FETCH_CHUNK = 50000
+
+
+def sqlite_timestamp(ts: datetime) -> str:
+    # Same text layout SQLAlchemy uses when it stores DateTime values
+    return to_utc_naive(ts).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def fetch_structured(db: Session, sql: str, params: list, dtype: np.dtype) -> np.ndarray:
+    """
+    Runs a raw SELECT and loads its rows straight from the DBAPI cursor into
+    a NumPy structured array in chunks, without ORM objects or Row wrappers.
+    """
+    cursor = db.connection().connection.cursor()
+    try:
+        with timed_query("raw", sql):
+            cursor.execute(sql, params)
+            chunks = []
+            while rows := cursor.fetchmany(_FETCH_CHUNK):
+                chunks.append(np.array(rows, dtype=dtype))
+    finally:
+        cursor.close()
+    if not chunks:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(chunks)
+
+
+def fetch_scan_columns(
+    db: Session,
+    qr_id: int,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> np.ndarray:
+    """
+    Fetches scan times as epoch seconds plus the IP column.
+    """
+    sql = (
+        f"SELECT {EPOCH_SECONDS_SQL}, ip_address "
+        "FROM scan_data WHERE qr_id = ? AND created IS NOT NULL"
+    )
+    params: list = [qr_id]
+    if start_time is not None:
+        sql += " AND created >= ?"
+        params.append(sqlite_timestamp(start_time))
+    if end_time is not None:
+        sql += " AND created <= ?"
+        params.append(sqlite_timestamp(end_time))
+    return fetch_structured(db, sql, params, _SCAN_DTYPE)
+
+
+def to_local_seconds(seconds: np.ndarray, tz: ZoneInfo) -> np.ndarray:
+    """
+    Shifts epoch seconds into local wall-clock seconds. The offset is looked up
+    once per distinct quarter hour rather than once per scan.
+    """
+    if seconds.size == 0:
+        return seconds
+    steps, inverse = np.unique(seconds // _OFFSET_STEP, return_inverse=True)
+    offsets = np.array(
+        [
+            datetime.fromtimestamp(int(step) * _OFFSET_STEP, tz).utcoffset().total_seconds()
+            for step in steps
+        ],
+        dtype=np.int64,
+    )
+    return seconds + offsets[inverse]
+
+
+def factorize(values: np.ndarray) -> np.ndarray:
+    codes: dict = {}
+    return np.fromiter(
+        (codes.setdefault(value, len(codes)) for value in values),
+        dtype=np.int64,
+        count=len(values),
+    )
+
+
+def scan_timeseries(
+    db: Session,
+    qr_id: int,
+    bucket: str,
+    tz: ZoneInfo,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> ScanTimeSeriesResponse:
+    scans = fetch_scan_columns(db, qr_id, start_time, end_time)
+    seconds = scans["seconds"]
+    local = to_local_seconds(seconds, tz)
+    ip_codes = factorize(scans["ip_address"])
+
+    bucket_seconds = BUCKET_SECONDS[bucket]
+    shift = _WEEK_SHIFT if bucket == "week" else 0
+    bucket_ids = (local + shift) // bucket_seconds
+    bucket_keys, counts = np.unique(bucket_ids, return_counts=True)
+
+    # Distinct (bucket, ip) pairs give the unique IPs per bucket
+    ip_count = int(ip_codes.max()) + 1 if ip_codes.size else 0
+    pairs = np.unique(bucket_ids * max(ip_count, 1) + ip_codes)
+    _, unique_ip_counts = np.unique(pairs // max(ip_count, 1), return_counts=True)
+
+    hours = (local // 3600) % 24
+    weekdays = (local // 86400 + 3) % 7
+    weekday_hour = np.bincount(weekdays * 24 + hours, minlength=7 * 24).reshape(7, 24)
+
+    series = [
+        TimeSeriesBucket(
+            bucket_start=datetime.fromtimestamp(
+                int(key) * bucket_seconds - shift, timezone.utc
+            ).replace(tzinfo=tz),
+            count=int(count),
+            unique_ips=int(unique_ips),
+        )
+        for key, count, unique_ips in zip(bucket_keys, counts, unique_ip_counts)
+    ]
+
+    return ScanTimeSeriesResponse(
+        qr_id=qr_id,
+        bucket=bucket,
+        timezone=tz.key,
+        total_scans=int(seconds.size),
+        unique_ips=ip_count,
+        series=series,
+        hour_of_day=weekday_hour.sum(axis=0).tolist(),
+        day_of_week=weekday_hour.sum(axis=1).tolist(),
+        weekday_hour=weekday_hour.tolist(),
+    )
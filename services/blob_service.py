@@ -0,0 +1,177 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import config
+from database import ReadSessionLocal
+from models.qrcode_model import QRCode
+from models.render_blob_model import RenderBlob
+from services.qrcode_cache_service import publish_qrcode_changes, stage_qrcode_changes
+
+
+class BlobStore:
+    """
+    Storage backend for rendered images, addressed by content hash.
+    """
+
+    # Whether bytes live in the render_blobs row itself
+    stores_inline = False
+
+    def put(self, content_hash: str, data: bytes):
+        raise NotImplementedError
+
+    def get(self, content_hash: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def path(self, content_hash: str) -> Optional[Path]:
+        """
+        Filesystem path of the blob when it can be served straight from disk.
+        """
+        return None
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, content_hash: str) -> Path:
+        # No suffix: blobs are PNG, WebP, gzipped SVG or thumbnails alike
+        return self.root / content_hash[:2] / content_hash[2:4] / content_hash
+
+    def _existing_path(self, content_hash: str) -> Optional[Path]:
+        target = self._path(content_hash)
+        if target.exists():
+            return target
+        # Blobs written by earlier releases carry a .png suffix
+        legacy = target.with_name(f"{content_hash}.png")
+        return legacy if legacy.exists() else None
+
+    def put(self, content_hash: str, data: bytes):
+        if self._existing_path(content_hash):
+            return
+        target = self._path(content_hash)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so readers never see partial blobs
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def get(self, content_hash: str) -> Optional[bytes]:
+        target = self._existing_path(content_hash)
+        try:
+            return target.read_bytes() if target else None
+        except FileNotFoundError:
+            return None
+
+    def path(self, content_hash: str) -> Optional[Path]:
+        return self._existing_path(content_hash)
+
+
+class DatabaseBlobStore(BlobStore):
+    """
+    Legacy backend that keeps image bytes in the render_blobs table.
+    """
+
+    stores_inline = True
+
+    def put(self, content_hash: str, data: bytes):
+        # Bytes are written with the render_blobs row by the caller
+        pass
+
+    def get(self, content_hash: str) -> Optional[bytes]:
+        db = ReadSessionLocal()
+        try:
+            return (
+                db.query(RenderBlob.img_bytes)
+                .filter(RenderBlob.content_hash == content_hash)
+                .scalar()
+            )
+        finally:
+            db.close()
+
+
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    global _blob_store
+    if _blob_store is None:
+        if config.BLOB_STORE == "database":
+            _blob_store = DatabaseBlobStore()
+        elif config.BLOB_STORE == "local":
+            _blob_store = LocalBlobStore(config.BLOB_STORE_DIR)
+        else:
+            raise ValueError(f"Unknown blob store: {config.BLOB_STORE}")
+    return _blob_store
+
+
+def migrate_blobs(db: Session, store: BlobStore, batch_size: int = 200) -> dict:
+    """
+    Moves image bytes into the given blob store: legacy per-row images on
+    qr_codes first, then inline render_blobs rows when the store keeps files.
+    Commits after every batch so the writer lock is released regularly.
+    """
+    moved_qrcodes = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(QRCode.id, QRCode.img_bytes)
+            .filter(QRCode.id > last_id, QRCode.img_bytes.isnot(None))
+            .order_by(QRCode.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        blobs = {}
+        for qr_id, img_bytes in rows:
+            image_hash = hashlib.sha256(img_bytes).hexdigest()
+            store.put(image_hash, img_bytes)
+            blobs[image_hash] = {
+                "content_hash": image_hash,
+                "img_bytes": img_bytes if store.stores_inline else None,
+                "size": len(img_bytes),
+            }
+            db.query(QRCode).filter(QRCode.id == qr_id).update(
+                {QRCode.image_hash: image_hash, QRCode.img_bytes: None},
+                synchronize_session=False,
+            )
+        db.execute(
+            sqlite_insert(RenderBlob).values(list(blobs.values())).on_conflict_do_nothing()
+        )
+        moved_ids = [qr_id for qr_id, _ in rows]
+        version = stage_qrcode_changes(db, moved_ids)
+        db.commit()
+        publish_qrcode_changes(moved_ids, version)
+        moved_qrcodes += len(rows)
+        last_id = rows[-1][0]
+
+    moved_blobs = 0
+    while not store.stores_inline:
+        rows = (
+            db.query(RenderBlob.content_hash, RenderBlob.img_bytes)
+            .filter(RenderBlob.img_bytes.isnot(None))
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        for image_hash, img_bytes in rows:
+            store.put(image_hash, img_bytes)
+        db.query(RenderBlob).filter(
+            RenderBlob.content_hash.in_([row[0] for row in rows])
+        ).update({RenderBlob.img_bytes: None}, synchronize_session=False)
+        db.commit()
+        moved_blobs += len(rows)
+
+    return {"qrcodes": moved_qrcodes, "render_blobs": moved_blobs}
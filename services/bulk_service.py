@@ -0,0 +1,249 @@
+import csv
+import json
+import re
+import zipfile
+from itertools import islice
+from typing import Iterator, Optional, TextIO
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+import config
+from database import AsyncReadSessionLocal, AsyncSessionLocal, ReadSessionLocal
+from models.qrcode_model import QRCode
+from schemas.bulk import BulkScanRow
+from schemas.qrcode import QRCodeCreate
+from services.qrcode_service import qrcode_row
+from services.render_cache_service import get_blob_bytes, get_or_render_batch
+from services.rollup_service import to_utc_naive
+from services.scan_ingest_service import scan_row, write_scan_rows
+
+
+UPLOAD_MEDIA_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/json": "ndjson",
+}
+
+
+def detect_format(
+    content_type: Optional[str], filename: Optional[str] = None
+) -> Optional[str]:
+    """
+    Upload format named by a file extension or Content-Type, or None when
+    neither names CSV or NDJSON.
+    """
+    if filename and filename.endswith(".csv"):
+        return "csv"
+    if filename and filename.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    if content_type:
+        return UPLOAD_MEDIA_TYPES.get(content_type.split(";")[0].strip().lower())
+    return None
+
+
+def iter_upload_records(text: TextIO, format: str) -> Iterator[tuple]:
+    """
+    Yields (row number, record, error) for every row of a CSV or NDJSON
+    upload. Rows that cannot be parsed carry an error instead of a record.
+    """
+    if format == "csv":
+        for row_number, record in enumerate(csv.DictReader(text), start=1):
+            yield row_number, record, None
+        return
+    for row_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield row_number, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(record, dict):
+            yield row_number, None, "Expected a JSON object"
+            continue
+        yield row_number, record, None
+
+
+def _normalize(record: dict) -> dict:
+    # Empty CSV cells fall back to the model defaults, and flat
+    # latitude/longitude columns become the nested location
+    record = {key: value for key, value in record.items() if value not in ("", None)}
+    if "location" not in record and ("latitude" in record or "longitude" in record):
+        record["location"] = {
+            "latitude": record.pop("latitude", None),
+            "longitude": record.pop("longitude", None),
+        }
+    return record
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+class BulkImportReport:
+    """
+    Running totals of an import; keeps at most BULK_MAX_ERRORS row errors.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.ids: list[int] = []
+        self.errors: list[dict] = []
+        self.errors_truncated = False
+
+    def error(self, row_number: int, message: str):
+        if len(self.errors) < config.BULK_MAX_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+        else:
+            self.errors_truncated = True
+
+    def validate(self, records: list[tuple], model) -> list[tuple]:
+        valid = []
+        for row_number, record, error in records:
+            self.rows += 1
+            if error is not None:
+                self.error(row_number, error)
+                continue
+            try:
+                valid.append((row_number, model.model_validate(_normalize(record))))
+            except ValidationError as exc:
+                self.error(row_number, _describe(exc))
+        return valid
+
+    def result(self, with_ids: bool = False) -> dict:
+        result = {
+            "rows": self.rows,
+            "created": self.created,
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+            "errors_truncated": self.errors_truncated,
+        }
+        if with_ids:
+            result["ids"] = self.ids
+        return result
+
+
+def _chunks(records: Iterator[tuple]) -> Iterator[list]:
+    while chunk := list(islice(records, config.BULK_CHUNK_SIZE)):
+        yield chunk
+
+
+async def import_qrcodes(records: Iterator[tuple]) -> dict:
+    """
+    Validates, renders and inserts QR codes chunk by chunk, one transaction
+    per chunk. Invalid rows are reported and skipped.
+    """
+    report = BulkImportReport()
+    for chunk in _chunks(records):
+        valid = report.validate(chunk, QRCodeCreate)
+        if not valid:
+            continue
+        qr_datas = [qr_data for _, qr_data in valid]
+        async with AsyncSessionLocal() as db:
+            image_hashes = await get_or_render_batch(db, qr_datas)
+            result = await db.execute(
+                insert(QRCode).returning(QRCode.id, sort_by_parameter_order=True),
+                [
+                    qrcode_row(qr_data, image_hash)
+                    for qr_data, image_hash in zip(qr_datas, image_hashes)
+                ],
+            )
+            ids = list(result.scalars())
+            await db.commit()
+        report.created += len(ids)
+        report.ids.extend(ids)
+    return report.result(with_ids=True)
+
+
+async def import_scans(records: Iterator[tuple]) -> dict:
+    """
+    Validates and inserts scans chunk by chunk. Rows referencing unknown QR
+    codes are reported and skipped.
+    """
+    report = BulkImportReport()
+    for chunk in _chunks(records):
+        valid = report.validate(chunk, BulkScanRow)
+        if not valid:
+            continue
+        async with AsyncReadSessionLocal() as db:
+            known = set(
+                await db.scalars(
+                    select(QRCode.id).where(
+                        QRCode.id.in_({scan.qr_id for _, scan in valid})
+                    )
+                )
+            )
+        rows = []
+        for row_number, scan in valid:
+            if scan.qr_id not in known:
+                report.error(row_number, f"QR code {scan.qr_id} not found")
+                continue
+            row = scan_row(scan, scan.qr_id)
+            if scan.created is not None:
+                row["created"] = to_utc_naive(scan.created)
+            rows.append(row)
+        if rows:
+            await write_scan_rows(rows)
+            report.created += len(rows)
+    return report.result()
+
+
+class _ZipStream:
+    """
+    Write-only sink for ZipFile; the bytes written so far are taken out
+    after every member so the archive never accumulates in memory.
+    """
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _zip_name(qr_id: int, name: str) -> str:
+    safe_name = re.sub(r"[^A-Za-z0-9._-]+", "_", name or "").strip("._")
+    return f"{qr_id}_{safe_name}.png" if safe_name else f"{qr_id}.png"
+
+
+def iter_qrcodes_zip() -> Iterator[bytes]:
+    """
+    Streams a ZIP of every QR code image. PNGs are stored without
+    recompression and written one member at a time.
+    """
+    db = ReadSessionLocal()
+    stream = _ZipStream()
+    try:
+        with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+            result = db.execute(
+                select(QRCode.id, QRCode.name, QRCode.image_hash)
+                .order_by(QRCode.id)
+                .execution_options(yield_per=500)
+            )
+            for qr_id, name, image_hash in result:
+                if image_hash:
+                    img_bytes = get_blob_bytes(image_hash, cache=False)
+                else:
+                    img_bytes = db.scalar(
+                        select(QRCode.img_bytes).where(QRCode.id == qr_id)
+                    )
+                if img_bytes is None:
+                    continue
+                archive.writestr(_zip_name(qr_id, name), img_bytes)
+                yield stream.drain()
+        yield stream.drain()
+    finally:
+        db.close()
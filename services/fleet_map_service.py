@@ -0,0 +1,213 @@
+import base64
+import json
+from typing import Iterator, Optional
+
+from sqlalchemy import and_, func, select
+
+import config
+from database import ReadSessionLocal
+from models.qrcode_model import QRCode
+from models.scan_model import ScanData
+from schemas.common import TimeBoundParams
+from services.metrics_service import timed
+from services.render_cache_service import get_blob_bytes, get_thumbnail_bytes
+from services.rollup_service import to_utc_naive
+from services.thumbnail_service import build_sprite_sheet, thumbnail_media_type
+
+LEAFLET_JS = "https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js"
+LEAFLET_CSS = "https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css"
+MARKERCLUSTER_JS = "https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/leaflet.markercluster.js"
+MARKERCLUSTER_CSS = [
+    "https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/MarkerCluster.css",
+    "https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/MarkerCluster.Default.css",
+]
+
+_CHUNK_SIZE = 500
+
+_HEAD = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>QR Keep fleet map</title>
+<link rel="stylesheet" href="{LEAFLET_CSS}">
+{"".join(f'<link rel="stylesheet" href="{href}">' for href in MARKERCLUSTER_CSS)}
+<script src="{LEAFLET_JS}"></script>
+<script src="{MARKERCLUSTER_JS}"></script>
+<style>
+html, body, #map {{ width: 100%; height: 100%; margin: 0; padding: 0; }}
+.qr-icon {{ background: none; border: none; }}
+.qr-icon div {{ width: 24px; height: 24px; }}
+</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var map = L.map("map").setView([0, 0], 2);
+L.tileLayer("https://tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png", {{
+    maxZoom: 19,
+    attribution: "&copy; OpenStreetMap contributors"
+}}).addTo(map);
+var cluster = L.markerClusterGroup().addTo(map);
+var images = {{}};
+var icons = {{}};
+var bounds = L.latLngBounds([]);
+function escapeHtml(value) {{
+    var div = document.createElement("div");
+    div.textContent = value === null ? "" : String(value);
+    return div.innerHTML;
+}}
+var sheetCount = 0;
+function defineImages(sheet, columns, ids, popups) {{
+    // Icons of one chunk share a sprite sheet and are picked by offset
+    var sheetClass = "qr-sheet-" + sheetCount++;
+    var style = document.createElement("style");
+    style.textContent = "." + sheetClass + " {{ background-image: url('" + sheet
+        + "'); background-size: " + columns * 24 + "px auto; }}";
+    document.head.appendChild(style);
+    ids.forEach(function (id, position) {{
+        var x = -(position % columns) * 24;
+        var y = -Math.floor(position / columns) * 24;
+        images[id] = popups[position];
+        icons[id] = L.divIcon({{
+            className: "qr-icon",
+            iconSize: [24, 24],
+            html: '<div class="' + sheetClass + '" style="background-position: '
+                + x + "px " + y + 'px"></div>'
+        }});
+    }});
+}}
+function popupFor(row) {{
+    return '<div style="min-width: 150px; max-width: 400px;">'
+        + "<b>Name:</b> " + escapeHtml(row[3]) + "<br>"
+        + "<b>URL:</b> " + escapeHtml(row[4]) + "<br>"
+        + "<b>Location:</b> " + row[1] + ", " + row[2] + "<br>"
+        + "<b>Scans:</b> " + row[6] + "<br>"
+        + "<b>Last Scan:</b> " + escapeHtml(row[7] || "never") + "<br><br>"
+        + '<div style="text-align: center;"><img src="' + images[row[5]]
+        + '" alt="QR Code" style="width:100px;"></div></div>';
+}}
+function addMarkers(rows) {{
+    rows.forEach(function (row) {{
+        var marker = L.marker([row[1], row[2]], {{icon: icons[row[5]]}});
+        // Popups are built on first open instead of once per marker up front
+        marker.bindPopup(function () {{ return popupFor(row); }}, {{maxWidth: 300}});
+        cluster.addLayer(marker);
+        bounds.extend([row[1], row[2]]);
+    }});
+}}
+</script>
+"""
+
+_TAIL = """<script>
+if (bounds.isValid()) { map.fitBounds(bounds, {maxZoom: 12}); }
+</script>
+</body>
+</html>
+"""
+
+
+def _script(statement: str) -> str:
+    # Keep "</script>" inside JSON strings from closing the tag
+    return "<script>" + statement.replace("</", "<\\/") + "</script>\n"
+
+
+def fleet_map_query(time_params: TimeBoundParams):
+    """
+    One projected query for every placement and its scan aggregates in the
+    window. The time bounds are part of the join, so codes without scans in
+    the window still appear with a count of zero.
+    """
+    join_condition = [ScanData.qr_id == QRCode.id]
+    if time_params.start_time:
+        join_condition.append(ScanData.created >= to_utc_naive(time_params.start_time))
+    if time_params.end_time:
+        join_condition.append(ScanData.created <= to_utc_naive(time_params.end_time))
+
+    return (
+        select(
+            QRCode.id,
+            QRCode.latitude,
+            QRCode.longitude,
+            QRCode.name,
+            QRCode.url,
+            QRCode.image_hash,
+            func.count(ScanData.id),
+            func.max(ScanData.created),
+        )
+        .outerjoin(ScanData, and_(*join_condition))
+        .group_by(QRCode.id)
+        .order_by(QRCode.id)
+    )
+
+
+def _qrcode_thumbnail(db, qr_id: int, image_hash: Optional[str], variant: str):
+    if image_hash:
+        thumbnail = get_thumbnail_bytes(image_hash, variant)
+        if thumbnail is not None:
+            return thumbnail, thumbnail_media_type()
+        return get_blob_bytes(image_hash), "image/png"
+    img_bytes = db.query(QRCode.img_bytes).filter(QRCode.id == qr_id).scalar()
+    return img_bytes, "image/png"
+
+
+def _data_uri(img_bytes: Optional[bytes], media_type: str) -> str:
+    with timed("base64"):
+        encoded = base64.b64encode(img_bytes or b"").decode("ascii")
+    return f"data:{media_type};base64,{encoded}"
+
+
+def iter_fleet_map_html(time_params: TimeBoundParams) -> Iterator[str]:
+    """
+    Streams a Leaflet map of every QR code. Each distinct QR image is emitted
+    once and referenced by key from the icon and popup of every marker that
+    uses it; markers go out in fixed-size chunks as rows are read. The icons
+    of each chunk are packed into one sprite sheet.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield _HEAD
+        # Short numeric ids keep the per-marker payload small
+        image_ids: dict[str, int] = {}
+        result = db.execute(
+            fleet_map_query(time_params).execution_options(yield_per=_CHUNK_SIZE)
+        )
+        for rows in result.partitions():
+            new_ids = []
+            icons = []
+            popups = []
+            markers = []
+            for qr_id, lat, lon, name, url, image_hash, count, last_scan in rows:
+                image_key = image_hash or f"qr{qr_id}"
+                image_id = image_ids.get(image_key)
+                if image_id is None:
+                    icon_bytes, _ = _qrcode_thumbnail(db, qr_id, image_hash, "icon")
+                    popup_bytes, media_type = _qrcode_thumbnail(
+                        db, qr_id, image_hash, "popup"
+                    )
+                    image_id = image_ids[image_key] = len(image_ids)
+                    new_ids.append(image_id)
+                    icons.append(icon_bytes)
+                    popups.append(_data_uri(popup_bytes, media_type))
+                markers.append(
+                    [
+                        qr_id,
+                        lat,
+                        lon,
+                        name,
+                        url,
+                        image_id,
+                        count,
+                        last_scan.isoformat(sep=" ") if last_scan else None,
+                    ]
+                )
+            if new_ids:
+                sheet, columns = build_sprite_sheet(icons, config.THUMBNAIL_ICON_PX)
+                yield _script(
+                    f"defineImages({json.dumps(_data_uri(sheet, thumbnail_media_type()))}, "
+                    f"{columns}, {json.dumps(new_ids)}, {json.dumps(popups)});"
+                )
+            yield _script(f"addMarkers({json.dumps(markers)});")
+        yield _TAIL
+    finally:
+        db.close()
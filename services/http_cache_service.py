@@ -0,0 +1,40 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Response
+
+
+def make_etag(*parts) -> str:
+    """
+    Strong ETag over the given version parts.
+    """
+    raw = "\x1f".join(str(part) for part in parts)
+    return '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cache_control(max_age: int, private: bool = False) -> str:
+    scope = "private" if private else "public"
+    if max_age <= 0:
+        return f"{scope}, no-cache"
+    return f"{scope}, max-age={max_age}"
+
+
+def cache_headers(etag: str, max_age: int, private: bool = False) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control(max_age, private)}
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,142 @@
+import asyncio
+import gzip
+import hashlib
+from typing import Optional
+
+from fastapi import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import FileResponse
+
+import config
+from services.http_cache_service import cache_headers, etag_matches, make_etag, not_modified
+from services.qrcode_service import get_qrcode_image_bytes_async, get_qrcode_image_path
+from services.render_cache_service import get_blob_bytes, store_derived_blob
+from services.render_service import (
+    png_to_webp_async,
+    render_params,
+    render_qrcode_svg_async,
+)
+
+IMAGE_FORMATS = {"png": "image/png", "svg": "image/svg+xml", "webp": "image/webp"}
+# Preferred first when an Accept header ranks several formats equally
+_PREFERENCE = ["svg", "webp", "png"]
+
+
+def negotiate_image_format(format: Optional[str], accept: Optional[str]) -> str:
+    """
+    Picks the output format: an explicit format parameter wins, then the
+    best-ranked format the Accept header names. Wildcards keep PNG so
+    existing clients see no change.
+    """
+    if format:
+        return format
+    ranked = {}
+    for part in (accept or "").split(","):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        ranked[media_type.lower()] = quality
+    candidates = [
+        (ranked[IMAGE_FORMATS[fmt]], -index, fmt)
+        for index, fmt in enumerate(_PREFERENCE)
+        if ranked.get(IMAGE_FORMATS[fmt], 0) > 0
+    ]
+    return max(candidates)[2] if candidates else "png"
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def format_key(db_qrcode, fmt: str) -> str:
+    """
+    Blob address of a derived format. Derived from the render parameters, so
+    rows from before the blob store get cached variants too.
+    """
+    raw = "\x1f".join(str(param) for param in render_params(db_qrcode))
+    return hashlib.sha256(f"{raw}\x1f{fmt}".encode("utf-8")).hexdigest()
+
+
+async def get_qrcode_format_bytes(db: AsyncSession, db_qrcode, fmt: str) -> Optional[bytes]:
+    """
+    Image bytes in the requested format, rendered on first request and kept
+    in the blob store. SVG is stored gzip-compressed.
+    """
+    if fmt == "png":
+        return await get_qrcode_image_bytes_async(db, db_qrcode)
+    key = format_key(db_qrcode, fmt)
+    data = await asyncio.to_thread(get_blob_bytes, key)
+    if data is not None:
+        return data
+    if fmt == "svg":
+        svg = await render_qrcode_svg_async(render_params(db_qrcode))
+        data = gzip.compress(svg, mtime=0)
+    else:
+        png_bytes = await get_qrcode_image_bytes_async(db, db_qrcode)
+        if png_bytes is None:
+            return None
+        data = await png_to_webp_async(png_bytes)
+    await asyncio.to_thread(store_derived_blob, key, data)
+    return data
+
+
+def image_etag(db_qrcode, fmt: str, gzipped: bool) -> str:
+    """
+    Derived from the image content address, so it is known without reading
+    the image.
+    """
+    if fmt == "png" and db_qrcode.image_hash:
+        key = db_qrcode.image_hash
+    else:
+        key = format_key(db_qrcode, fmt)
+    return make_etag(key, fmt, "gzip" if gzipped else "identity")
+
+
+async def qrcode_image_response(
+    db: AsyncSession,
+    db_qrcode,
+    fmt: str,
+    accept_encoding: Optional[str] = None,
+    filename: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+) -> Response:
+    """
+    Serves a QR code image in the negotiated format. SVG goes out
+    gzip-encoded when the client accepts it; PNG and WebP are already
+    compressed and go out as stored. A matching If-None-Match is answered
+    with a 304 before the image is loaded.
+    """
+    gzipped = fmt == "svg" and accepts_gzip(accept_encoding)
+    etag = image_etag(db_qrcode, fmt, gzipped)
+    headers = {
+        "Vary": "Accept, Accept-Encoding",
+        **cache_headers(etag, config.HTTP_IMAGE_MAX_AGE),
+    }
+    if etag_matches(if_none_match, etag):
+        return not_modified(headers)
+    if filename:
+        headers["Content-Disposition"] = f"attachment; filename={filename}.{fmt}"
+    media_type = IMAGE_FORMATS[fmt]
+
+    if fmt == "png":
+        image_path = get_qrcode_image_path(db_qrcode)
+        if image_path:
+            return FileResponse(image_path, media_type=media_type, headers=headers)
+
+    content = await get_qrcode_format_bytes(db, db_qrcode, fmt)
+    if fmt == "svg":
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+        else:
+            content = gzip.decompress(content)
+    return Response(content=content, media_type=media_type, headers=headers)
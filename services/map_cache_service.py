@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import select
+
+import config
+from database import AsyncReadSessionLocal
+from models.qrcode_model import QRCode
+from schemas.common import TimeBoundParams
+from services.periodic_task_service import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+
+def map_cache_key(
+    qr_id: int,
+    time_params: TimeBoundParams,
+    mode: str,
+    zoom: int,
+    scan_version: Optional[int],
+) -> str:
+    """
+    Identifies a rendered map. The scan version makes keys from before a
+    change unreachable, even in other worker processes, and is kept readable
+    so stale files can be swept from disk.
+    """
+    start = time_params.start_time.isoformat() if time_params.start_time else ""
+    end = time_params.end_time.isoformat() if time_params.end_time else ""
+    raw = "|".join([str(qr_id), start, end, mode, str(zoom), str(scan_version)])
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+    return f"{qr_id}_{scan_version}_{digest}"
+
+
+def _key_versions(key: str) -> Optional[tuple[int, int]]:
+    try:
+        qr_id, scan_version, _ = key.split("_", 2)
+        return int(qr_id), int(scan_version)
+    except ValueError:
+        return None
+
+
+class MapRenderCache:
+    """
+    LRU of rendered map HTML bounded by total size, optionally mirrored to
+    disk so renders survive restarts.
+    """
+
+    def __init__(self, max_bytes: int, directory: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory else None
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.html"
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        if self.directory:
+            try:
+                html = self._path(key).read_bytes()
+            except FileNotFoundError:
+                html = None
+            if html is not None:
+                self._remember(key, html)
+                self.hits += 1
+                return html
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, html: bytes):
+        self._remember(key, html)
+        if self.directory:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                tmp_path = self._path(key).with_suffix(".tmp")
+                tmp_path.write_bytes(html)
+                os.replace(tmp_path, self._path(key))
+            except OSError:
+                logger.exception("Failed to persist map render %s", key)
+
+    def _remember(self, key: str, html: bytes):
+        if len(html) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = html
+            self._size += len(html)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, qr_id: int):
+        """
+        Drops every render of a QR code held in memory. Files on disk can no
+        longer be reached either and are removed by the periodic sweep.
+        """
+        prefix = f"{qr_id}_"
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._size -= len(self._entries.pop(key))
+
+    def disk_keys(self) -> list[str]:
+        if not self.directory or not self.directory.exists():
+            return []
+        return [path.stem for path in self.directory.glob("*.html")]
+
+    def remove_files(self, keys: list[str]) -> int:
+        for key in keys:
+            self._path(key).unlink(missing_ok=True)
+        return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+map_render_cache = MapRenderCache(
+    max_bytes=config.MAP_CACHE_MAX_BYTES, directory=config.MAP_CACHE_DIR
+)
+
+
+async def sweep_map_cache() -> int:
+    """
+    Deletes persisted renders whose scan version is no longer current.
+    Returns the number of files removed.
+    """
+    keys = await asyncio.to_thread(map_render_cache.disk_keys)
+    if not keys:
+        return 0
+    parsed = {key: _key_versions(key) for key in keys}
+    qr_ids = {versions[0] for versions in parsed.values() if versions}
+    async with AsyncReadSessionLocal() as db:
+        current = dict(
+            (
+                await db.execute(
+                    select(QRCode.id, QRCode.scan_version).where(QRCode.id.in_(qr_ids))
+                )
+            ).all()
+        )
+    stale = [
+        key
+        for key, versions in parsed.items()
+        if versions is None or current.get(versions[0]) != versions[1]
+    ]
+    return await asyncio.to_thread(map_render_cache.remove_files, stale)
+
+
+map_cache_sweep_task = PeriodicTask(
+    "Map cache sweep",
+    sweep_map_cache,
+    config.MAP_CACHE_SWEEP_INTERVAL if config.MAP_CACHE_DIR else 0,
+)
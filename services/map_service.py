@@ -1,14 +1,27 @@
-import folium
+import math
+import numpy as np
 from io import BytesIO
 from sqlalchemy.orm import Session
 from models.scan_model import ScanData
 from models.qrcode_model import QRCode
-from folium.plugins import MarkerCluster
-from typing import Optional
-from datetime import datetime
+from typing import TYPE_CHECKING, Optional
+from datetime import datetime, timezone
+import config
 from schemas.common import TimeBoundParams
-from fastapi.responses import StreamingResponse
+from services.analytics_service import (
+    EPOCH_SECONDS_SQL,
+    fetch_structured,
+    sqlite_timestamp,
+)
+from services.metrics_service import timed
+from services.qrcode_service import get_qrcode_thumbnail
+from fastapi.responses import Response, StreamingResponse
 import base64
+
+# folium pulls in branca and jinja2; it is imported by the functions that
+# draw maps so workers that never render one do not pay for it
+if TYPE_CHECKING:
+    import folium
 from io import BytesIO
 
 
@@ -44,6 +57,18 @@ def generate_map_response(map_file, qr_id: int):
     )
 
 
+def map_html_response(html: bytes, qr_id: int, etag: str) -> Response:
+    return Response(
+        content=html,
+        media_type="text/html",
+        headers={
+            "Content-Disposition": f"attachment; filename=map_qrcode_{qr_id}_scans.html",
+            "ETag": etag,
+            "Cache-Control": "private, no-cache",
+        },
+    )
+
+
 def get_scan_map_data_by_qrcode(
     db: Session,
     qr_id: int,
@@ -66,14 +91,9 @@ def get_qrcode_map_data_by_qrcode(
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
 ):
-    query = db.query(QRCode).filter(QRCode.id == qr_id)
-
-    if start_time:
-        query = query.filter(ScanData.created >= start_time)
-    if end_time:
-        query = query.filter(ScanData.created <= end_time)
-
-    return query.all()
+    # A placement is shown regardless of the scan window; filtering on
+    # ScanData here without a join would build a cross product.
+    return db.query(QRCode).filter(QRCode.id == qr_id).all()
 
 
 def initialize_location(qrcodes: list[QRCode], scans: list[ScanData]):
@@ -88,14 +108,17 @@ def initialize_location(qrcodes: list[QRCode], scans: list[ScanData]):
     return initial_location
 
 
-def save_map_to_file(map_object: folium.Map) -> BytesIO:
+def save_map_to_file(map_object: "folium.Map") -> BytesIO:
     file_obj = BytesIO()
-    map_object.save(file_obj, close_file=False)
+    with timed("folium_serialize"):
+        map_object.save(file_obj, close_file=False)
     file_obj.seek(0)
     return file_obj
 
 
 def add_marker_with_popup(map_object, latitude, longitude, popup_content):
+    import folium
+
     popup = folium.Popup(popup_content, max_width=300)
     folium.Marker([latitude, longitude], popup=popup).add_to(map_object)
 
@@ -108,8 +131,8 @@ def generate_popup_content(data):
     style = "min-width: 150px; max-width: 400px;"
 
     if isinstance(data, QRCode):
-        # Convert the QR code image bytes to a base64 image string
-        base64_image = qr_code_image_to_base64(data.img_bytes)
+        # The popup shows a downscaled copy instead of the full PNG
+        base64_image = qr_code_image_to_base64(*get_qrcode_thumbnail(data, "popup"))
 
         return f"""
         <div style="{style}">
@@ -136,17 +159,22 @@ def generate_popup_content(data):
     return ""
 
 
-def qr_code_image_to_base64(img_bytes):
+def qr_code_image_to_base64(img_bytes, media_type="image/png"):
     """
     Converts QR code image bytes to a base64-encoded string that can be used in an HTML img tag.
     """
-    encoded = base64.b64encode(img_bytes).decode("utf-8")
-    return f"data:image/png;base64,{encoded}"
+    with timed("base64"):
+        encoded = base64.b64encode(img_bytes or b"").decode("utf-8")
+    return f"data:{media_type};base64,{encoded}"
+
 
+def add_marker_with_qr_icon(
+    map_object, latitude, longitude, popup_content, img_bytes, media_type="image/png"
+):
+    import folium
 
-def add_marker_with_qr_icon(map_object, latitude, longitude, popup_content, img_bytes):
     # Convert the QR code image bytes to a base64 image string
-    base64_image = qr_code_image_to_base64(img_bytes)
+    base64_image = qr_code_image_to_base64(img_bytes, media_type)
 
     # Create a custom icon with the base64 image
     icon = folium.CustomIcon(
@@ -160,18 +188,13 @@ def add_marker_with_qr_icon(map_object, latitude, longitude, popup_content, img_
 
 
 def standard_map(qrcodes: list[QRCode], scans: list[ScanData]) -> BytesIO:
+    import folium
+    from folium.plugins import MarkerCluster
+
     initial_location = initialize_location(qrcodes=qrcodes, scans=scans)
     map_object = folium.Map(location=initial_location, zoom_start=3)
 
-    for qrcode in qrcodes:
-        popup_html = generate_popup_content(qrcode)
-        add_marker_with_qr_icon(
-            map_object=map_object,
-            latitude=qrcode.latitude,
-            longitude=qrcode.longitude,
-            popup_content=popup_html,
-            img_bytes=qrcode.img_bytes,
-        )
+    add_qrcode_markers(map_object, qrcodes)
 
     # Create a MarkerCluster for the scan locations
     scan_cluster = MarkerCluster().add_to(map_object)
@@ -185,3 +208,174 @@ def standard_map(qrcodes: list[QRCode], scans: list[ScanData]) -> BytesIO:
 
     # Save map to a file and return as BytesIO
     return save_map_to_file(map_object)
+
+
+_COORDINATE_DTYPE = np.dtype(
+    [("latitude", np.float64), ("longitude", np.float64), ("seconds", np.int64)]
+)
+
+
+def fetch_scan_coordinates(
+    db: Session, qr_id: int, time_params: TimeBoundParams
+) -> np.ndarray:
+    """
+    Fetches only latitude, longitude and scan time of each scan as arrays.
+    """
+    sql = (
+        f"SELECT latitude, longitude, {EPOCH_SECONDS_SQL} FROM scan_data "
+        "WHERE qr_id = ? AND latitude IS NOT NULL AND longitude IS NOT NULL"
+    )
+    params: list = [qr_id]
+    if time_params.start_time:
+        sql += " AND created >= ?"
+        params.append(sqlite_timestamp(time_params.start_time))
+    if time_params.end_time:
+        sql += " AND created <= ?"
+        params.append(sqlite_timestamp(time_params.end_time))
+    return fetch_structured(db, sql, params, _COORDINATE_DTYPE)
+
+
+def cell_size_for_zoom(zoom: int) -> float:
+    """
+    Grid cell size in degrees that covers roughly MAP_CELL_PIXELS on screen
+    at the given web-mercator zoom level.
+    """
+    return 360.0 * config.MAP_CELL_PIXELS / (256 * 2**zoom)
+
+
+def aggregate_scan_cells(coordinates: np.ndarray, cell_size: float) -> dict:
+    """
+    Snaps scans to a lat/lon grid and returns one entry per occupied cell:
+    centroid, scan count and first/last scan time.
+    """
+    if coordinates.size == 0:
+        return {
+            "latitude": np.empty(0),
+            "longitude": np.empty(0),
+            "count": np.empty(0, dtype=np.int64),
+            "first_seen": np.empty(0, dtype=np.int64),
+            "last_seen": np.empty(0, dtype=np.int64),
+        }
+
+    columns = math.ceil(360.0 / cell_size) + 1
+    cell_x = np.floor((coordinates["longitude"] + 180.0) / cell_size).astype(np.int64)
+    cell_y = np.floor((coordinates["latitude"] + 90.0) / cell_size).astype(np.int64)
+    cells, inverse, counts = np.unique(
+        cell_y * columns + cell_x, return_inverse=True, return_counts=True
+    )
+
+    order = np.argsort(inverse, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    seconds = coordinates["seconds"][order]
+    return {
+        "latitude": np.bincount(inverse, weights=coordinates["latitude"]) / counts,
+        "longitude": np.bincount(inverse, weights=coordinates["longitude"]) / counts,
+        "count": counts,
+        "first_seen": np.minimum.reduceat(seconds, starts),
+        "last_seen": np.maximum.reduceat(seconds, starts),
+    }
+
+
+def aggregate_scan_cells_for_zoom(coordinates: np.ndarray, zoom: int) -> dict:
+    """
+    Aggregates scans at the cell size for the zoom level, coarsening the grid
+    until the map stays within MAP_MAX_CELLS markers.
+    """
+    cell_size = cell_size_for_zoom(zoom)
+    cells = aggregate_scan_cells(coordinates, cell_size)
+    while cells["count"].size > config.MAP_MAX_CELLS and cell_size < 180.0:
+        cell_size *= 2
+        cells = aggregate_scan_cells(coordinates, cell_size)
+    return cells
+
+
+def _format_epoch(seconds) -> str:
+    return datetime.fromtimestamp(int(seconds), timezone.utc).strftime(
+        "%Y-%m-%d %H:%M:%S UTC"
+    )
+
+
+def add_qrcode_markers(map_object: "folium.Map", qrcodes: list[QRCode]):
+    for qrcode in qrcodes:
+        popup_html = generate_popup_content(qrcode)
+        img_bytes, media_type = get_qrcode_thumbnail(qrcode, "icon")
+        add_marker_with_qr_icon(
+            map_object=map_object,
+            latitude=qrcode.latitude,
+            longitude=qrcode.longitude,
+            popup_content=popup_html,
+            img_bytes=img_bytes,
+            media_type=media_type,
+        )
+
+
+def aggregated_map(
+    qrcodes: list[QRCode], cells: dict, mode: str, zoom: int
+) -> BytesIO:
+    """
+    Builds a map from pre-aggregated scan cells: a weighted heatmap, or one
+    sized marker per cell. Its size grows with the number of cells, not scans.
+    """
+    import folium
+    from folium.plugins import HeatMap
+
+    if qrcodes:
+        initial_location = [qrcodes[0].latitude, qrcodes[0].longitude]
+    elif cells["count"].size:
+        densest = int(np.argmax(cells["count"]))
+        initial_location = [
+            float(cells["latitude"][densest]),
+            float(cells["longitude"][densest]),
+        ]
+    else:
+        initial_location = [0, 0]
+    map_object = folium.Map(location=initial_location, zoom_start=zoom)
+
+    add_qrcode_markers(map_object, qrcodes)
+
+    if mode == "heatmap":
+        if cells["count"].size:
+            weights = cells["count"] / cells["count"].max()
+            HeatMap(
+                np.column_stack(
+                    (cells["latitude"], cells["longitude"], weights)
+                ).tolist()
+            ).add_to(map_object)
+        return save_map_to_file(map_object)
+
+    # All cells go into a single GeoJSON layer so the cost per cell is a few
+    # bytes of JSON rather than a templated folium element.
+    max_count = int(cells["count"].max()) if cells["count"].size else 1
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [longitude, latitude]},
+            "properties": {
+                "count": count,
+                "first_seen": _format_epoch(first_seen),
+                "last_seen": _format_epoch(last_seen),
+                "radius": round(6 + 18 * math.log1p(count) / math.log1p(max_count)),
+            },
+        }
+        for latitude, longitude, count, first_seen, last_seen in zip(
+            cells["latitude"].tolist(),
+            cells["longitude"].tolist(),
+            cells["count"].tolist(),
+            cells["first_seen"].tolist(),
+            cells["last_seen"].tolist(),
+        )
+    ]
+    if features:
+        folium.GeoJson(
+            {"type": "FeatureCollection", "features": features},
+            name="Scans",
+            marker=folium.CircleMarker(weight=1, fill=True, fill_opacity=0.6),
+            style_function=lambda feature: {"radius": feature["properties"]["radius"]},
+            tooltip=folium.GeoJsonTooltip(fields=["count"], labels=False),
+            popup=folium.GeoJsonPopup(
+                fields=["count", "first_seen", "last_seen"],
+                aliases=["Scans", "First Scan", "Last Scan"],
+            ),
+        ).add_to(map_object)
+
+    return save_map_to_file(map_object)
@@ -0,0 +1,307 @@
+import bisect
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+import config
+
+logger = logging.getLogger(__name__)
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """
+    Prometheus histogram keyed by a tuple of label values.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: tuple, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf) followed by the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                bucket_labels = _format_labels(self.labelnames, labels, le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {series[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, labelnames: tuple):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def dec(self, labels: tuple, amount: float = 1):
+        self.inc(labels, -amount)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "qrkeep_http_request_duration_seconds",
+    "HTTP request latency by route template, including streamed bodies.",
+    ("method", "route", "status"),
+    REQUEST_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "qrkeep_http_requests_in_flight",
+    "HTTP requests currently being served.",
+    ("method",),
+)
+DB_QUERY_DURATION = Histogram(
+    "qrkeep_db_query_duration_seconds",
+    "SQL statement execution time; the _count series is the query count.",
+    ("engine", "operation"),
+    FAST_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    "qrkeep_stage_duration_seconds",
+    "Time spent in image rendering and encoding, base64 and map serialization.",
+    ("stage",),
+    FAST_BUCKETS,
+)
+REGISTRY = [REQUEST_DURATION, REQUESTS_IN_FLIGHT, DB_QUERY_DURATION, STAGE_DURATION]
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Set inside render worker processes, whose timings travel back with results
+_stage_buffer: Optional[list] = None
+
+
+def observe_stage(stage: str, seconds: float):
+    if _stage_buffer is not None:
+        _stage_buffer.append((stage, seconds))
+    else:
+        STAGE_DURATION.observe((stage,), seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def collect_stage_timings(func, *args):
+    """
+    Runs func in a worker process and returns its result together with the
+    stage timings it took, for the parent to record.
+    """
+    global _stage_buffer
+    _stage_buffer = []
+    try:
+        return func(*args), _stage_buffer
+    finally:
+        _stage_buffer = None
+
+
+def record_stage_timings(timings: list[tuple]):
+    for stage, seconds in timings:
+        STAGE_DURATION.observe((stage,), seconds)
+
+
+# Statements issued by the current request while it is being profiled
+_request_profile: ContextVar[Optional[list]] = ContextVar("request_profile", default=None)
+
+
+def _operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].lower() if words else "other"
+
+
+def observe_query(engine_name: str, statement: str, seconds: float):
+    DB_QUERY_DURATION.observe((engine_name, _operation(statement)), seconds)
+    profile = _request_profile.get()
+    if profile is not None:
+        profile.append((statement, seconds))
+
+
+@contextmanager
+def timed_query(engine_name: str, statement: str):
+    """
+    Times a statement run on a raw DBAPI cursor, which engine events miss.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_query(engine_name, statement, time.perf_counter() - started)
+
+
+def instrument_engine(bind, name: str):
+    """
+    Times every statement on a sync engine (use .sync_engine for async ones).
+    """
+
+    @event.listens_for(bind, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(bind, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+        observe_query(name, statement, elapsed)
+
+    @event.listens_for(bind, "handle_error")
+    def failed_query(exception_context):
+        if exception_context.connection is not None:
+            starts = exception_context.connection.info.get("metrics_query_start")
+            if starts:
+                starts.pop()
+
+
+def instrument_engines():
+    from database import async_engine, async_read_engine, engine, read_engine
+
+    seen = set()
+    for bind, name in (
+        (engine, "writer"),
+        (read_engine, "reader"),
+        (async_engine.sync_engine, "async_writer"),
+        (async_read_engine.sync_engine, "async_reader"),
+    ):
+        # Without the WAL profile the read engines are the writer engines
+        if id(bind) not in seen:
+            seen.add(id(bind))
+            instrument_engine(bind, name)
+
+
+def route_template(scope) -> str:
+    """
+    Path template of the route that handled a request, so labels stay bounded.
+    Routing stores the matched route on the scope.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def log_slow_request(method: str, path: str, elapsed: float, profile: list):
+    """
+    Logs the statements of a slow request grouped by SQL text; a statement
+    repeated many times usually means an N+1 pattern.
+    """
+    grouped = defaultdict(lambda: [0, 0.0])
+    for statement, seconds in profile:
+        entry = grouped[" ".join(statement.split())]
+        entry[0] += 1
+        entry[1] += seconds
+    lines = [
+        f"{count}x {total * 1000:.1f} ms  {statement}"
+        for statement, (count, total) in sorted(
+            grouped.items(), key=lambda item: (-item[1][0], -item[1][1])
+        )
+    ]
+    logger.warning(
+        "Slow request %s %s: %.1f ms, %d queries%s",
+        method,
+        path,
+        elapsed * 1000,
+        len(profile),
+        "".join(f"\n{line}" for line in lines),
+    )
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency and in-flight requests, and
+    profiling a sample of requests for the slow-request log.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profile = None
+        if config.METRICS_PROFILE_SAMPLE_RATE > 0 and (
+            random.random() < config.METRICS_PROFILE_SAMPLE_RATE
+        ):
+            profile = []
+        token = _request_profile.set(profile)
+        # The route is only known once routing ran, so in-flight is per method
+        REQUESTS_IN_FLIGHT.inc((method,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec((method,))
+            REQUEST_DURATION.observe((method, route_template(scope), str(status)), elapsed)
+            _request_profile.reset(token)
+            if profile is not None and elapsed * 1000 >= config.METRICS_SLOW_REQUEST_MS:
+                log_slow_request(method, scope["path"], elapsed, profile)
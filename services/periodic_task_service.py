@@ -0,0 +1,42 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """
+    Runs a coroutine function in the background at a fixed interval.
+    An interval of 0 or less disables the task.
+    """
+
+    def __init__(self, name: str, func: Callable[[], Awaitable], interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is not None or self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                result = await self.func()
+                logger.debug("%s: %s", self.name, result)
+            except Exception:
+                logger.exception("%s failed", self.name)
@@ -0,0 +1,206 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import config
+from database import AsyncReadSessionLocal
+from models.cache_version_model import CacheVersion
+from models.qrcode_model import QRCode
+from services.periodic_task_service import PeriodicTask
+
+# Everything about a QR code except its image bytes and scan counter
+METADATA_COLUMNS = [
+    QRCode.id,
+    QRCode.name,
+    QRCode.url,
+    QRCode.version,
+    QRCode.box_size,
+    QRCode.border,
+    QRCode.fill_color,
+    QRCode.back_color,
+    QRCode.latitude,
+    QRCode.longitude,
+    QRCode.image_hash,
+    QRCode.retention_days,
+    QRCode.revision,
+]
+QRCodeMetadata = namedtuple("QRCodeMetadata", [column.key for column in METADATA_COLUMNS])
+
+CACHE_VERSION_NAME = "qrcodes"
+
+
+class QRCodeCache:
+    """
+    Bounded LRU of QR code metadata with a time-to-live per entry. Lookups
+    that race an invalidation do not store what they read.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[QRCodeMetadata, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.seen_version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, qr_id: int) -> Optional[QRCodeMetadata]:
+        with self._lock:
+            entry = self._entries.get(qr_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            metadata, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[qr_id]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(qr_id)
+            self.hits += 1
+            return metadata
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, metadata: QRCodeMetadata, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[metadata.id] = (metadata, time.monotonic() + self.ttl)
+            self._entries.move_to_end(metadata.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, qr_ids, version: Optional[int] = None):
+        """
+        Drops entries changed by this process. `version` is the counter value
+        this change produced; when it directly follows the last one seen, the
+        next poll will not mistake it for a change made elsewhere.
+        """
+        with self._lock:
+            self._generation += 1
+            for qr_id in qr_ids:
+                if self._entries.pop(qr_id, None) is not None:
+                    self.invalidations += 1
+            if version is not None and self.seen_version == version - 1:
+                self.seen_version = version
+
+    def sync_version(self, version: int):
+        """
+        Clears the cache when another process changed QR codes since the last poll.
+        """
+        with self._lock:
+            if self.seen_version is not None and version != self.seen_version:
+                self._generation += 1
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+            self.seen_version = version
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "version": self.seen_version,
+            }
+
+
+qrcode_cache = QRCodeCache(
+    max_entries=config.QRCODE_CACHE_MAX_ENTRIES, ttl=config.QRCODE_CACHE_TTL
+)
+
+
+def _cache_id(qr_id) -> Optional[int]:
+    try:
+        return int(qr_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _metadata_query(qr_id: int):
+    return select(*METADATA_COLUMNS).where(QRCode.id == qr_id)
+
+
+def get_qrcode_metadata(db: Session, qr_id) -> Optional[QRCodeMetadata]:
+    cache_id = _cache_id(qr_id)
+    if cache_id is None:
+        return None
+    metadata = qrcode_cache.get(cache_id)
+    if metadata is None:
+        generation = qrcode_cache.generation()
+        row = db.execute(_metadata_query(cache_id)).first()
+        if row is None:
+            return None
+        metadata = QRCodeMetadata(*row)
+        qrcode_cache.put(metadata, generation)
+    return metadata
+
+
+async def get_qrcode_metadata_async(db: AsyncSession, qr_id) -> Optional[QRCodeMetadata]:
+    """
+    QR code metadata from the cache, read from the database on a miss.
+    """
+    cache_id = _cache_id(qr_id)
+    if cache_id is None:
+        return None
+    metadata = qrcode_cache.get(cache_id)
+    if metadata is None:
+        generation = qrcode_cache.generation()
+        row = (await db.execute(_metadata_query(cache_id))).first()
+        if row is None:
+            return None
+        metadata = QRCodeMetadata(*row)
+        qrcode_cache.put(metadata, generation)
+    return metadata
+
+
+def stage_qrcode_changes(db: Session, qr_ids) -> int:
+    """
+    Bumps the revision of these QR codes and the shared change counter
+    inside the transaction that updates or deletes them. Returns the new
+    counter value.
+    """
+    db.query(QRCode).filter(QRCode.id.in_(set(qr_ids))).update(
+        {QRCode.revision: QRCode.revision + 1}, synchronize_session=False
+    )
+    stmt = sqlite_insert(CacheVersion).values(name=CACHE_VERSION_NAME, version=1)
+    return db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["name"], set_={"version": CacheVersion.version + 1}
+        ).returning(CacheVersion.version)
+    ).scalar_one()
+
+
+def publish_qrcode_changes(qr_ids, version: Optional[int] = None):
+    qrcode_cache.invalidate(qr_ids, version)
+
+
+async def poll_qrcode_cache_version() -> Optional[int]:
+    async with AsyncReadSessionLocal() as db:
+        version = await db.scalar(
+            select(CacheVersion.version).where(CacheVersion.name == CACHE_VERSION_NAME)
+        )
+    qrcode_cache.sync_version(version or 0)
+    return version
+
+
+qrcode_cache_poll_task = PeriodicTask(
+    "QR code cache sync", poll_qrcode_cache_version, config.QRCODE_CACHE_POLL_INTERVAL
+)
@@ -0,0 +1,144 @@
+import base64
+from typing import Callable, Iterator, Optional
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import ReadSessionLocal
+from models.cache_version_model import CacheVersion
+from models.qrcode_model import QRCode
+from services.qrcode_cache_service import CACHE_VERSION_NAME
+
+# Output field -> columns it is read from
+LISTING_FIELDS = {
+    "id": [QRCode.id],
+    "name": [QRCode.name],
+    "url": [QRCode.url],
+    "version": [QRCode.version],
+    "box_size": [QRCode.box_size],
+    "border": [QRCode.border],
+    "fill_color": [QRCode.fill_color],
+    "back_color": [QRCode.back_color],
+    "location": [QRCode.latitude, QRCode.longitude],
+}
+
+
+def parse_fields(fields: Optional[str]) -> list[str]:
+    if not fields:
+        return list(LISTING_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in LISTING_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. "
+            f"Allowed: {', '.join(LISTING_FIELDS)}",
+        )
+    return list(dict.fromkeys(names))
+
+
+def encode_listing_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(str(last_id).encode("ascii")).decode("ascii")
+
+
+def decode_listing_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def listing_query(fields: list[str], after_id: int, limit: Optional[int]):
+    """
+    Core select of the requested columns, keyset-ordered by id. The id is
+    always selected first so the next cursor can be taken from the last row.
+    """
+    columns = [QRCode.id]
+    for name in fields:
+        columns.extend(column for column in LISTING_FIELDS[name] if column is not QRCode.id)
+    query = select(*columns).where(QRCode.id > after_id).order_by(QRCode.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def row_encoder(fields: list[str]) -> Callable[[tuple], dict]:
+    """
+    Builds the function that turns a listing row tuple into its output dict.
+    """
+    plan = []
+    index = 1
+    for name in fields:
+        if name == "id":
+            plan.append((name, 0, None))
+        elif name == "location":
+            plan.append((name, index, index + 1))
+            index += 2
+        else:
+            plan.append((name, index, None))
+            index += 1
+
+    def encode(row: tuple) -> dict:
+        item = {}
+        for name, position, second in plan:
+            if second is None:
+                item[name] = row[position]
+            else:
+                item[name] = {"latitude": row[position], "longitude": row[second]}
+        return item
+
+    return encode
+
+
+async def listing_version(db: AsyncSession) -> str:
+    """
+    Changes whenever a QR code is added, updated or deleted: new codes raise
+    the highest id and the rest bump the shared change counter.
+    """
+    change_counter = (
+        select(CacheVersion.version)
+        .where(CacheVersion.name == CACHE_VERSION_NAME)
+        .scalar_subquery()
+    )
+    max_id, version = (
+        await db.execute(select(func.max(QRCode.id), change_counter))
+    ).one()
+    return f"{max_id or 0}.{version or 0}"
+
+
+async def fetch_qrcode_page(
+    db: AsyncSession, fields: list[str], limit: int, cursor: Optional[str] = None
+) -> tuple[bytes, Optional[str]]:
+    """
+    Returns one page of the listing as encoded JSON and the next cursor.
+    """
+    after_id = decode_listing_cursor(cursor) if cursor else 0
+    rows = (await db.execute(listing_query(fields, after_id, limit))).all()
+    encode = row_encoder(fields)
+    next_cursor = encode_listing_cursor(rows[-1][0]) if len(rows) == limit else None
+    return orjson.dumps([encode(row) for row in rows]), next_cursor
+
+
+def iter_qrcodes_json(fields: list[str], chunk_size: int) -> Iterator[bytes]:
+    """
+    Streams the whole listing as one JSON array, encoding a chunk of rows at
+    a time.
+    """
+    encode = row_encoder(fields)
+    db = ReadSessionLocal()
+    try:
+        yield b"["
+        first = True
+        result = db.execute(
+            listing_query(fields, 0, None).execution_options(yield_per=chunk_size)
+        )
+        for rows in result.partitions():
+            body = orjson.dumps([encode(row) for row in rows])[1:-1]
+            if body:
+                yield body if first else b"," + body
+                first = False
+        yield b"]"
+    finally:
+        db.close()
@@ -1,41 +1,39 @@
-import qrcode
-from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from models.qrcode_model import QRCode
 from schemas.qrcode import QRCodeCreate, Location, QRCodeResponse
+from services.blob_service import get_blob_store
+from services.render_cache_service import get_blob_bytes, get_thumbnail_bytes
+from services.thumbnail_service import thumbnail_media_type
 
 
-def create_qrcode(db: Session, qr_data: QRCodeCreate):
-    qr = qrcode.QRCode(
-        version=qr_data.version,
-        error_correction=qrcode.constants.ERROR_CORRECT_M,
-        box_size=qr_data.box_size,
-        border=qr_data.border,
-    )
-    qr.add_data(qr_data.url)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color=qr_data.fill_color, back_color=qr_data.back_color)
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    img_bytes = buffer.getvalue()
-
-    db_qrcode = QRCode(
-        url=qr_data.url,
-        name=qr_data.name,
-        img_bytes=img_bytes,
-        version=qr_data.version,
-        box_size=qr_data.box_size,
-        border=qr_data.border,
-        fill_color=qr_data.fill_color,
-        back_color=qr_data.back_color,
-        latitude=qr_data.location.latitude,
-        longitude=qr_data.location.longitude,
-    )
-    db.add(db_qrcode)
-    db.commit()
-    db.refresh(db_qrcode)
+def qrcode_row(qr_data: QRCodeCreate, image_hash: str) -> dict:
+    return {
+        "url": qr_data.url,
+        "name": qr_data.name,
+        "image_hash": image_hash,
+        "version": qr_data.version,
+        "box_size": qr_data.box_size,
+        "border": qr_data.border,
+        "fill_color": qr_data.fill_color,
+        "back_color": qr_data.back_color,
+        "latitude": qr_data.location.latitude,
+        "longitude": qr_data.location.longitude,
+    }
+
+
+def build_qrcode(qr_data: QRCodeCreate, image_hash: str) -> QRCode:
+    return QRCode(**qrcode_row(qr_data, image_hash))
 
+
+def qrcode_to_response(db_qrcode: QRCode) -> QRCodeResponse:
     return QRCodeResponse(
         id=db_qrcode.id,
         name=db_qrcode.name,
@@ -49,9 +47,95 @@ def create_qrcode(db: Session, qr_data: QRCodeCreate):
     )
 
 
+def create_qrcode(db: Session, qr_data: QRCodeCreate, image_hash: str):
+    db_qrcode = build_qrcode(qr_data, image_hash)
+    db.add(db_qrcode)
+    db.commit()
+    db.refresh(db_qrcode)
+
+    return qrcode_to_response(db_qrcode)
+
+
+async def create_qrcode_async(
+    db: AsyncSession, qr_data: QRCodeCreate, image_hash: str
+) -> QRCodeResponse:
+    db_qrcode = build_qrcode(qr_data, image_hash)
+    db.add(db_qrcode)
+    await db.commit()
+    return qrcode_to_response(db_qrcode)
+
+
+async def create_qrcodes_async(
+    db: AsyncSession, qr_datas: list[QRCodeCreate], image_hashes: list[str]
+) -> list[QRCodeResponse]:
+    db_qrcodes = [
+        build_qrcode(qr_data, image_hash)
+        for qr_data, image_hash in zip(qr_datas, image_hashes)
+    ]
+    db.add_all(db_qrcodes)
+    await db.commit()
+    return [qrcode_to_response(db_qrcode) for db_qrcode in db_qrcodes]
+
+
 def get_qrcode_by_qr_id(db: Session, qr_id: str):
     return db.query(QRCode).filter(QRCode.id == qr_id).first()
 
 
-def get_all_qrcodes(db: Session):
-    return db.query(QRCode).all()
+async def get_qrcode_by_qr_id_async(db: AsyncSession, qr_id: str):
+    return await db.scalar(select(QRCode).where(QRCode.id == qr_id))
+
+
+def get_qrcode_image_bytes(db_qrcode: QRCode) -> Optional[bytes]:
+    if db_qrcode.image_hash is not None:
+        return get_blob_bytes(db_qrcode.image_hash)
+    # Rows created before the blob store keep their image inline
+    return db_qrcode.img_bytes
+
+
+async def get_qrcode_image_bytes_async(
+    db: AsyncSession, db_qrcode: QRCode
+) -> Optional[bytes]:
+    if db_qrcode.image_hash is not None:
+        # Blob stores do blocking file or database reads
+        return await asyncio.to_thread(get_blob_bytes, db_qrcode.image_hash)
+    # The legacy column is deferred and cannot be lazy-loaded on an async session
+    return await db.scalar(select(QRCode.img_bytes).where(QRCode.id == db_qrcode.id))
+
+
+def get_qrcode_thumbnail(db_qrcode: QRCode, variant: str) -> tuple[bytes, str]:
+    """
+    Returns the precomputed thumbnail and its media type, falling back to the
+    full PNG for images that have not been backfilled yet.
+    """
+    if db_qrcode.image_hash is not None:
+        thumbnail = get_thumbnail_bytes(db_qrcode.image_hash, variant)
+        if thumbnail is not None:
+            return thumbnail, thumbnail_media_type()
+    return get_qrcode_image_bytes(db_qrcode), "image/png"
+
+
+def get_qrcode_image_path(db_qrcode: QRCode) -> Optional[Path]:
+    """
+    Path of the stored image when it can be served directly from disk.
+    """
+    if db_qrcode.image_hash is None:
+        return None
+    return get_blob_store().path(db_qrcode.image_hash)
+
+
+def get_scan_version(db: Session, qr_id) -> Optional[int]:
+    return db.query(QRCode.scan_version).filter(QRCode.id == qr_id).scalar()
+
+
+async def get_scan_version_async(db: AsyncSession, qr_id) -> Optional[int]:
+    return await db.scalar(select(QRCode.scan_version).where(QRCode.id == qr_id))
+
+
+def bump_scan_versions(db: Session, qr_ids):
+    """
+    Marks the scan sets of these QR codes as changed. Runs inside the
+    transaction that adds or removes the scans.
+    """
+    db.query(QRCode).filter(QRCode.id.in_(set(qr_ids))).update(
+        {QRCode.scan_version: QRCode.scan_version + 1}, synchronize_session=False
+    )
@@ -0,0 +1,307 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import config
+from database import SessionLocal
+from models.qrcode_model import QRCode
+from models.render_blob_model import RenderBlob, RenderCacheEntry
+from schemas.qrcode import QRCodeCreate
+from services.blob_service import get_blob_store
+from services.render_service import (
+    render_params,
+    render_qrcode,
+    render_qrcode_batch,
+    render_thumbnails_batch,
+)
+from services.thumbnail_service import variant_key
+
+
+def render_key(qr_data: QRCodeCreate) -> str:
+    """
+    Hashes the parameters that determine the rendered image.
+    """
+    raw = "\x1f".join(str(param) for param in render_params(qr_data))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def content_hash(img_bytes: bytes) -> str:
+    return hashlib.sha256(img_bytes).hexdigest()
+
+
+class RenderCache:
+    """
+    In-memory tier of the render cache. Render keys map to content hashes,
+    and image bytes are kept once per content hash in an LRU bounded by total size.
+    """
+
+    def __init__(self, max_bytes: int, max_keys: int):
+        self.max_bytes = max_bytes
+        self.max_keys = max_keys
+        self._keys: OrderedDict[str, str] = OrderedDict()
+        self._blobs: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_hash(self, key: str) -> Optional[str]:
+        with self._lock:
+            image_hash = self._keys.get(key)
+            if image_hash is not None:
+                self._keys.move_to_end(key)
+            return image_hash
+
+    def get_blob(self, image_hash: str) -> Optional[bytes]:
+        with self._lock:
+            img_bytes = self._blobs.get(image_hash)
+            if img_bytes is not None:
+                self._blobs.move_to_end(image_hash)
+            return img_bytes
+
+    def put_key(self, key: str, image_hash: str):
+        with self._lock:
+            self._keys[key] = image_hash
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+
+    def put(self, image_hash: str, img_bytes: bytes, key: Optional[str] = None):
+        if key is not None:
+            self.put_key(key, image_hash)
+        with self._lock:
+            if len(img_bytes) > self.max_bytes:
+                return
+            if image_hash in self._blobs:
+                self._blobs.move_to_end(image_hash)
+                return
+            self._blobs[image_hash] = img_bytes
+            self._size += len(img_bytes)
+            while self._size > self.max_bytes:
+                _, evicted = self._blobs.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.store_hits + self.misses
+            hits = self.memory_hits + self.store_hits
+            return {
+                "memory_hits": self.memory_hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "keys": len(self._keys),
+                "blobs": len(self._blobs),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+render_cache = RenderCache(
+    max_bytes=config.RENDER_CACHE_MAX_BYTES, max_keys=config.RENDER_CACHE_MAX_KEYS
+)
+
+
+def get_blob_bytes(image_hash: str, cache: bool = True) -> Optional[bytes]:
+    """
+    Reads a blob through the memory tier. Bulk readers pass cache=False so a
+    full sweep does not evict the hot set.
+    """
+    img_bytes = render_cache.get_blob(image_hash)
+    if img_bytes is not None:
+        return img_bytes
+    img_bytes = get_blob_store().get(image_hash)
+    if img_bytes is not None and cache:
+        render_cache.put(image_hash, img_bytes)
+    return img_bytes
+
+
+async def _lookup_stored(db: AsyncSession, keys: list[str]) -> dict[str, str]:
+    if not keys:
+        return {}
+    rows = await db.execute(
+        select(RenderCacheEntry.render_key, RenderCacheEntry.content_hash).where(
+            RenderCacheEntry.render_key.in_(keys)
+        )
+    )
+    return dict(rows.all())
+
+
+def _put_blobs(blobs: dict[str, bytes]) -> list[dict]:
+    """
+    Writes blobs to the store and returns their render_blobs rows.
+    """
+    store = get_blob_store()
+    for blob_hash, data in blobs.items():
+        store.put(blob_hash, data)
+    return [
+        {
+            "content_hash": blob_hash,
+            "img_bytes": data if store.stores_inline else None,
+            "size": len(data),
+        }
+        for blob_hash, data in blobs.items()
+    ]
+
+
+def _store_blobs(db: Session, blobs: dict[str, bytes]):
+    db.execute(
+        sqlite_insert(RenderBlob).values(_put_blobs(blobs)).on_conflict_do_nothing()
+    )
+
+
+def store_derived_blob(blob_hash: str, data: bytes):
+    """
+    Stores an image derived on demand, such as another output format, in its
+    own short write transaction.
+    """
+    with SessionLocal() as db:
+        _store_blobs(db, {blob_hash: data})
+        db.commit()
+    render_cache.put(blob_hash, data)
+
+
+def _thumbnail_blobs(image_hash: str, thumbnails: dict[str, bytes]) -> dict[str, bytes]:
+    return {
+        variant_key(image_hash, variant): data for variant, data in thumbnails.items()
+    }
+
+
+async def _store(
+    db: AsyncSession, rendered: dict[str, tuple[bytes, dict]]
+) -> dict[str, str]:
+    """
+    Adds blobs and cache entries for freshly rendered images and their
+    thumbnails. Each distinct image is written once; rows another worker
+    already stored are skipped. The caller commits.
+    """
+    hashes = {key: content_hash(img_bytes) for key, (img_bytes, _) in rendered.items()}
+    if not rendered:
+        return hashes
+
+    blobs = {}
+    for key, (img_bytes, thumbnails) in rendered.items():
+        image_hash = hashes[key]
+        if image_hash not in blobs:
+            blobs[image_hash] = img_bytes
+            blobs.update(_thumbnail_blobs(image_hash, thumbnails))
+    blob_rows = await asyncio.to_thread(_put_blobs, blobs)
+    await db.execute(sqlite_insert(RenderBlob).values(blob_rows).on_conflict_do_nothing())
+    await db.execute(
+        sqlite_insert(RenderCacheEntry)
+        .values(
+            [
+                {"render_key": key, "content_hash": image_hash}
+                for key, image_hash in hashes.items()
+            ]
+        )
+        .on_conflict_do_nothing()
+    )
+    for key, (img_bytes, _) in rendered.items():
+        render_cache.put(hashes[key], img_bytes, key=key)
+    return hashes
+
+
+def get_thumbnail_bytes(image_hash: str, variant: str) -> Optional[bytes]:
+    return get_blob_bytes(variant_key(image_hash, variant))
+
+
+async def backfill_thumbnails(db: Session, batch_size: int = 200) -> int:
+    """
+    Generates missing thumbnails for images rendered before thumbnails existed,
+    or with different thumbnail settings. Commits after every batch.
+    """
+    created = 0
+    last_hash = ""
+    while True:
+        image_hashes = [
+            row[0]
+            for row in db.query(QRCode.image_hash)
+            .filter(QRCode.image_hash > last_hash)
+            .distinct()
+            .order_by(QRCode.image_hash)
+            .limit(batch_size)
+            .all()
+        ]
+        if not image_hashes:
+            break
+        last_hash = image_hashes[-1]
+
+        wanted = {image_hash: variant_key(image_hash, "popup") for image_hash in image_hashes}
+        present = {
+            row[0]
+            for row in db.query(RenderBlob.content_hash).filter(
+                RenderBlob.content_hash.in_(list(wanted.values()))
+            )
+        }
+        sources = {}
+        for image_hash, thumbnail_hash in wanted.items():
+            if thumbnail_hash in present:
+                continue
+            img_bytes = get_blob_store().get(image_hash)
+            if img_bytes is not None:
+                sources[image_hash] = img_bytes
+        if not sources:
+            continue
+
+        thumbnails = await render_thumbnails_batch(list(sources.values()))
+        blobs = {}
+        for image_hash, variants in zip(sources, thumbnails):
+            blobs.update(_thumbnail_blobs(image_hash, variants))
+        _store_blobs(db, blobs)
+        db.commit()
+        created += len(sources)
+    return created
+
+
+async def get_or_render(db: AsyncSession, qr_data: QRCodeCreate) -> str:
+    """
+    Returns the content hash of the image for these render parameters,
+    rendering and storing it only if no tier has it yet.
+    """
+    return (await get_or_render_batch(db, [qr_data]))[0]
+
+
+async def get_or_render_batch(db: AsyncSession, qr_datas: list[QRCodeCreate]) -> list[str]:
+    keys = [render_key(qr_data) for qr_data in qr_datas]
+    resolved: dict[str, str] = {}
+
+    for key in set(keys):
+        image_hash = render_cache.get_hash(key)
+        if image_hash is not None:
+            resolved[key] = image_hash
+            render_cache.memory_hits += 1
+
+    stored = await _lookup_stored(db, [key for key in set(keys) if key not in resolved])
+    for key, image_hash in stored.items():
+        resolved[key] = image_hash
+        render_cache.store_hits += 1
+        render_cache.put_key(key, image_hash)
+
+    to_render = {}
+    for key, qr_data in zip(keys, qr_datas):
+        if key not in resolved and key not in to_render:
+            to_render[key] = qr_data
+    render_cache.misses += len(to_render)
+    if to_render:
+        # Hand the connection back while rendering so other writers are not held up
+        await db.rollback()
+
+    if len(to_render) == 1:
+        images = [await render_qrcode(next(iter(to_render.values())))]
+    else:
+        images = await render_qrcode_batch(list(to_render.values()))
+    resolved.update(await _store(db, dict(zip(to_render, images))))
+
+    return [resolved[key] for key in keys]
@@ -0,0 +1,207 @@
+import asyncio
+import math
+from concurrent.futures import Executor, ProcessPoolExecutor
+from io import BytesIO
+from typing import Optional
+from xml.sax.saxutils import quoteattr
+
+import config
+from schemas.qrcode import QRCodeCreate
+from services.metrics_service import (
+    collect_stage_timings,
+    record_stage_timings,
+    timed,
+)
+from services.thumbnail_service import make_thumbnails, thumbnail_spec
+
+_executor: Optional[Executor] = None
+
+
+def render_params(qr_data: QRCodeCreate) -> tuple:
+    return (
+        qr_data.url,
+        qr_data.version,
+        qr_data.box_size,
+        qr_data.border,
+        qr_data.fill_color,
+        qr_data.back_color,
+    )
+
+
+def render_qrcode_png(
+    url: str,
+    version: int,
+    box_size: int,
+    border: int,
+    fill_color: str,
+    back_color: str,
+) -> bytes:
+    """
+    Encodes and rasterizes a QR code to PNG bytes. Runs inside pool workers,
+    so it only takes plain picklable arguments.
+    """
+    # Imported here so only processes that render load qrcode and Pillow
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=version,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=box_size,
+        border=border,
+    )
+    with timed("qr_render"):
+        qr.add_data(url)
+        qr.make(fit=True)
+        img = qr.make_image(fill_color=fill_color, back_color=back_color)
+    buffer = BytesIO()
+    with timed("png_encode"):
+        img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_qrcode_svg(
+    url: str,
+    version: int,
+    box_size: int,
+    border: int,
+    fill_color: str,
+    back_color: str,
+) -> bytes:
+    """
+    Encodes a QR code as SVG without rasterizing it: one path with a
+    rectangle per horizontal run of dark modules, in module units. Pillow is
+    still loaded, since the qrcode package imports it.
+    """
+    import qrcode
+
+    with timed("svg_render"):
+        qr = qrcode.QRCode(
+            version=version,
+            error_correction=qrcode.constants.ERROR_CORRECT_M,
+            border=border,
+        )
+        qr.add_data(url)
+        qr.make(fit=True)
+        matrix = qr.get_matrix()
+        size = len(matrix)
+        runs = []
+        for y, row in enumerate(matrix):
+            x = 0
+            while x < size:
+                if not row[x]:
+                    x += 1
+                    continue
+                start = x
+                while x < size and row[x]:
+                    x += 1
+                runs.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+        pixels = size * box_size
+        svg = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixels}" height="{pixels}" '
+            f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+            f'<rect width="{size}" height="{size}" fill={quoteattr(back_color)}/>'
+            f'<path fill={quoteattr(fill_color)} d="{"".join(runs)}"/></svg>'
+        )
+    return svg.encode("utf-8")
+
+
+def png_to_webp(png_bytes: bytes) -> bytes:
+    """
+    Re-encodes a rendered PNG as lossless WebP.
+    """
+    from PIL import Image
+
+    with timed("webp_encode"):
+        with Image.open(BytesIO(png_bytes)) as img:
+            buffer = BytesIO()
+            img.convert("RGB").save(buffer, format="WEBP", lossless=True, method=6)
+    return buffer.getvalue()
+
+
+def render_qrcode_assets(params: tuple, spec: tuple) -> tuple[bytes, dict]:
+    """
+    Renders the PNG and its thumbnails in one worker round-trip.
+    """
+    png_bytes = render_qrcode_png(*params)
+    return png_bytes, make_thumbnails(png_bytes, spec)
+
+
+def render_qrcode_assets_batch(params_list: list[tuple], spec: tuple) -> list[tuple]:
+    return [render_qrcode_assets(params, spec) for params in params_list]
+
+
+def make_thumbnails_batch(images: list[bytes], spec: tuple) -> list[dict]:
+    return [make_thumbnails(png_bytes, spec) for png_bytes in images]
+
+
+def get_executor() -> Optional[Executor]:
+    global _executor
+    if _executor is None and config.RENDER_WORKERS > 0:
+        _executor = ProcessPoolExecutor(max_workers=config.RENDER_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+async def _run(func, *args):
+    executor = get_executor()
+    if executor is None:
+        return await asyncio.to_thread(func, *args)
+    loop = asyncio.get_running_loop()
+    result, timings = await loop.run_in_executor(
+        executor, collect_stage_timings, func, *args
+    )
+    record_stage_timings(timings)
+    return result
+
+
+def _chunks(items: list) -> list[list]:
+    # A few chunks per worker so each process round-trip carries several items
+    chunk_count = max(1, config.RENDER_WORKERS) * 4
+    chunk_size = math.ceil(len(items) / chunk_count)
+    return [items[i : i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+async def render_qrcode(qr_data: QRCodeCreate) -> tuple[bytes, dict]:
+    """
+    Renders a QR code off the event loop. Returns the PNG and its thumbnails.
+    """
+    return await _run(render_qrcode_assets, render_params(qr_data), thumbnail_spec())
+
+
+async def render_qrcode_svg_async(params: tuple) -> bytes:
+    return await _run(render_qrcode_svg, *params)
+
+
+async def png_to_webp_async(png_bytes: bytes) -> bytes:
+    return await _run(png_to_webp, png_bytes)
+
+
+async def render_qrcode_batch(qr_datas: list[QRCodeCreate]) -> list[tuple[bytes, dict]]:
+    """
+    Renders many QR codes in parallel across the worker pool.
+    """
+    if not qr_datas:
+        return []
+    params_list = [render_params(qr_data) for qr_data in qr_datas]
+    spec = thumbnail_spec()
+    results = await asyncio.gather(
+        *(_run(render_qrcode_assets_batch, chunk, spec) for chunk in _chunks(params_list))
+    )
+    return [assets for chunk in results for assets in chunk]
+
+
+async def render_thumbnails_batch(images: list[bytes]) -> list[dict]:
+    if not images:
+        return []
+    spec = thumbnail_spec()
+    results = await asyncio.gather(
+        *(_run(make_thumbnails_batch, chunk, spec) for chunk in _chunks(images))
+    )
+    return [thumbnails for chunk in results for thumbnails in chunk]
@@ -0,0 +1,238 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+from database import AsyncReadSessionLocal, AsyncSessionLocal
+from models.qrcode_model import QRCode
+from models.scan_model import ScanData
+from schemas.common import TimeBoundParams
+from services.periodic_task_service import PeriodicTask
+from services.rollup_service import to_utc_naive
+from services.scan_export_service import SCAN_COLUMNS
+from services.scan_ingest_service import publish_scan_changes, stage_scan_removals
+
+ArchivedScan = namedtuple("ArchivedScan", SCAN_COLUMNS)
+
+_EXTENSIONS = {"gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+
+def effective_retention_days(retention_days: Optional[int]) -> int:
+    """
+    Days scans of a QR code are kept; 0 keeps them forever.
+    """
+    return config.SCAN_RETENTION_DAYS if retention_days is None else retention_days
+
+
+def _compress(data: bytes) -> bytes:
+    if config.SCAN_ARCHIVE_COMPRESSION == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data)
+
+
+def _open_archive(path: Path) -> io.TextIOBase:
+    if path.name.endswith(_EXTENSIONS["zstd"]):
+        import zstandard
+
+        raw = zstandard.ZstdDecompressor().stream_reader(
+            path.open("rb"), read_across_frames=True, closefd=True
+        )
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    return gzip.open(path, "rt", encoding="utf-8")
+
+
+def archive_path(month: str, qr_id: int) -> Path:
+    extension = _EXTENSIONS[config.SCAN_ARCHIVE_COMPRESSION]
+    return Path(config.SCAN_ARCHIVE_DIR) / month / f"qr_{qr_id}{extension}"
+
+
+def append_archive(rows: list[dict]) -> dict[Path, int]:
+    """
+    Appends scans to their monthly archive files. Every call adds one
+    compressed frame per file; readers decode the frames back to back.
+    Returns the size of each file before the append, for truncate_archive.
+    """
+    groups = defaultdict(list)
+    for row in rows:
+        month = row["created"].strftime("%Y-%m") if row["created"] else "undated"
+        groups[(month, row["qr_id"])].append(row)
+
+    sizes = {}
+    for (month, qr_id), group in groups.items():
+        lines = []
+        for row in group:
+            record = {column: row[column] for column in SCAN_COLUMNS}
+            if record["created"] is not None:
+                record["created"] = record["created"].isoformat()
+            lines.append(json.dumps(record) + "\n")
+        path = archive_path(month, qr_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("ab") as archive:
+            sizes[path] = archive.tell()
+            archive.write(_compress("".join(lines).encode("utf-8")))
+            archive.flush()
+            # The rows are deleted right after; make sure they are on disk first
+            os.fsync(archive.fileno())
+    return sizes
+
+
+def truncate_archive(sizes: dict[Path, int]):
+    """
+    Undoes an append_archive whose delete did not commit.
+    """
+    for path, size in sizes.items():
+        if size:
+            os.truncate(path, size)
+        else:
+            path.unlink(missing_ok=True)
+
+
+def iter_archived_scan_chunks(
+    qr_id: int, chunk_size: int, time_params: Optional[TimeBoundParams] = None
+) -> Iterator[list]:
+    """
+    Reads archived scans of a QR code, oldest month first, skipping months
+    outside the time window.
+    """
+    root = Path(config.SCAN_ARCHIVE_DIR)
+    if not root.is_dir():
+        return
+    start = to_utc_naive(time_params.start_time) if time_params else None
+    end = to_utc_naive(time_params.end_time) if time_params else None
+
+    chunk = []
+    for month_dir in sorted(path for path in root.iterdir() if path.is_dir()):
+        month = month_dir.name
+        if month != "undated":
+            if start and month < start.strftime("%Y-%m"):
+                continue
+            if end and month > end.strftime("%Y-%m"):
+                continue
+        for path in sorted(month_dir.glob(f"qr_{qr_id}.ndjson*")):
+            with _open_archive(path) as archive:
+                for line in archive:
+                    record = json.loads(line)
+                    created = record["created"]
+                    if created is not None:
+                        created = datetime.fromisoformat(created)
+                        if (start and created < start) or (end and created > end):
+                            continue
+                    record["created"] = created
+                    # Archives written before enrichment lack its columns
+                    chunk.append(
+                        ArchivedScan(*(record.get(column) for column in SCAN_COLUMNS))
+                    )
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+    if chunk:
+        yield chunk
+
+
+async def delete_scan_chunk(
+    db: AsyncSession, conditions: list, chunk_size: int
+) -> list[dict]:
+    """
+    Deletes up to chunk_size matching scans, oldest first, and returns them.
+    Rollups and scan versions are updated in the same transaction; the
+    caller commits.
+    """
+    ids = (
+        select(ScanData.id)
+        .where(*conditions)
+        .order_by(ScanData.created, ScanData.id)
+        .limit(chunk_size)
+    )
+    result = await db.execute(
+        delete(ScanData)
+        .where(ScanData.id.in_(ids))
+        .returning(*(getattr(ScanData, column) for column in SCAN_COLUMNS))
+        .execution_options(synchronize_session=False)
+    )
+    rows = [row._asdict() for row in result]
+    if rows:
+        await db.run_sync(stage_scan_removals, rows)
+    return rows
+
+
+async def delete_scans_in_chunks(conditions: list, archive: bool = False) -> int:
+    """
+    Deletes matching scans in short transactions of SCAN_DELETE_CHUNK_SIZE
+    rows so other writers get the writer connection between chunks.
+    With archive=True every chunk is archived before its delete commits, and
+    the archived copy is truncated away again if the commit fails.
+    """
+    chunk_size = config.SCAN_DELETE_CHUNK_SIZE
+    deleted = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = await delete_scan_chunk(db, conditions, chunk_size)
+            archived = {}
+            if rows and archive:
+                archived = await asyncio.to_thread(append_archive, rows)
+            try:
+                await db.commit()
+            except Exception:
+                # The rows stay live, so their archived copy has to go
+                await asyncio.to_thread(truncate_archive, archived)
+                raise
+        if rows:
+            publish_scan_changes(row["qr_id"] for row in rows)
+        deleted += len(rows)
+        if len(rows) < chunk_size:
+            return deleted
+        await asyncio.sleep(0)
+
+
+async def delete_all_scans(qr_id: int) -> int:
+    """
+    Deletes every scan of a QR code that exists when the call starts.
+    """
+    async with AsyncReadSessionLocal() as db:
+        max_id = await db.scalar(
+            select(func.max(ScanData.id)).where(ScanData.qr_id == qr_id)
+        )
+    if max_id is None:
+        return 0
+    return await delete_scans_in_chunks(
+        [ScanData.qr_id == qr_id, ScanData.id <= max_id]
+    )
+
+
+async def apply_scan_retention(now: Optional[datetime] = None) -> dict[int, int]:
+    """
+    Archives and deletes scans older than their QR code's retention period.
+    Returns the number of expired scans per QR code.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    async with AsyncReadSessionLocal() as db:
+        policies = (await db.execute(select(QRCode.id, QRCode.retention_days))).all()
+
+    expired = {}
+    for qr_id, retention_days in policies:
+        days = effective_retention_days(retention_days)
+        if days <= 0:
+            continue
+        cutoff = now - timedelta(days=days)
+        deleted = await delete_scans_in_chunks(
+            [ScanData.qr_id == qr_id, ScanData.created < cutoff], archive=True
+        )
+        if deleted:
+            expired[qr_id] = deleted
+    return expired
+
+
+scan_retention_task = PeriodicTask(
+    "Scan retention", apply_scan_retention, config.SCAN_RETENTION_INTERVAL
+)
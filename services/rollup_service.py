@@ -0,0 +1,195 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models.scan_model import ScanData
+from models.scan_rollup_model import ScanRollup
+
+# Coarsest first. Each entry: name, floor function, bucket length,
+# and the strftime pattern used to rebuild buckets in SQL.
+GRANULARITIES = [
+    (
+        "day",
+        lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0),
+        timedelta(days=1),
+        "%Y-%m-%d 00:00:00.000000",
+    ),
+    (
+        "hour",
+        lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+        timedelta(hours=1),
+        "%Y-%m-%d %H:00:00.000000",
+    ),
+    (
+        "minute",
+        lambda ts: ts.replace(second=0, microsecond=0),
+        timedelta(minutes=1),
+        "%Y-%m-%d %H:%M:00.000000",
+    ),
+]
+
+
+def to_utc_naive(ts: Optional[datetime]) -> Optional[datetime]:
+    """
+    Scan times are stored as naive UTC; normalize aware inputs to match.
+    """
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def apply_scan_rollups(db: Session, rows: list[dict], delta: int = 1):
+    """
+    Adds freshly inserted scans to their minute/hour/day buckets, or removes
+    deleted ones with delta=-1. Must run in the same transaction as the
+    scan insert or delete.
+    """
+    counts = Counter()
+    for row in rows:
+        if row["created"] is None:
+            continue
+        for name, floor, _, _ in GRANULARITIES:
+            counts[(row["qr_id"], name, floor(row["created"]))] += delta
+    if not counts:
+        return
+
+    stmt = sqlite_insert(ScanRollup)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["qr_id", "granularity", "bucket_start"],
+            set_={"count": ScanRollup.count + stmt.excluded.count},
+        ),
+        [
+            {"qr_id": qr_id, "granularity": name, "bucket_start": bucket, "count": count}
+            for (qr_id, name, bucket), count in counts.items()
+        ],
+    )
+
+
+def prune_empty_rollups(db: Session, qr_ids):
+    db.query(ScanRollup).filter(
+        ScanRollup.qr_id.in_(set(qr_ids)), ScanRollup.count <= 0
+    ).delete(synchronize_session=False)
+
+
+def rebuild_scan_rollups(db: Session, qr_id: Optional[int] = None):
+    """
+    Recomputes rollups from raw scans, for one QR code or for all of them.
+    """
+    delete_query = db.query(ScanRollup)
+    if qr_id is not None:
+        delete_query = delete_query.filter(ScanRollup.qr_id == qr_id)
+    delete_query.delete(synchronize_session=False)
+
+    for name, _, _, pattern in GRANULARITIES:
+        db.execute(
+            text(
+                "INSERT INTO scan_rollups (qr_id, granularity, bucket_start, count) "
+                "SELECT qr_id, :name, strftime(:pattern, created), COUNT(*) "
+                "FROM scan_data "
+                "WHERE created IS NOT NULL AND (:qr_id IS NULL OR qr_id = :qr_id) "
+                "GROUP BY qr_id, strftime(:pattern, created)"
+            ),
+            {"name": name, "pattern": pattern, "qr_id": qr_id},
+        )
+    db.commit()
+
+
+def ensure_scan_rollups(db: Session):
+    """
+    Builds rollups once for databases that have scans from before rollups existed.
+    """
+    has_rollups = db.query(ScanRollup.qr_id).first() is not None
+    has_scans = db.query(ScanData.id).first() is not None
+    if has_scans and not has_rollups:
+        rebuild_scan_rollups(db)
+
+
+def _ceil(ts: datetime, floor, step: timedelta) -> datetime:
+    floored = floor(ts)
+    return floored if floored == ts else floored + step
+
+
+def _plan(start, end, levels) -> list:
+    """
+    Splits the bucket-aligned range [start, end) into whole buckets, using the
+    coarsest granularity that fits and finer ones towards the edges.
+    None means unbounded.
+    """
+    if start is not None and end is not None and start >= end:
+        return []
+    name, floor, step, _ = levels[0]
+    if len(levels) == 1:
+        return [(name, start, end)]
+
+    inner_start = _ceil(start, floor, step) if start is not None else None
+    inner_end = floor(end) if end is not None else None
+    if inner_start is not None and inner_end is not None and inner_start >= inner_end:
+        return _plan(start, end, levels[1:])
+
+    plan = [(name, inner_start, inner_end)]
+    if start is not None:
+        plan = _plan(start, inner_start, levels[1:]) + plan
+    if end is not None:
+        plan = plan + _plan(inner_end, end, levels[1:])
+    return plan
+
+
+def _raw_count(db: Session, qr_id: int, start, end, end_inclusive: bool) -> int:
+    query = db.query(func.count(ScanData.id)).filter(ScanData.qr_id == qr_id)
+    if start is not None:
+        query = query.filter(ScanData.created >= start)
+    if end_inclusive:
+        query = query.filter(ScanData.created <= end)
+    else:
+        query = query.filter(ScanData.created < end)
+    return query.scalar()
+
+
+def _bucket_count(db: Session, qr_id: int, name: str, start, end) -> int:
+    query = db.query(func.coalesce(func.sum(ScanRollup.count), 0)).filter(
+        ScanRollup.qr_id == qr_id, ScanRollup.granularity == name
+    )
+    if start is not None:
+        query = query.filter(ScanRollup.bucket_start >= start)
+    if end is not None:
+        query = query.filter(ScanRollup.bucket_start < end)
+    return query.scalar()
+
+
+def count_scans(
+    db: Session,
+    qr_id: int,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> int:
+    """
+    Counts scans with start_time <= created <= end_time. Whole buckets come
+    from the rollups; only the partial minutes at the edges hit scan_data.
+    """
+    start_time = to_utc_naive(start_time)
+    end_time = to_utc_naive(end_time)
+    _, minute_floor, minute_step, _ = GRANULARITIES[-1]
+
+    core_start = None
+    if start_time is not None:
+        core_start = _ceil(start_time, minute_floor, minute_step)
+    core_end = None
+    if end_time is not None:
+        core_end = minute_floor(end_time)
+    if core_start is not None and core_end is not None and core_end < core_start:
+        # The whole window sits inside a single minute
+        return _raw_count(db, qr_id, start_time, end_time, True)
+
+    total = 0
+    if core_start is not None and core_start > start_time:
+        total += _raw_count(db, qr_id, start_time, core_start, False)
+    if core_end is not None:
+        total += _raw_count(db, qr_id, core_end, end_time, True)
+    for name, bucket_start, bucket_end in _plan(core_start, core_end, GRANULARITIES):
+        total += _bucket_count(db, qr_id, name, bucket_start, bucket_end)
+    return total
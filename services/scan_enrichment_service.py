@@ -0,0 +1,174 @@
+import asyncio
+import ipaddress
+import re
+from collections import namedtuple
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import bindparam, select, update
+
+import config
+from database import AsyncReadSessionLocal, AsyncSessionLocal
+from models.scan_model import ScanData
+from services.periodic_task_service import PeriodicTask
+
+# Bump when the parsing rules change so `manage.py enrich-scans` redoes old rows
+ENRICHMENT_VERSION = 1
+
+UserAgentInfo = namedtuple("UserAgentInfo", ["device_type", "browser", "os", "is_bot"])
+
+_BOT = re.compile(
+    r"bot\b|bot/|crawl|spider|slurp|facebookexternalhit|embedly|preview|"
+    r"monitor|headless|lighthouse|curl/|wget/|python-requests|python-urllib|"
+    r"httpclient|go-http-client|java/|libwww|scrapy",
+    re.IGNORECASE,
+)
+# First match wins, so more specific tokens come before the ones they embed
+_BROWSERS = [
+    ("Instagram", re.compile(r"Instagram")),
+    ("Facebook", re.compile(r"FBAN|FBAV")),
+    ("Edge", re.compile(r"Edg(e|A|iOS)?/")),
+    ("Opera", re.compile(r"OPR/|Opera")),
+    ("Samsung Internet", re.compile(r"SamsungBrowser/")),
+    ("Firefox", re.compile(r"Firefox/|FxiOS/")),
+    ("Chrome", re.compile(r"Chrome/|CriOS/|Chromium/")),
+    ("Safari", re.compile(r"Version/[\d.]+.*Safari/|AppleWebKit/.*Mobile/")),
+    ("Internet Explorer", re.compile(r"MSIE |Trident/")),
+]
+_OPERATING_SYSTEMS = [
+    ("Windows Phone", re.compile(r"Windows Phone")),
+    ("iOS", re.compile(r"iPhone|iPad|iPod|CPU (iPhone )?OS")),
+    ("Android", re.compile(r"Android")),
+    ("Windows", re.compile(r"Windows")),
+    ("ChromeOS", re.compile(r"CrOS")),
+    ("macOS", re.compile(r"Mac OS X|Macintosh")),
+    ("Linux", re.compile(r"Linux|X11")),
+]
+_TABLET = re.compile(r"iPad|Tablet|Kindle|Silk/|PlayBook")
+_MOBILE = re.compile(r"Mobi|iPhone|iPod|Windows Phone|Opera Mini")
+
+
+def _first_match(patterns: list, user_agent: str) -> str:
+    for name, pattern in patterns:
+        if pattern.search(user_agent):
+            return name
+    return "Other"
+
+
+def _parse_user_agent(user_agent: Optional[str]) -> UserAgentInfo:
+    if not user_agent:
+        return UserAgentInfo("other", "Other", "Other", False)
+    is_bot = bool(_BOT.search(user_agent))
+    os = _first_match(_OPERATING_SYSTEMS, user_agent)
+    if is_bot:
+        device_type = "bot"
+    elif _TABLET.search(user_agent) or (
+        os == "Android" and "Mobile" not in user_agent
+    ):
+        device_type = "tablet"
+    elif _MOBILE.search(user_agent):
+        device_type = "mobile"
+    elif os in ("Windows", "macOS", "Linux", "ChromeOS"):
+        device_type = "desktop"
+    else:
+        device_type = "other"
+    return UserAgentInfo(device_type, _first_match(_BROWSERS, user_agent), os, is_bot)
+
+
+# Real traffic repeats a handful of user agents, so parsing is nearly free
+parse_user_agent = lru_cache(maxsize=config.SCAN_ENRICH_UA_CACHE_SIZE)(
+    _parse_user_agent
+)
+
+
+def ip_prefix(ip_address: Optional[str]) -> Optional[str]:
+    """
+    Network an address belongs to: /24 for IPv4 and /48 for IPv6 by default.
+    IPv4-mapped IPv6 addresses are bucketed as IPv4.
+    """
+    try:
+        address = ipaddress.ip_address((ip_address or "").strip())
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    if address.version == 4:
+        prefix = config.SCAN_ENRICH_IPV4_PREFIX
+    else:
+        prefix = config.SCAN_ENRICH_IPV6_PREFIX
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def enrichment_values(
+    scan_id: int, ip_address: Optional[str], user_agent: Optional[str]
+) -> dict:
+    info = parse_user_agent(user_agent)
+    return {
+        "scan_id": scan_id,
+        "device_type": info.device_type,
+        "browser": info.browser,
+        "os": info.os,
+        "is_bot": info.is_bot,
+        "ip_prefix": ip_prefix(ip_address),
+        "enrichment_version": ENRICHMENT_VERSION,
+    }
+
+
+_scan_table = ScanData.__table__
+_ENRICH_SCANS = update(_scan_table).where(_scan_table.c.id == bindparam("scan_id"))
+
+
+async def enrich_scans(conditions: list, batch_size: int) -> int:
+    """
+    Enriches matching scans in id order, one short writer transaction per
+    batch, so ingest only ever waits for a single batch.
+    """
+    enriched = 0
+    last_id = 0
+    while True:
+        async with AsyncReadSessionLocal() as db:
+            rows = (
+                await db.execute(
+                    select(ScanData.id, ScanData.ip_address, ScanData.user_agent)
+                    .where(*conditions, ScanData.id > last_id)
+                    .order_by(ScanData.id)
+                    .limit(batch_size)
+                )
+            ).all()
+        if not rows:
+            return enriched
+        values = [enrichment_values(*row) for row in rows]
+        async with AsyncSessionLocal() as db:
+            await db.execute(_ENRICH_SCANS, values)
+            await db.commit()
+        enriched += len(rows)
+        last_id = rows[-1][0]
+        if len(rows) < batch_size:
+            return enriched
+        await asyncio.sleep(0)
+
+
+async def enrich_new_scans() -> int:
+    """
+    Background pass over scans ingested since the last one. Rows from before
+    enrichment existed are picked up the same way, a batch at a time.
+    """
+    return await enrich_scans(
+        [ScanData.enrichment_version == 0], config.SCAN_ENRICH_BATCH_SIZE
+    )
+
+
+async def backfill_scan_enrichment(all_rows: bool = False) -> int:
+    """
+    Enriches every scan not yet processed by the current ENRICHMENT_VERSION,
+    or every scan with all_rows=True.
+    """
+    conditions = []
+    if not all_rows:
+        conditions.append(ScanData.enrichment_version < ENRICHMENT_VERSION)
+    return await enrich_scans(conditions, config.SCAN_ENRICH_BATCH_SIZE)
+
+
+scan_enrichment_task = PeriodicTask(
+    "Scan enrichment", enrich_new_scans, config.SCAN_ENRICH_INTERVAL
+)
@@ -0,0 +1,141 @@
+import base64
+import csv
+import json
+from io import StringIO
+from typing import Iterator, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import String, cast, literal, tuple_
+from sqlalchemy.orm import Session
+
+from database import ReadSessionLocal
+from models.scan_model import ScanData
+from schemas.common import TimeBoundParams
+from services.rollup_service import to_utc_naive
+
+SCAN_COLUMNS = [
+    "id",
+    "qr_id",
+    "ip_address",
+    "user_agent",
+    "latitude",
+    "longitude",
+    "device_type",
+    "browser",
+    "os",
+    "is_bot",
+    "ip_prefix",
+    "created",
+]
+
+
+def encode_scan_cursor(created_key: str, scan_id: int) -> str:
+    raw = f"{created_key}|{scan_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_scan_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        created_key, scan_id = (
+            base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        )
+        return created_key, int(scan_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def fetch_scan_page(
+    db: Session,
+    qr_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    time_params: Optional[TimeBoundParams] = None,
+) -> tuple[list, Optional[str]]:
+    """
+    Returns up to `limit` scans ordered by (created, id) after the cursor,
+    as plain row tuples, and the cursor for the next page.
+    """
+    # The cursor carries created exactly as stored, so rows written by the
+    # server default and by the application compare consistently.
+    created_key = cast(ScanData.created, String)
+    query = db.query(
+        ScanData.id,
+        ScanData.qr_id,
+        ScanData.ip_address,
+        ScanData.user_agent,
+        ScanData.latitude,
+        ScanData.longitude,
+        ScanData.device_type,
+        ScanData.browser,
+        ScanData.os,
+        ScanData.is_bot,
+        ScanData.ip_prefix,
+        ScanData.created,
+        created_key.label("created_key"),
+    ).filter(ScanData.qr_id == qr_id)
+
+    if time_params and time_params.start_time:
+        query = query.filter(ScanData.created >= to_utc_naive(time_params.start_time))
+    if time_params and time_params.end_time:
+        query = query.filter(ScanData.created <= to_utc_naive(time_params.end_time))
+    if cursor:
+        after_created, after_id = decode_scan_cursor(cursor)
+        query = query.filter(
+            tuple_(ScanData.created, ScanData.id)
+            > tuple_(literal(after_created, String), literal(after_id))
+        )
+
+    rows = query.order_by(ScanData.created, ScanData.id).limit(limit).all()
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_scan_cursor(rows[-1].created_key, rows[-1].id)
+    return rows, next_cursor
+
+
+def iter_scan_chunks(
+    qr_id: int, chunk_size: int, time_params: Optional[TimeBoundParams] = None
+) -> Iterator[list]:
+    """
+    Walks all scans of a QR code in keyset-ordered chunks. Each chunk is read
+    in its own short transaction so a long export never holds a read lock
+    that would block scan writers.
+    """
+    db = ReadSessionLocal()
+    try:
+        cursor = None
+        while True:
+            rows, cursor = fetch_scan_page(db, qr_id, chunk_size, cursor, time_params)
+            db.rollback()
+            if rows:
+                yield rows
+            if cursor is None:
+                break
+    finally:
+        db.close()
+
+
+def _row_values(row) -> list:
+    values = [getattr(row, column) for column in SCAN_COLUMNS]
+    created = values[-1]
+    values[-1] = created.isoformat() if created else None
+    return values
+
+
+def iter_scan_ndjson(chunks: Iterator[list]) -> Iterator[str]:
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(SCAN_COLUMNS, _row_values(row)))) + "\n" for row in rows
+        )
+
+
+def iter_scan_csv(chunks: Iterator[list]) -> Iterator[str]:
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(SCAN_COLUMNS)
+    for rows in chunks:
+        writer.writerows(_row_values(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,240 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+import config
+from database import AsyncSessionLocal
+from models.scan_model import ScanData
+from schemas.scan_data import ScanDataCreate
+from services.map_cache_service import map_render_cache
+from services.qrcode_service import bump_scan_versions
+from services.rollup_service import apply_scan_rollups, prune_empty_rollups
+from services.scan_stream_service import publish_scan_events
+
+logger = logging.getLogger(__name__)
+
+
+def scan_row(scan_data: ScanDataCreate, qr_id: int) -> dict:
+    """
+    Builds the column mapping for a scan insert, stamped with the time the
+    scan was received rather than the time it is eventually written.
+    """
+    return {
+        "qr_id": qr_id,
+        "ip_address": scan_data.ip_address,
+        "user_agent": scan_data.user_agent,
+        "latitude": scan_data.location.latitude,
+        "longitude": scan_data.location.longitude,
+        "created": datetime.now(timezone.utc).replace(tzinfo=None),
+    }
+
+
+def stage_scan_changes(db: Session, rows: list[dict]):
+    """
+    Updates everything derived from scans inside the transaction that
+    inserts them.
+    """
+    apply_scan_rollups(db, rows)
+    bump_scan_versions(db, {row["qr_id"] for row in rows})
+
+
+def stage_scan_removals(db: Session, rows: list[dict]):
+    """
+    Removes deleted scans from everything derived from them, inside the
+    transaction that deletes them.
+    """
+    qr_ids = {row["qr_id"] for row in rows}
+    apply_scan_rollups(db, rows, delta=-1)
+    prune_empty_rollups(db, qr_ids)
+    bump_scan_versions(db, qr_ids)
+
+
+def publish_scan_changes(qr_ids):
+    """
+    Notifies in-process caches once scans have been committed or deleted.
+    """
+    for qr_id in set(qr_ids):
+        map_render_cache.invalidate(qr_id)
+
+
+async def write_scan_rows(rows: list[dict]):
+    """
+    Writes a batch of scan rows with one executemany INSERT in one
+    transaction on the shared writer connection.
+    """
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(ScanData), rows)
+        await db.run_sync(stage_scan_changes, rows)
+        await db.commit()
+    publish_scan_changes(row["qr_id"] for row in rows)
+    publish_scan_events(rows)
+
+
+class ScanIngestQueue:
+    """
+    Bounded write-behind queue for scans. Requests enqueue rows and return
+    immediately; a background task flushes them whenever a batch fills up or
+    the flush interval elapses.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        enqueue_timeout: float,
+        stop_retries: int = 3,
+        spill_dir: Optional[str] = None,
+    ):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.stop_retries = stop_retries
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: list[dict] = []
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if self.running:
+            return
+        await self._replay_spilled()
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops accepting scans and waits for the flusher to write everything
+        still queued. Scans that still cannot be written after stop_retries
+        attempts are spilled to disk and written on the next start.
+        """
+        if not self.running:
+            return
+        self._stopping = True
+        try:
+            # Wakes the flusher if it is waiting for a batch to fill
+            self._queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+        await self._task
+        self._task = None
+        self._stopping = False
+
+    async def enqueue(self, row: dict):
+        if not self.running or self._stopping:
+            raise HTTPException(status_code=503, detail="Scan ingestion is not running")
+        try:
+            await asyncio.wait_for(self._queue.put(row), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="Scan ingestion queue is full",
+                headers={"Retry-After": "1"},
+            )
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _drained(self) -> bool:
+        return self._queue.empty() and not self._pending
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        failures = 0
+        while not (self._stopping and self._drained()):
+            deadline = loop.time() + self.flush_interval
+            while len(self._pending) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    break
+                self._pending.append(row)
+
+            if not self._pending:
+                continue
+            try:
+                await self._flush()
+                failures = 0
+            except Exception:
+                logger.exception("Failed to flush %d scans", len(self._pending))
+                failures += 1
+                if self._stopping and failures > self.stop_retries:
+                    await asyncio.to_thread(self._spill)
+                    break
+                # Keep the rows and retry on the next cycle
+                await asyncio.sleep(self.flush_interval)
+
+    async def _flush(self):
+        batch = self._pending[: self.batch_size]
+        await write_scan_rows(batch)
+        del self._pending[: len(batch)]
+
+    def _spill(self):
+        while not self._queue.empty():
+            row = self._queue.get_nowait()
+            if row is not None:
+                self._pending.append(row)
+        if not self.spill_dir:
+            logger.error("Dropping %d unwritten scans", len(self._pending))
+            self._pending.clear()
+            return
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        path = self.spill_dir / f"scans-{time.time_ns()}-{os.getpid()}.ndjson"
+        tmp_path = path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as spill:
+            for row in self._pending:
+                spill.write(json.dumps(row, default=datetime.isoformat) + "\n")
+            spill.flush()
+            os.fsync(spill.fileno())
+        os.replace(tmp_path, path)
+        logger.error("Spilled %d unwritten scans to %s", len(self._pending), path)
+        self._pending.clear()
+
+    async def _replay_spilled(self):
+        if not self.spill_dir or not self.spill_dir.is_dir():
+            return
+        for path in sorted(self.spill_dir.glob("scans-*.ndjson")):
+            rows = []
+            for line in path.read_text(encoding="utf-8").splitlines():
+                row = json.loads(line)
+                if row["created"] is not None:
+                    row["created"] = datetime.fromisoformat(row["created"])
+                rows.append(row)
+            try:
+                # One transaction, so a failed replay can simply be retried
+                await write_scan_rows(rows)
+            except Exception:
+                logger.exception("Failed to replay spilled scans from %s", path)
+                continue
+            path.unlink()
+            logger.info("Replayed %d spilled scans from %s", len(rows), path)
+
+
+scan_ingest_queue = ScanIngestQueue(
+    max_size=config.SCAN_INGEST_QUEUE_SIZE,
+    batch_size=config.SCAN_INGEST_BATCH_SIZE,
+    flush_interval=config.SCAN_INGEST_FLUSH_INTERVAL,
+    enqueue_timeout=config.SCAN_INGEST_ENQUEUE_TIMEOUT,
+    stop_retries=config.SCAN_INGEST_STOP_RETRIES,
+    spill_dir=config.SCAN_INGEST_SPILL_DIR,
+)
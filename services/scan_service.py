@@ -1,24 +1,58 @@
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 
-from .qrcode_service import get_qrcode_by_qr_id
+from .qrcode_cache_service import get_qrcode_metadata, get_qrcode_metadata_async
+from .scan_stream_service import publish_scan_events
+from .scan_ingest_service import (
+    publish_scan_changes,
+    scan_ingest_queue,
+    scan_row,
+    stage_scan_changes,
+)
 from models.scan_model import ScanData
 from schemas.scan_data import ScanDataCreate
 
 
 def save_scan_data(db: Session, scan_data: ScanDataCreate, qr_id):
-    db_qrcode = get_qrcode_by_qr_id(db, qr_id)
+    db_qrcode = get_qrcode_metadata(db, qr_id)
     if not db_qrcode:
         raise HTTPException(status_code=404, detail="QR code not found")
 
-    db_scan_data = ScanData(
-        qr_id=db_qrcode.id,
-        ip_address=scan_data.ip_address,
-        user_agent=scan_data.user_agent,
-        latitude=scan_data.location.latitude,
-        longitude=scan_data.location.longitude,
-    )
+    row = scan_row(scan_data, db_qrcode.id)
+    db_scan_data = ScanData(**row)
     db.add(db_scan_data)
+    stage_scan_changes(db, [row])
     db.commit()
+    publish_scan_changes([db_qrcode.id])
     db.refresh(db_scan_data)
+    publish_scan_events([{**row, "id": db_scan_data.id}])
     return db_scan_data
+
+
+async def save_scan_data_async(db: AsyncSession, scan_data: ScanDataCreate, qr_id):
+    db_qrcode = await get_qrcode_metadata_async(db, qr_id)
+    if not db_qrcode:
+        raise HTTPException(status_code=404, detail="QR code not found")
+
+    row = scan_row(scan_data, db_qrcode.id)
+    db_scan_data = ScanData(**row)
+    db.add(db_scan_data)
+    await db.run_sync(stage_scan_changes, [row])
+    await db.commit()
+    publish_scan_changes([db_qrcode.id])
+    publish_scan_events([{**row, "id": db_scan_data.id}])
+    return db_scan_data
+
+
+async def enqueue_scan_data(db: AsyncSession, scan_data: ScanDataCreate, qr_id) -> int:
+    """
+    Validates the QR code and hands the scan to the write-behind queue.
+    Returns the id of the scanned QR code.
+    """
+    db_qrcode = await get_qrcode_metadata_async(db, qr_id)
+    if not db_qrcode:
+        raise HTTPException(status_code=404, detail="QR code not found")
+
+    await scan_ingest_queue.enqueue(scan_row(scan_data, db_qrcode.id))
+    return db_qrcode.id
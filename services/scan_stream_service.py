@@ -0,0 +1,232 @@
+import asyncio
+from collections import Counter, defaultdict
+from typing import AsyncIterator, Iterable, Optional
+
+import orjson
+from fastapi import HTTPException
+
+import config
+from services.periodic_task_service import PeriodicTask
+
+
+def encode_event(name: str, data) -> bytes:
+    return f"event: {name}\ndata: ".encode("ascii") + orjson.dumps(data) + b"\n\n"
+
+
+def scan_event(row: dict) -> dict:
+    event = {
+        "qr_id": row["qr_id"],
+        "ip_address": row["ip_address"],
+        "user_agent": row["user_agent"],
+        "location": {"latitude": row["latitude"], "longitude": row["longitude"]},
+        "created": row["created"],
+    }
+    if row.get("id") is not None:
+        event["id"] = row["id"]
+    return event
+
+
+class ScanSubscriber:
+    __slots__ = ("qr_id", "include_scans", "queue", "close_reason")
+
+    def __init__(self, qr_id: Optional[int], include_scans: bool, queue_size: int):
+        self.qr_id = qr_id
+        self.include_scans = include_scans
+        # Pre-encoded events; None ends the stream with close_reason
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.close_reason: Optional[str] = None
+
+
+class ScanEventHub:
+    """
+    In-process fan-out of committed scans to stream subscribers. Events are
+    encoded once and shared by every subscriber; a subscriber whose queue
+    fills up is dropped instead of slowing the others down. Counts are
+    coalesced and sent once per interval, and only for codes that had scans,
+    so idle subscribers cost nothing but their queue.
+    """
+
+    def __init__(self, queue_size: int, max_subscribers: int):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._by_code: dict[int, set[ScanSubscriber]] = defaultdict(set)
+        self._all: set[ScanSubscriber] = set()
+        self._all_with_scans = 0
+        self._counts: Counter = Counter()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.subscribers = 0
+        self.published = 0
+        self.dropped = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    def stop(self):
+        """
+        Ends every open stream so shutdown does not wait on them.
+        """
+        for subscriber in list(self._all) + [
+            subscriber for group in self._by_code.values() for subscriber in group
+        ]:
+            self._close(subscriber, "shutdown")
+        self._loop = None
+
+    def check_capacity(self):
+        if self.subscribers >= self.max_subscribers:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many scan stream subscribers",
+                headers={"Retry-After": "5"},
+            )
+
+    def subscribe(
+        self, qr_id: Optional[int] = None, include_scans: bool = True
+    ) -> ScanSubscriber:
+        self.check_capacity()
+        subscriber = ScanSubscriber(qr_id, include_scans, self.queue_size)
+        if qr_id is None:
+            self._all.add(subscriber)
+            self._all_with_scans += include_scans
+        else:
+            self._by_code[qr_id].add(subscriber)
+        self.subscribers += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: ScanSubscriber):
+        if subscriber.qr_id is None:
+            if subscriber not in self._all:
+                return
+            self._all.discard(subscriber)
+            self._all_with_scans -= subscriber.include_scans
+        else:
+            group = self._by_code.get(subscriber.qr_id)
+            if not group or subscriber not in group:
+                return
+            group.discard(subscriber)
+            if not group:
+                del self._by_code[subscriber.qr_id]
+        self.subscribers -= 1
+
+    def _close(self, subscriber: ScanSubscriber, reason: str):
+        self.unsubscribe(subscriber)
+        subscriber.close_reason = reason
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    def _send(self, subscriber: ScanSubscriber, data: bytes):
+        try:
+            subscriber.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self._close(subscriber, "overflow")
+
+    def publish(self, rows: Iterable[dict]):
+        """
+        Called once scans are committed, from any thread.
+        """
+        loop = self._loop
+        if loop is None or not self.subscribers:
+            return
+        rows = list(rows)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(rows)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._dispatch, rows)
+            except RuntimeError:
+                # The serving loop has already shut down
+                pass
+
+    def _dispatch(self, rows: list[dict]):
+        for row in rows:
+            qr_id = row["qr_id"]
+            group = self._by_code.get(qr_id)
+            if group or self._all:
+                self._counts[qr_id] += 1
+            if not group and not self._all_with_scans:
+                continue
+            data = encode_event("scan", scan_event(row))
+            self.published += 1
+            for subscriber in list(group or ()):
+                self._send(subscriber, data)
+            if self._all_with_scans:
+                for subscriber in list(self._all):
+                    if subscriber.include_scans:
+                        self._send(subscriber, data)
+
+    async def flush_counts(self) -> int:
+        """
+        Sends the scans counted since the last flush: a `count` event to the
+        subscribers of each code and one `counts` event to all-codes streams.
+        """
+        if not self._counts:
+            return 0
+        counts, self._counts = self._counts, Counter()
+        for qr_id, new_scans in counts.items():
+            group = self._by_code.get(qr_id)
+            if group:
+                data = encode_event("count", {"qr_id": qr_id, "new_scans": new_scans})
+                for subscriber in list(group):
+                    self._send(subscriber, data)
+        if self._all:
+            data = encode_event("counts", {str(qr_id): n for qr_id, n in counts.items()})
+            for subscriber in list(self._all):
+                self._send(subscriber, data)
+        return len(counts)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "codes_watched": len(self._by_code),
+            "all_codes_subscribers": len(self._all),
+            "published": self.published,
+            "dropped": self.dropped,
+            "max_subscribers": self.max_subscribers,
+            "queue_size": self.queue_size,
+        }
+
+
+scan_event_hub = ScanEventHub(
+    queue_size=config.SCAN_STREAM_QUEUE_SIZE,
+    max_subscribers=config.SCAN_STREAM_MAX_SUBSCRIBERS,
+)
+
+
+def publish_scan_events(rows: Iterable[dict]):
+    scan_event_hub.publish(rows)
+
+
+async def iter_scan_events(
+    qr_id: Optional[int], include_scans: bool, keepalive: float
+) -> AsyncIterator[bytes]:
+    """
+    Server-Sent Events body for one subscriber, subscribed once the response
+    starts so an abandoned request never holds a slot. Sends a comment when
+    idle so proxies keep the connection open. A `close` event ends the stream
+    when the subscriber fell behind (`overflow`) or the server is stopping.
+    """
+    subscriber = scan_event_hub.subscribe(qr_id, include_scans)
+    try:
+        yield b"retry: 5000\n\n"
+        while True:
+            try:
+                data = await asyncio.wait_for(subscriber.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if data is None:
+                yield encode_event("close", {"reason": subscriber.close_reason})
+                break
+            yield data
+    finally:
+        scan_event_hub.unsubscribe(subscriber)
+
+
+scan_stream_count_task = PeriodicTask(
+    "Scan stream counts", scan_event_hub.flush_counts, config.SCAN_STREAM_COUNT_INTERVAL
+)
@@ -0,0 +1,16 @@
+from database import Base, SessionLocal, engine, upgrade_schema
+import models  # noqa: F401  (registers the tables on Base.metadata)
+from services.rollup_service import ensure_scan_rollups
+from services.spatial_service import create_spatial_index
+
+
+def migrate_database(bind=engine):
+    """
+    Creates missing tables, brings existing ones in line with the models and
+    builds the derived spatial index and scan rollups. Safe to run repeatedly.
+    """
+    Base.metadata.create_all(bind=bind)
+    upgrade_schema(bind)
+    create_spatial_index(bind)
+    with SessionLocal() as db:
+        ensure_scan_rollups(db)
@@ -0,0 +1,260 @@
+import json
+import logging
+import weakref
+from datetime import datetime
+from typing import Iterator, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from database import ReadSessionLocal
+from services.analytics_service import sqlite_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Point tables indexed in an R*Tree: (source table, rtree table)
+SPATIAL_TABLES = [("scan_data", "scan_data_rtree"), ("qr_codes", "qr_codes_rtree")]
+
+_FETCH_CHUNK = 1000
+
+# Engine -> names of the R*Tree tables its database has
+_spatial_indexes = weakref.WeakKeyDictionary()
+
+
+def rtree_supported(conn) -> bool:
+    options = {row[0] for row in conn.exec_driver_sql("PRAGMA compile_options")}
+    return "ENABLE_RTREE" in options
+
+
+def spatial_indexes(bind: Engine) -> frozenset:
+    """
+    R*Tree tables present in the database, read from the schema once per
+    engine. The index is usually built by `manage.py migrate` in another
+    process, so this is the only reliable way to know it exists.
+    """
+    indexes = _spatial_indexes.get(bind)
+    if indexes is None:
+        with bind.connect() as conn:
+            names = set()
+            if rtree_supported(conn):
+                names = {
+                    row[0]
+                    for row in conn.exec_driver_sql(
+                        "SELECT name FROM sqlite_master WHERE type = 'table'"
+                    )
+                }
+        indexes = frozenset(rtree for _, rtree in SPATIAL_TABLES if rtree in names)
+        _spatial_indexes[bind] = indexes
+    return indexes
+
+
+def create_spatial_index(bind: Engine):
+    """
+    Creates R*Tree tables over QR code and scan coordinates, the triggers that
+    keep them in sync on insert, update and delete, and backfills existing rows.
+    """
+    # Engines that already looked the index up see the new schema
+    _spatial_indexes.clear()
+    with bind.begin() as conn:
+        if not rtree_supported(conn):
+            logger.warning("SQLite lacks the rtree module; bbox queries will scan")
+            return
+
+        for table, rtree in SPATIAL_TABLES:
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (rtree,),
+            ).first()
+            if not exists:
+                conn.exec_driver_sql(
+                    f"CREATE VIRTUAL TABLE {rtree} "
+                    "USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+                )
+                conn.exec_driver_sql(
+                    f"INSERT INTO {rtree} "
+                    "SELECT id, latitude, latitude, longitude, longitude "
+                    f"FROM {table} "
+                    "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+                )
+
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {rtree}_insert AFTER INSERT ON {table} "
+                "WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL BEGIN "
+                f"INSERT OR REPLACE INTO {rtree} VALUES "
+                "(NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude); "
+                "END"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {rtree}_delete AFTER DELETE ON {table} "
+                f"BEGIN DELETE FROM {rtree} WHERE id = OLD.id; END"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {rtree}_update "
+                f"AFTER UPDATE OF latitude, longitude ON {table} BEGIN "
+                f"DELETE FROM {rtree} WHERE id = OLD.id; "
+                f"INSERT INTO {rtree} "
+                "SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude "
+                "WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL; "
+                "END"
+            )
+
+
+def parse_bbox(bbox: str) -> tuple[float, float, float, float]:
+    """
+    Parses "min_lon,min_lat,max_lon,max_lat". min_lon may exceed max_lon for
+    viewports that cross the antimeridian.
+    """
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat"
+        )
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise HTTPException(status_code=400, detail="Invalid bbox latitude range")
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise HTTPException(status_code=400, detail="Invalid bbox longitude range")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _bbox_query(
+    table: str,
+    rtree: str,
+    columns: str,
+    bbox: tuple[float, float, float, float],
+    indexed: bool,
+) -> tuple[str, dict]:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    params = {"min_lat": min_lat, "max_lat": max_lat}
+    if min_lon <= max_lon:
+        lon_ranges = [(min_lon, max_lon)]
+    else:
+        lon_ranges = [(min_lon, 180.0), (-180.0, max_lon)]
+
+    if indexed:
+        source = f"{rtree} r JOIN {table} t ON t.id = r.id"
+        lat_filter = "r.min_lat <= :max_lat AND r.max_lat >= :min_lat"
+        lon_column_min, lon_column_max = "r.min_lon", "r.max_lon"
+    else:
+        source = f"{table} t"
+        lat_filter = "t.latitude BETWEEN :min_lat AND :max_lat"
+        lon_column_min = lon_column_max = "t.longitude"
+
+    lon_filters = []
+    for index, (low, high) in enumerate(lon_ranges):
+        params[f"min_lon_{index}"] = low
+        params[f"max_lon_{index}"] = high
+        lon_filters.append(
+            f"({lon_column_min} <= :max_lon_{index} "
+            f"AND {lon_column_max} >= :min_lon_{index})"
+        )
+    # The rtree stores 32-bit bounds, so re-check the exact coordinates
+    exact_lon = " OR ".join(
+        f"t.longitude BETWEEN :min_lon_{index} AND :max_lon_{index}"
+        for index in range(len(lon_ranges))
+    )
+    sql = (
+        f"SELECT {columns} FROM {source} WHERE {lat_filter} "
+        f"AND ({' OR '.join(lon_filters)}) "
+        "AND t.latitude BETWEEN :min_lat AND :max_lat "
+        f"AND ({exact_lon})"
+    )
+    return sql, params
+
+
+def _feature(longitude, latitude, properties: dict) -> str:
+    return json.dumps(
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [longitude, latitude]},
+            "properties": properties,
+        }
+    )
+
+
+def iter_bbox_geojson(
+    bbox: tuple[float, float, float, float],
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Streams a GeoJSON FeatureCollection of QR code placements and scans inside
+    the bbox. Scans are filtered by time; a truncated collection carries
+    "truncated": true.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield '{"type": "FeatureCollection", "features": ['
+        emitted = 0
+
+        indexes = spatial_indexes(db.get_bind())
+        qr_sql, qr_params = _bbox_query(
+            "qr_codes",
+            "qr_codes_rtree",
+            "t.id, t.name, t.url, t.latitude, t.longitude",
+            bbox,
+            "qr_codes_rtree" in indexes,
+        )
+        scan_sql, scan_params = _bbox_query(
+            "scan_data",
+            "scan_data_rtree",
+            "t.id, t.qr_id, t.created, t.latitude, t.longitude",
+            bbox,
+            "scan_data_rtree" in indexes,
+        )
+        if start_time:
+            scan_sql += " AND t.created >= :start_time"
+            scan_params["start_time"] = sqlite_timestamp(start_time)
+        if end_time:
+            scan_sql += " AND t.created <= :end_time"
+            scan_params["end_time"] = sqlite_timestamp(end_time)
+
+        queries = [
+            (
+                qr_sql,
+                qr_params,
+                lambda row: {
+                    "kind": "qrcode",
+                    "id": row[0],
+                    "name": row[1],
+                    "url": row[2],
+                },
+            ),
+            (
+                scan_sql,
+                scan_params,
+                lambda row: {
+                    "kind": "scan",
+                    "id": row[0],
+                    "qr_id": row[1],
+                    "created": row[2].replace(" ", "T", 1) if row[2] else None,
+                },
+            ),
+        ]
+        truncated = False
+        for sql, params, properties in queries:
+            if limit is not None:
+                # One extra row tells us whether the cap cut anything off
+                sql += f" LIMIT {limit - emitted + 1}"
+            result = db.execute(text(sql), params)
+            while rows := result.fetchmany(_FETCH_CHUNK):
+                if limit is not None and emitted + len(rows) > limit:
+                    rows = rows[: limit - emitted]
+                    truncated = True
+                yield "".join(
+                    ("," if emitted + offset else "")
+                    + _feature(row[4], row[3], properties(row))
+                    for offset, row in enumerate(rows)
+                )
+                emitted += len(rows)
+                if truncated:
+                    break
+            result.close()
+            if truncated:
+                break
+
+        yield f'], "truncated": {json.dumps(truncated)}}}'
+    finally:
+        db.close()
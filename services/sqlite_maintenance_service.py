@@ -0,0 +1,24 @@
+import config
+from database import WAL_PROFILE, async_engine
+from services.periodic_task_service import PeriodicTask
+
+
+async def run_sqlite_maintenance() -> dict:
+    """
+    Copies committed WAL frames back into the database file and refreshes
+    query planner statistics. Runs on the writer connection, so it queues
+    behind writes instead of competing with them.
+    """
+    async with async_engine.connect() as conn:
+        busy, wal_frames, checkpointed = (
+            await conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+        ).one()
+        await conn.exec_driver_sql("PRAGMA optimize")
+    return {"busy": bool(busy), "wal_frames": wal_frames, "checkpointed": checkpointed}
+
+
+sqlite_maintenance_task = PeriodicTask(
+    "SQLite maintenance",
+    run_sqlite_maintenance,
+    config.SQLITE_MAINTENANCE_INTERVAL if WAL_PROFILE else 0,
+)
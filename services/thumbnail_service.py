@@ -0,0 +1,90 @@
+import hashlib
+import math
+from io import BytesIO
+from typing import TYPE_CHECKING, Optional
+
+# Pillow is imported on first use so importing the app stays cheap
+if TYPE_CHECKING:
+    from PIL import Image
+
+import config
+
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp"}
+
+
+def thumbnail_spec() -> tuple:
+    """
+    Picklable description of the thumbnails to build: variant sizes and format.
+    """
+    return (
+        (("icon", config.THUMBNAIL_ICON_PX), ("popup", config.THUMBNAIL_POPUP_PX)),
+        config.THUMBNAIL_FORMAT,
+    )
+
+
+def thumbnail_media_type() -> str:
+    return MEDIA_TYPES[config.THUMBNAIL_FORMAT]
+
+
+def variant_key(image_hash: str, variant: str) -> str:
+    """
+    Blob address of a thumbnail. It is derived from the source image and the
+    thumbnail settings, so it can be looked up without a mapping table.
+    """
+    sizes, fmt = thumbnail_spec()
+    size = dict(sizes)[variant]
+    raw = f"{image_hash}:{variant}:{size}:{fmt}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _encode(img: "Image.Image", fmt: str) -> bytes:
+    buffer = BytesIO()
+    if fmt == "webp":
+        img.save(buffer, format="WEBP", lossless=True)
+    else:
+        img.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _shrink(img: "Image.Image", size: int) -> "Image.Image":
+    from PIL import Image
+
+    # QR images are two-tone; nearest-neighbour plus a two-colour palette keeps
+    # them crisp and encodes far smaller than a smoothed RGB image
+    return img.resize((size, size), Image.Resampling.NEAREST).quantize(colors=2)
+
+
+def make_thumbnails(png_bytes: bytes, spec: tuple) -> dict[str, bytes]:
+    """
+    Downscales a rendered QR image to every variant size in the spec.
+    """
+    from PIL import Image
+
+    sizes, fmt = spec
+    with Image.open(BytesIO(png_bytes)) as source:
+        source = source.convert("RGB")
+        return {variant: _encode(_shrink(source, size), fmt) for variant, size in sizes}
+
+
+def build_sprite_sheet(
+    images: list[Optional[bytes]], cell_px: int
+) -> tuple[bytes, int]:
+    """
+    Packs thumbnails into one grid image. Returns the encoded sheet and its
+    column count; image i sits at (i % columns, i // columns). Missing
+    images leave their cell blank.
+    """
+    from PIL import Image
+
+    columns = max(1, math.ceil(math.sqrt(len(images))))
+    rows = max(1, math.ceil(len(images) / columns))
+    sheet = Image.new("RGB", (columns * cell_px, rows * cell_px), "white")
+    for index, img_bytes in enumerate(images):
+        if not img_bytes:
+            continue
+        with Image.open(BytesIO(img_bytes)) as img:
+            img = img.convert("RGB")
+            if img.size != (cell_px, cell_px):
+                img = _shrink(img, cell_px).convert("RGB")
+            sheet.paste(img, ((index % columns) * cell_px, (index // columns) * cell_px))
+    return _encode(sheet.quantize(colors=256), config.THUMBNAIL_FORMAT), columns
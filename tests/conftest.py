@@ -0,0 +1,70 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Top-level app modules; they read their settings from the environment when
+# first imported.
+APP_MODULES = {
+    "config",
+    "database",
+    "main",
+    "manage",
+    "models",
+    "routers",
+    "schemas",
+    "services",
+}
+
+
+def _unload_app_modules():
+    for name in list(sys.modules):
+        if name.split(".")[0] in APP_MODULES:
+            del sys.modules[name]
+
+
+def _dispose_engines():
+    database = sys.modules.get("database")
+    if database is None:
+        return
+    for engine in (database.engine, database.read_engine):
+        engine.dispose()
+    for engine in (database.async_engine, database.async_read_engine):
+        engine.sync_engine.dispose()
+
+
+@pytest.fixture
+def app_env(tmp_path, monkeypatch):
+    """
+    Points the app at a fresh database and storage under tmp_path. App
+    modules are unloaded around the test so each test imports them with its
+    own settings; set further QRKEEP_ variables before importing them.
+    """
+    for name in list(os.environ):
+        if name.startswith("QRKEEP_"):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv("QRKEEP_DATABASE_URL", f"sqlite:///{tmp_path}/qrkeep.db")
+    monkeypatch.setenv("QRKEEP_BLOB_STORE_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setenv("QRKEEP_SCAN_ARCHIVE_DIR", str(tmp_path / "scan_archive"))
+    monkeypatch.setenv("QRKEEP_RENDER_WORKERS", "0")
+    monkeypatch.syspath_prepend(str(ROOT))
+    monkeypatch.chdir(tmp_path)
+    _unload_app_modules()
+    yield tmp_path
+    _dispose_engines()
+    _unload_app_modules()
+
+
+@pytest.fixture
+def client(app_env):
+    from fastapi.testclient import TestClient
+
+    from main import app
+    from services.schema_service import migrate_database
+
+    migrate_database()
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+QR_CODE = {
+    "name": "bulk",
+    "url": "https://example.org",
+    "location": {"latitude": 1.0, "longitude": 2.0},
+}
+CSV_BODY = "name,url,latitude,longitude\nbulk,https://example.org,1.0,2.0\n"
+NDJSON_BODY = json.dumps(QR_CODE) + "\n"
+
+
+@pytest.mark.parametrize(
+    "content_type, format, body",
+    [
+        ("text/csv", None, CSV_BODY),
+        ("text/csv; charset=utf-8", None, CSV_BODY),
+        ("application/x-ndjson", None, NDJSON_BODY),
+        ("application/json", None, NDJSON_BODY),
+        (None, "csv", CSV_BODY),
+        ("application/octet-stream", "ndjson", NDJSON_BODY),
+    ],
+)
+def test_accepted_upload_formats(client, content_type, format, body):
+    headers = {"content-type": content_type} if content_type else {}
+    params = {"format": format} if format else {}
+    response = client.post(
+        "/bulk/qrcodes", content=body.encode(), headers=headers, params=params
+    )
+
+    assert response.status_code == 200
+    assert response.json()["created"] == 1
+    assert response.json()["errors"] == []
+
+
+@pytest.mark.parametrize(
+    "content_type, format",
+    [
+        (None, None),
+        ("application/octet-stream", None),
+        ("text/plain", None),
+        ("multipart/form-data; boundary=x", None),
+        ("multipart/form-data; boundary=x", "csv"),
+    ],
+)
+def test_unknown_upload_formats_get_415(client, content_type, format):
+    headers = {"content-type": content_type} if content_type else {}
+    params = {"format": format} if format else {}
+    response = client.post(
+        "/bulk/scans", content=CSV_BODY.encode(), headers=headers, params=params
+    )
+
+    assert response.status_code == 415
+
+
+def test_multipart_upload_gets_415(client):
+    response = client.post(
+        "/bulk/qrcodes", files={"file": ("codes.csv", CSV_BODY, "text/csv")}
+    )
+
+    assert response.status_code == 415
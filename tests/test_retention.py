@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@pytest.fixture
+def qr_id(app_env):
+    from database import SessionLocal
+    from schemas.qrcode import QRCodeCreate
+    from services.qrcode_service import build_qrcode
+    from services.schema_service import migrate_database
+
+    migrate_database()
+    with SessionLocal() as db:
+        qr_code = build_qrcode(
+            QRCodeCreate(
+                name="retention",
+                url="https://example.org",
+                location={"latitude": 1.0, "longitude": 2.0},
+            ),
+            None,
+        )
+        db.add(qr_code)
+        db.commit()
+        return qr_code.id
+
+
+def add_scans(qr_id: int, seconds: range):
+    from database import SessionLocal
+    from models.scan_model import ScanData
+    from services.rollup_service import apply_scan_rollups
+
+    rows = [
+        {"qr_id": qr_id, "user_agent": "pytest", "created": datetime(2020, 1, 5, 0, 0, s)}
+        for s in seconds
+    ]
+    with SessionLocal() as db:
+        db.execute(insert(ScanData), rows)
+        apply_scan_rollups(db, rows)
+        db.commit()
+
+
+def archive_scans(qr_id: int) -> int:
+    from database import async_engine
+    from models.scan_model import ScanData
+    from services.retention_service import delete_scans_in_chunks
+
+    async def run():
+        try:
+            return await delete_scans_in_chunks(
+                [ScanData.qr_id == qr_id], archive=True
+            )
+        finally:
+            # Pooled connections are bound to this event loop
+            await async_engine.dispose()
+
+    return asyncio.run(run())
+
+
+def archived_times(qr_id: int) -> list[datetime]:
+    from services.retention_service import iter_archived_scan_chunks
+
+    return [
+        scan.created for chunk in iter_archived_scan_chunks(qr_id, 2) for scan in chunk
+    ]
+
+
+def live_scans(qr_id: int) -> int:
+    from database import ReadSessionLocal
+    from models.scan_model import ScanData
+
+    with ReadSessionLocal() as db:
+        return db.query(ScanData).filter(ScanData.qr_id == qr_id).count()
+
+
+def test_failed_delete_leaves_archive_untouched(qr_id, monkeypatch):
+    from services.retention_service import archive_path
+
+    add_scans(qr_id, range(3))
+    assert archive_scans(qr_id) == 3
+    path = archive_path("2020-01", qr_id)
+    size = path.stat().st_size
+
+    add_scans(qr_id, range(3, 5))
+
+    async def failing_commit(self):
+        raise RuntimeError("disk I/O error")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(AsyncSession, "commit", failing_commit)
+        with pytest.raises(RuntimeError):
+            archive_scans(qr_id)
+
+    assert path.stat().st_size == size
+    assert live_scans(qr_id) == 2
+    assert len(archived_times(qr_id)) == 3
+
+    assert archive_scans(qr_id) == 2
+    assert live_scans(qr_id) == 0
+    times = archived_times(qr_id)
+    assert len(times) == len(set(times)) == 5
+
+
+def test_failed_first_delete_removes_new_archive(qr_id, monkeypatch):
+    from services.retention_service import archive_path
+
+    add_scans(qr_id, range(2))
+
+    async def failing_commit(self):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(AsyncSession, "commit", failing_commit)
+    with pytest.raises(RuntimeError):
+        archive_scans(qr_id)
+
+    assert not archive_path("2020-01", qr_id).exists()
+    assert live_scans(qr_id) == 2
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, insert, select
+
+BASE = datetime(2024, 3, 1, 22, 0)
+
+
+@pytest.fixture
+def scans(app_env):
+    """
+    A QR code with scans every 7 minutes 13 seconds across two day
+    boundaries, plus some on exact minute, hour and day boundaries.
+    Yields a session on the migrated database.
+    """
+    from database import SessionLocal
+    from models.scan_model import ScanData
+    from schemas.qrcode import QRCodeCreate
+    from services.qrcode_service import build_qrcode
+    from services.rollup_service import apply_scan_rollups
+    from services.schema_service import migrate_database
+
+    migrate_database()
+    db = SessionLocal()
+    qr_code = build_qrcode(
+        QRCodeCreate(
+            name="rollups",
+            url="https://example.org",
+            location={"latitude": 1.0, "longitude": 2.0},
+        ),
+        None,
+    )
+    db.add(qr_code)
+    db.flush()
+
+    times = [BASE + timedelta(seconds=433 * i) for i in range(700)]
+    times += [
+        datetime(2024, 3, 2, 0, 0),
+        datetime(2024, 3, 2, 13, 0),
+        datetime(2024, 3, 2, 13, 5),
+        datetime(2024, 3, 2, 13, 5, 30, 250000),
+    ]
+    rows = [{"qr_id": qr_code.id, "created": created} for created in times]
+    db.execute(insert(ScanData), rows)
+    apply_scan_rollups(db, rows)
+    db.commit()
+    yield db, qr_code.id
+    db.close()
+
+
+def raw_count(db, qr_id, start_time, end_time) -> int:
+    from models.scan_model import ScanData
+    from services.rollup_service import to_utc_naive
+
+    query = select(func.count()).select_from(ScanData).where(ScanData.qr_id == qr_id)
+    if start_time is not None:
+        query = query.where(ScanData.created >= to_utc_naive(start_time))
+    if end_time is not None:
+        query = query.where(ScanData.created <= to_utc_naive(end_time))
+    return db.scalar(query)
+
+
+@pytest.mark.parametrize(
+    "start_time, end_time",
+    [
+        # Unaligned at both ends
+        (datetime(2024, 3, 1, 23, 17, 41, 5), datetime(2024, 3, 2, 13, 5, 30, 250000)),
+        # Inside one minute
+        (datetime(2024, 3, 2, 13, 5, 10), datetime(2024, 3, 2, 13, 5, 50)),
+        (datetime(2024, 3, 2, 13, 5), datetime(2024, 3, 2, 13, 5)),
+        # Across day boundaries, with whole days in between
+        (datetime(2024, 3, 1, 22, 59, 59), datetime(2024, 3, 4, 0, 0, 1)),
+        (datetime(2024, 3, 1, 23, 30), datetime(2024, 3, 2, 0, 30)),
+        # Bucket-aligned ends
+        (datetime(2024, 3, 2, 0, 0), datetime(2024, 3, 3, 0, 0)),
+        # Open-ended
+        (None, datetime(2024, 3, 2, 13, 5, 30)),
+        (datetime(2024, 3, 2, 13, 0), None),
+        (None, None),
+        # Aware bounds
+        (
+            datetime(2024, 3, 2, 1, 17, 3, tzinfo=timezone(timedelta(hours=2))),
+            datetime(2024, 3, 2, 9, 44, tzinfo=timezone(timedelta(hours=-5))),
+        ),
+        (datetime(2024, 3, 2, 0, 0, tzinfo=timezone.utc), None),
+    ],
+)
+def test_count_scans_matches_raw_count(scans, start_time, end_time):
+    from services.rollup_service import count_scans
+
+    db, qr_id = scans
+    expected = raw_count(db, qr_id, start_time, end_time)
+    assert expected > 0 or start_time == end_time
+    assert count_scans(db, qr_id, start_time, end_time) == expected
+
+
+def test_plan_covers_range_with_aligned_buckets(app_env):
+    from services.rollup_service import GRANULARITIES, _plan
+
+    start = datetime(2024, 3, 1, 22, 17)
+    end = datetime(2024, 3, 4, 1, 3)
+    plan = _plan(start, end, GRANULARITIES)
+
+    floors = {name: floor for name, floor, _, _ in GRANULARITIES}
+    cursor = start
+    for name, bucket_start, bucket_end in plan:
+        assert bucket_start == cursor
+        assert floors[name](bucket_start) == bucket_start
+        assert floors[name](bucket_end) == bucket_end
+        cursor = bucket_end
+    assert cursor == end
+    assert [name for name, _, _ in plan] == [
+        "minute",
+        "hour",
+        "day",
+        "hour",
+        "minute",
+    ]
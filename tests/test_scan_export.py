@@ -0,0 +1,35 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+QR_CODE = {
+    "name": "export",
+    "url": "https://example.org",
+    "location": {"latitude": 1.0, "longitude": 2.0},
+}
+SCAN = {
+    "ip_address": "203.0.113.7",
+    "user_agent": "pytest",
+    "location": {"latitude": 1.0, "longitude": 2.0},
+}
+
+
+def test_export_normalizes_aware_bounds(client):
+    qr_id = client.post("/qrcode/generate", json=QR_CODE).json()["id"]
+    assert client.post(f"/scan/{qr_id}", json=SCAN).status_code == 200
+
+    now = datetime.now(timezone.utc)
+    params = {
+        "start_time": (now - timedelta(hours=1))
+        .astimezone(timezone(timedelta(hours=2)))
+        .isoformat(),
+        "end_time": (now + timedelta(hours=1))
+        .astimezone(timezone(timedelta(hours=-5)))
+        .isoformat(),
+    }
+
+    count = client.get(f"/scan/count/{qr_id}", params=params).json()["scan_count"]
+    export = client.get(f"/scan/{qr_id}/export", params=params)
+    rows = [json.loads(line) for line in export.text.splitlines()]
+
+    assert count == 1
+    assert [row["ip_address"] for row in rows] == [SCAN["ip_address"]]
@@ -0,0 +1,168 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+
+def scan_rows(qr_id: int, count: int) -> list[dict]:
+    return [
+        {
+            "qr_id": qr_id,
+            "ip_address": f"198.51.100.{i}",
+            "user_agent": "pytest",
+            "latitude": 1.0,
+            "longitude": 2.0,
+            "created": datetime(2024, 3, 1, 12, 0, i),
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def qr_id(app_env):
+    from database import SessionLocal
+    from schemas.qrcode import QRCodeCreate
+    from services.qrcode_service import build_qrcode
+    from services.schema_service import migrate_database
+
+    migrate_database()
+    with SessionLocal() as db:
+        qr_code = build_qrcode(
+            QRCodeCreate(
+                name="ingest",
+                url="https://example.org",
+                location={"latitude": 1.0, "longitude": 2.0},
+            ),
+            None,
+        )
+        db.add(qr_code)
+        db.commit()
+        return qr_code.id
+
+
+def stored_scans(qr_id: int) -> int:
+    from database import ReadSessionLocal
+    from models.scan_model import ScanData
+
+    with ReadSessionLocal() as db:
+        return db.scalar(
+            select(func.count()).select_from(ScanData).where(ScanData.qr_id == qr_id)
+        )
+
+
+def make_queue(**options):
+    from services.scan_ingest_service import ScanIngestQueue
+
+    settings = {
+        "max_size": 100,
+        "batch_size": 100,
+        "flush_interval": 30.0,
+        "enqueue_timeout": 1.0,
+        "stop_retries": 0,
+        "spill_dir": "scan_spill",
+    }
+    settings.update(options)
+    return ScanIngestQueue(**settings)
+
+
+def test_full_queue_answers_503(qr_id, monkeypatch):
+    import services.scan_ingest_service as ingest
+
+    async def run():
+        release = asyncio.Event()
+
+        async def blocked_write(rows):
+            await release.wait()
+
+        monkeypatch.setattr(ingest, "write_scan_rows", blocked_write)
+        queue = make_queue(
+            max_size=1, batch_size=1, flush_interval=0.01, enqueue_timeout=0.05
+        )
+        await queue.start()
+        first, second, third = scan_rows(qr_id, 3)
+        # The flusher holds the first row while its write blocks
+        await queue.enqueue(first)
+        await asyncio.sleep(0.05)
+        await queue.enqueue(second)
+        with pytest.raises(HTTPException) as raised:
+            await queue.enqueue(third)
+        release.set()
+        await queue.stop()
+        return raised.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "1"}
+
+
+def test_partial_batch_is_flushed_after_interval(qr_id):
+    async def run():
+        queue = make_queue(flush_interval=0.05)
+        await queue.start()
+        await queue.enqueue(scan_rows(qr_id, 1)[0])
+        assert stored_scans(qr_id) == 0
+        await asyncio.sleep(0.3)
+        written = stored_scans(qr_id)
+        await queue.stop()
+        return written
+
+    assert asyncio.run(run()) == 1
+
+
+def test_full_batch_is_flushed_without_waiting(qr_id):
+    async def run():
+        queue = make_queue(batch_size=3)
+        await queue.start()
+        for row in scan_rows(qr_id, 3):
+            await queue.enqueue(row)
+        await asyncio.sleep(0.2)
+        written = stored_scans(qr_id)
+        await queue.stop()
+        return written
+
+    assert asyncio.run(run()) == 3
+
+
+def test_stop_writes_pending_scans(qr_id):
+    async def run():
+        queue = make_queue()
+        await queue.start()
+        for row in scan_rows(qr_id, 5):
+            await queue.enqueue(row)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert stored_scans(qr_id) == 5
+
+
+def test_failed_final_flush_spills_and_replays(qr_id, monkeypatch, app_env):
+    import services.scan_ingest_service as ingest
+
+    write_scan_rows = ingest.write_scan_rows
+
+    async def failing_write(rows):
+        raise RuntimeError("database unavailable")
+
+    async def stop_with_failing_writes():
+        monkeypatch.setattr(ingest, "write_scan_rows", failing_write)
+        queue = make_queue(stop_retries=1, flush_interval=0.01)
+        await queue.start()
+        for row in scan_rows(qr_id, 4):
+            await queue.enqueue(row)
+        await queue.stop()
+
+    asyncio.run(stop_with_failing_writes())
+    assert stored_scans(qr_id) == 0
+    assert len(list((app_env / "scan_spill").glob("scans-*.ndjson"))) == 1
+
+    async def restart():
+        monkeypatch.setattr(ingest, "write_scan_rows", write_scan_rows)
+        queue = make_queue()
+        await queue.start()
+        await queue.stop()
+
+    asyncio.run(restart())
+    assert stored_scans(qr_id) == 4
+    assert list((app_env / "scan_spill").glob("*")) == []
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_bbox_query_uses_rtree_after_separate_migrate(app_env):
+    # Migrations run in their own process, as in a deployment
+    subprocess.run(
+        [sys.executable, str(ROOT / "manage.py"), "migrate"],
+        cwd=app_env,
+        env=os.environ,
+        check=True,
+    )
+
+    from database import read_engine
+    from main import app
+    from services.spatial_service import rtree_supported, spatial_indexes
+
+    with read_engine.connect() as conn:
+        if not rtree_supported(conn):
+            pytest.skip("SQLite lacks the rtree module")
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with TestClient(app) as client:
+        event.listen(read_engine, "before_cursor_execute", record)
+        try:
+            response = client.get("/map/geojson", params={"bbox": "-10,-10,10,10"})
+        finally:
+            event.remove(read_engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert spatial_indexes(read_engine) == {"scan_data_rtree", "qr_codes_rtree"}
+    assert any("scan_data_rtree r JOIN" in statement for statement in statements)
+    assert any("qr_codes_rtree r JOIN" in statement for statement in statements)